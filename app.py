@@ -1,5 +1,6 @@
 from flask import (
     Flask,
+    Response,
     request,
     jsonify,
     g,
@@ -7,7 +8,8 @@ from flask import (
     url_for,
     Blueprint,
     make_response,
-    render_template
+    render_template,
+    stream_with_context
 )
 from werkzeug.utils import safe_join, secure_filename  # secure_filename moved here
 # Remove the import from security module
@@ -20,20 +22,50 @@ import base64
 import binascii
 import json
 import logging
+import math
 import csv
 import tempfile
 import re
 import uuid
+import threading
 from googleapiclient.discovery import build
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, HttpRequest
+from googleapiclient.errors import HttpError
+from google.auth.exceptions import RefreshError, TransportError
+from google.auth.transport.requests import Request as GoogleAuthRequest
+import google_auth_httplib2
+import httplib2
 from pydantic import BaseModel
 from google.oauth2 import service_account
 from flask_compress import Compress
 from pydantic_settings import BaseSettings
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
 from functools import lru_cache
 from ratelimit import limits, sleep_and_retry, RateLimitException
 from openlibrary_search import fetch_books_from_openlibrary
+from search_cache import SearchCache, normalize_query
+from singleflight import SingleFlight
+import http_client
+import metrics
+from upload_queue import UploadQueue, UploadQueueFull
+from federated_search import federated_search, stream_search
+from concurrent.futures import ThreadPoolExecutor
+import local_search
+import text_store
+import cover_store
+from resilience import (
+    CircuitOpenError,
+    Deadline,
+    DeadlineExceeded,
+    breaker_stats,
+    get_breaker,
+    is_upstream_failure,
+    stop_at_deadline,
+    wait_within_deadline
+)
+import sqlite3
+import time
+from pagination import PaginationError, parse_page_args, page_info, DEFAULT_PAGE_SIZE
 from dotenv import load_dotenv
 from flask_socketio import SocketIO, emit
 # Add at the top of your file, after imports
@@ -77,6 +109,20 @@ class Settings(BaseSettings):
         GOOGLE_APPLICATION_CREDENTIALS (str): Path or content of Google service account credentials.
         MAX_RETRIES (int): Maximum number of retries for API requests. Default is 3.
         CACHE_TIMEOUT (int): Cache timeout duration in seconds. Default is 3600 seconds (1 hour).
+        CACHE_MAX_ENTRIES (int): Maximum number of search results kept in memory. Default is 512.
+        CACHE_MAX_BYTES (int): Maximum size of search results kept in memory. Default is 16 MB.
+        CACHE_DB_PATH (str): SQLite file for the persistent search cache tier. Disabled when unset.
+        UPLOAD_WORKERS (int): Number of background Drive upload workers. Default is 2.
+        UPLOAD_QUEUE_SIZE (int): Maximum number of uploads waiting for a worker. Default is 100.
+        UPLOAD_MAX_ATTEMPTS (int): Attempts before an upload is dead-lettered. Default is 3.
+        SEARCH_DEADLINE (float): Seconds /api/v1/search waits for all sources. Default is 8.
+        SEARCH_WORKERS (int): Number of concurrent upstream searches. Default is 8.
+        BOOKS_DB_PATH (str): SQLite database of harvested books used for local search.
+        REQUEST_DEADLINE (float): Seconds an upstream search may take, retries included. Default is 10.
+        STREAM_UPLOAD_WAIT (float): Seconds a streaming search waits to send the Drive link. Default is 30.
+        COVER_STORE_DIR (str): Directory of the content-addressed cover store. Default is data/covers.
+        COVER_THUMBNAIL_CACHE_BYTES (int): Disk budget for generated cover thumbnails. Default is 64 MB.
+        COVER_MAX_AGE (int): Cache-Control max-age for covers in seconds. Default is 30 days.
         OPENAI_API_KEY (str): API key for OpenAI.
         SECRET_KEY (str): Secret key for the application.
         GOOGLE_DRIVE_FOLDER_ID (str): Google Drive folder ID for uploads.
@@ -95,6 +141,20 @@ class Settings(BaseSettings):
         return key
     MAX_RETRIES: int = 3
     CACHE_TIMEOUT: int = 3600
+    CACHE_MAX_ENTRIES: int = 512
+    CACHE_MAX_BYTES: int = 16 * 1024 * 1024
+    CACHE_DB_PATH: str | None = None
+    UPLOAD_WORKERS: int = 2
+    UPLOAD_QUEUE_SIZE: int = 100
+    UPLOAD_MAX_ATTEMPTS: int = 3
+    SEARCH_DEADLINE: float = 8.0
+    SEARCH_WORKERS: int = 8
+    BOOKS_DB_PATH: str = "books.db"
+    REQUEST_DEADLINE: float = 10.0
+    STREAM_UPLOAD_WAIT: float = 30.0
+    COVER_STORE_DIR: str = "data/covers"
+    COVER_THUMBNAIL_CACHE_BYTES: int = 64 * 1024 * 1024
+    COVER_MAX_AGE: int = 30 * 24 * 3600
     OPENAI_API_KEY: str | None = None  # Make it optional
     SECRET_KEY: str
     GOOGLE_DRIVE_FOLDER_ID: str
@@ -118,7 +178,234 @@ logger = logging.getLogger(__name__)
 # Define function to register routes
 def register_routes(api_v1):
     """Registers all the routes for the api_v1 blueprint."""
-    pass
+
+    @api_v1.route("/search")
+    def search_all():
+        """Search Google Books and Open Library concurrently and merge the results."""
+        query = request.args.get("query")
+        if not query:
+            return jsonify({"error": "Query parameter is required"}), 400
+
+        deadline = current_app.config['SEARCH_DEADLINE']
+        try:
+            requested = float(request.args.get("deadline", deadline))
+            if not math.isfinite(requested) or requested <= 0:
+                raise ValueError(requested)
+            deadline = min(requested, deadline)
+            offset, limit = parse_page_args(request.args)
+        except PaginationError as e:
+            return jsonify({"error": str(e)}), 400
+        except ValueError:
+            return jsonify({"error": "deadline must be a positive number of seconds"}), 400
+
+        budget = Deadline(deadline)
+        result = federated_search(
+            query,
+            {
+                source: (lambda q, source=source: cached_search(
+                    source, q, offset, limit, prefetch=True, deadline=budget
+                ))
+                for source in ("google", "openlibrary")
+            },
+            current_app.extensions['search_executor'],
+            deadline
+        )
+        books = result["books"]
+        fullest_page = max((info["count"] for info in result["sources"].values()), default=0)
+        return jsonify({
+            "message": f"Found {len(books)} books for '{query}'",
+            "books": books,
+            "page": page_info(offset, limit, fullest_page),
+            "sources": result["sources"],
+            "elapsed_ms": result["elapsed_ms"],
+            "drive_link": None,
+            **queue_drive_upload(books, query),
+            "mock": False
+        })
+
+    @api_v1.route("/search/stream")
+    def search_stream():
+        """Stream search results as each source answers, as SSE or NDJSON."""
+        query = request.args.get("query")
+        if not query:
+            return jsonify({"error": "Query parameter is required"}), 400
+        try:
+            offset, limit = parse_page_args(request.args)
+        except PaginationError as e:
+            return jsonify({"error": str(e)}), 400
+
+        stream_format = request.args.get("format")
+        if stream_format is None:
+            accepts_sse = "text/event-stream" in request.headers.get("Accept", "")
+            stream_format = "sse" if accepts_sse else "ndjson"
+        if stream_format not in ("sse", "ndjson"):
+            return jsonify({"error": "format must be 'sse' or 'ndjson'"}), 400
+
+        def generate():
+            for event in search_events(query, offset, limit):
+                if stream_format == "sse":
+                    yield f"event: {event['event']}\ndata: {json.dumps(event)}\n\n"
+                else:
+                    yield json.dumps(event) + "\n"
+
+        response = Response(
+            stream_with_context(generate()),
+            mimetype="text/event-stream" if stream_format == "sse" else "application/x-ndjson"
+        )
+        response.headers["Cache-Control"] = "no-cache"
+        response.headers["X-Accel-Buffering"] = "no"
+        return response
+
+    @api_v1.route("/search/local")
+    def search_local_books():
+        """Ranked full-text search over books already harvested into books.db."""
+        query = request.args.get("query")
+        if not query:
+            return jsonify({"error": "Query parameter is required"}), 400
+        try:
+            offset, limit = parse_page_args(request.args)
+        except PaginationError as e:
+            return jsonify({"error": str(e)}), 400
+
+        started = time.monotonic()
+        try:
+            conn = local_search.connect(current_app.config['BOOKS_DB_PATH'])
+            try:
+                books = local_search.search_local(conn, query, limit=limit, offset=offset)
+            finally:
+                conn.close()
+        except local_search.LocalSearchUnavailable as e:
+            return jsonify({"error": f"Local search unavailable: {e}"}), 503
+        except sqlite3.Error as e:
+            logger.error(f"Local search failed for '{query}': {e}", exc_info=True)
+            return jsonify({"error": "Local search failed"}), 500
+
+        return jsonify({
+            "message": f"Found {len(books)} local books for '{query}'",
+            "books": books,
+            "page": page_info(offset, limit, len(books)),
+            "elapsed_ms": round((time.monotonic() - started) * 1000, 2)
+        })
+
+    @api_v1.route("/books/<int:book_id>/text")
+    def book_text(book_id):
+        """Return pages of a harvested book's full text, or stream all of it as plain text."""
+        page = request.args.get("page")
+        if page is None:
+            try:
+                conn = local_search.connect(current_app.config['BOOKS_DB_PATH'])
+                try:
+                    chunks = text_store.iter_text(conn, book_id)
+                    first = next(chunks, "")
+                except BaseException:
+                    # generate() closes it once streaming starts; until then it is ours to close
+                    conn.close()
+                    raise
+            except text_store.TextNotFound:
+                return jsonify({"error": "No full text for this book"}), 404
+            except (local_search.LocalSearchUnavailable, sqlite3.Error) as e:
+                logger.error(f"Reading text of book {book_id} failed: {e}")
+                return jsonify({"error": "Book text unavailable"}), 503
+
+            def generate():
+                try:
+                    yield first
+                    yield from chunks
+                finally:
+                    conn.close()
+
+            return Response(stream_with_context(generate()), mimetype="text/plain; charset=utf-8")
+
+        try:
+            page = int(page)
+            pages = int(request.args.get("pages", 1))
+        except ValueError:
+            return jsonify({"error": "page and pages must be integers"}), 400
+        if page < 1 or not 1 <= pages <= 50:
+            return jsonify({"error": "page must be >= 1 and pages between 1 and 50"}), 400
+
+        try:
+            conn = local_search.connect(current_app.config['BOOKS_DB_PATH'])
+            try:
+                info = text_store.text_info(conn, book_id)
+                text = text_store.read_pages(conn, book_id, page - 1, pages)
+            finally:
+                conn.close()
+        except text_store.TextNotFound:
+            return jsonify({"error": "No full text for this book"}), 404
+        except (local_search.LocalSearchUnavailable, sqlite3.Error) as e:
+            logger.error(f"Reading text of book {book_id} failed: {e}")
+            return jsonify({"error": "Book text unavailable"}), 503
+
+        return jsonify({
+            "book_id": book_id,
+            "page": page,
+            "pages": pages,
+            "page_size": text_store.PAGE_SIZE,
+            "total_pages": info["pages"],
+            "text": text
+        })
+
+    @api_v1.route("/covers/<olid>")
+    def book_cover(olid):
+        """Serve a harvested cover, optionally as a small or medium thumbnail, with ETag caching."""
+        size = request.args.get("size")
+        if size is not None and size not in cover_store.THUMBNAIL_SIZES:
+            return jsonify({"error": f"size must be one of {', '.join(cover_store.THUMBNAIL_SIZES)}"}), 400
+
+        try:
+            conn = local_search.connect(current_app.config['BOOKS_DB_PATH'])
+            try:
+                cover = cover_store.find_cover(conn, olid)
+            finally:
+                conn.close()
+        except (local_search.LocalSearchUnavailable, sqlite3.Error) as e:
+            logger.error(f"Cover lookup for {olid} failed: {e}")
+            return jsonify({"error": "Covers unavailable"}), 503
+        if cover is None:
+            return jsonify({"error": "No cover for this book"}), 404
+
+        store = current_app.extensions['cover_store']
+        path = None
+        content_type = cover["content_type"] or "application/octet-stream"
+        etag = cover["sha256"]
+        if cover["data"] is None:
+            path = store.path(cover["sha256"])
+            if not os.path.exists(path):
+                return jsonify({"error": "No cover for this book"}), 404
+            if size:
+                thumbnail = store.thumbnail(cover["sha256"], size)
+                if thumbnail:
+                    path, content_type, etag = thumbnail, "image/jpeg", f"{cover['sha256']}-{size}"
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        elif path:
+            response = Response(store.iter_file(path), mimetype=content_type)
+            response.headers["Content-Length"] = str(os.path.getsize(path))
+        else:
+            # Cover still stored as a BLOB by an older harvest
+            response = Response(cover["data"], mimetype=content_type)
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = f"public, max-age={current_app.config['COVER_MAX_AGE']}"
+        return response
+
+    @api_v1.route("/uploads")
+    def upload_overview():
+        """Return upload queue counters and the jobs that exhausted their retries."""
+        upload_queue = current_app.extensions['upload_queue']
+        return jsonify({
+            "stats": upload_queue.stats(),
+            "dead_letters": upload_queue.dead_letters()
+        })
+
+    @api_v1.route("/uploads/<job_id>")
+    def upload_status(job_id):
+        """Return the state of a background Drive upload and its share link once done."""
+        job = current_app.extensions['upload_queue'].get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown upload job"}), 404
+        return jsonify(job)
 
 # Define create_app function
 def create_app():
@@ -137,7 +424,21 @@ def configure_app(app, settings):
     app.config.update(
         GOOGLE_BOOKS_API_KEY=settings.validated_google_books_api_key,
         MAX_RETRIES=settings.MAX_RETRIES,
-        CACHE_TIMEOUT=settings.CACHE_TIMEOUT
+        CACHE_TIMEOUT=settings.CACHE_TIMEOUT,
+        CACHE_MAX_ENTRIES=settings.CACHE_MAX_ENTRIES,
+        CACHE_MAX_BYTES=settings.CACHE_MAX_BYTES,
+        CACHE_DB_PATH=settings.CACHE_DB_PATH,
+        UPLOAD_WORKERS=settings.UPLOAD_WORKERS,
+        UPLOAD_QUEUE_SIZE=settings.UPLOAD_QUEUE_SIZE,
+        UPLOAD_MAX_ATTEMPTS=settings.UPLOAD_MAX_ATTEMPTS,
+        SEARCH_DEADLINE=settings.SEARCH_DEADLINE,
+        SEARCH_WORKERS=settings.SEARCH_WORKERS,
+        BOOKS_DB_PATH=settings.BOOKS_DB_PATH,
+        REQUEST_DEADLINE=settings.REQUEST_DEADLINE,
+        STREAM_UPLOAD_WAIT=settings.STREAM_UPLOAD_WAIT,
+        COVER_STORE_DIR=settings.COVER_STORE_DIR,
+        COVER_THUMBNAIL_CACHE_BYTES=settings.COVER_THUMBNAIL_CACHE_BYTES,
+        COVER_MAX_AGE=settings.COVER_MAX_AGE
     )
     app.config['RESULTS_DIR'] = os.path.join(os.getcwd(), "learning", "Results")
     os.makedirs(app.config['RESULTS_DIR'], exist_ok=True)
@@ -147,6 +448,43 @@ def initialize_extensions(app):
     compress = Compress()
     compress.init_app(app)
 
+    # Concurrent identical searches share one upstream fetch and one Drive upload
+    app.extensions['single_flight'] = SingleFlight()
+
+    app.extensions['search_cache'] = SearchCache(
+        ttl=app.config['CACHE_TIMEOUT'],
+        max_entries=app.config['CACHE_MAX_ENTRIES'],
+        max_bytes=app.config['CACHE_MAX_BYTES'],
+        db_path=app.config['CACHE_DB_PATH']
+    )
+
+    def run_upload(books, query):
+        # Workers run outside any request, so push an app context for get_drive_service
+        with app.app_context():
+            return upload_search_results_to_drive(books, query)
+
+    def upload_retryable(error):
+        return is_retryable_drive_error(error)
+
+    app.extensions['upload_queue'] = UploadQueue(
+        run_upload,
+        retryable=upload_retryable,
+        num_workers=app.config['UPLOAD_WORKERS'],
+        max_queue=app.config['UPLOAD_QUEUE_SIZE'],
+        max_attempts=app.config['UPLOAD_MAX_ATTEMPTS']
+    )
+
+    app.extensions['cover_store'] = cover_store.CoverStore(
+        app.config['COVER_STORE_DIR'],
+        thumbnail_max_bytes=app.config['COVER_THUMBNAIL_CACHE_BYTES']
+    )
+
+    # Threads become greenlets under the eventlet worker
+    app.extensions['search_executor'] = ThreadPoolExecutor(
+        max_workers=app.config['SEARCH_WORKERS'],
+        thread_name_prefix="search"
+    )
+
 def setup_routes(app):
     """Set up routes and blueprints."""
     # API endpoints
@@ -167,6 +505,10 @@ def setup_routes(app):
         query = request.args.get("query")
         if not query:
             return jsonify({"error": "Query parameter is required"}), 400
+        try:
+            offset, limit = parse_page_args(request.args)
+        except PaginationError as e:
+            return jsonify({"error": str(e)}), 400
     
         try:
             # Try to fetch real data with a short timeout
@@ -184,7 +526,7 @@ def setup_routes(app):
                 })
             
             # Try to fetch real data
-            books = fetch_books_from_google(query)
+            books, upload = search_with_upload("google", query, offset, limit)
             
             if not books:
                 # Fallback to mock if no real books found
@@ -196,12 +538,13 @@ def setup_routes(app):
                     "mock": True
                 })
                 
-            # Upload results to Google Drive
-            file_path = upload_search_results_to_drive(books, query)
+            # Upload results to Google Drive in the background
             return jsonify({
                 "message": f"Found {len(books)} books for '{query}'",
                 "books": books,
-                "drive_link": file_path,
+                "page": page_info(offset, limit, len(books)),
+                "drive_link": None,
+                **upload,
                 "mock": False
             })
         except Exception as e:
@@ -223,6 +566,7 @@ def setup_routes(app):
         """Serve the main Illustrator Co-Pilot interface"""
         return render_template('index.html')
     # Removed duplicate route definition for '/'
+    register_routes(api_v1)
     app.register_blueprint(api_v1)
 
     # Register core routes
@@ -242,6 +586,8 @@ def setup_routes(app):
             })
         except Exception as e:
             logger.error(f"Drive test failed: {str(e)}", exc_info=True)
+            if is_drive_auth_error(e):
+                reset_drive_service()
             return jsonify({
                 "success": False,
                 "error": str(e)
@@ -270,6 +616,11 @@ def setup_routes(app):
             logger.error(f"Credential verification failed: {str(e)}", exc_info=True)
             return jsonify({"error": f"Credentials verification failed: {str(e)}"}), 500
 
+    @app.route("/metrics")
+    def prometheus_metrics():
+        """Serve counters and latency histograms in the Prometheus text format"""
+        return Response(metrics.render(), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
     @app.route("/api/status")
     def api_status():
         """Show API status including mock mode"""
@@ -281,7 +632,13 @@ def setup_routes(app):
                 "google_books": bool(app.config.get("GOOGLE_BOOKS_API_KEY")),
                 "google_drive": bool(app.config.get("GOOGLE_APPLICATION_CREDENTIALS")),
                 "openai": bool(settings.OPENAI_API_KEY)
-            }
+            },
+            "cache": app.extensions['search_cache'].stats(),
+            "http_pools": http_client.pool_stats(),
+            "uploads": app.extensions['upload_queue'].stats(),
+            "circuit_breakers": breaker_stats(),
+            "coalescing": app.extensions['single_flight'].stats(),
+            "covers": app.extensions['cover_store'].stats()
         })
 
 # Create app instance
@@ -303,6 +660,29 @@ def handle_message(data):
     response = process_user_message(message)
     emit('response', {'data': response})
 
+@socketio.on('search')
+def handle_search(data):
+    """Stream search results to the requesting client as Socket.IO events.
+
+    A malformed payload gets an 'error' event instead of the stream.
+    """
+    data = data or {}
+    if not isinstance(data, dict):
+        emit('error', {'error': 'search payload must be an object'})
+        return
+    query = data.get('query')
+    if not query or not isinstance(query, str):
+        emit('error', {'error': 'Query parameter is required'})
+        return
+    try:
+        offset, limit = parse_page_args(data)
+    except PaginationError as e:
+        emit('error', {'error': str(e)})
+        return
+
+    for event in search_events(query, offset, limit):
+        emit(event['event'], event)
+
 def process_user_message(message):
     # Simple fallback if OpenAI API is not available
     if not settings.OPENAI_API_KEY:
@@ -427,9 +807,13 @@ def search_openlibrary():
     query = request.args.get("query")
     if not query:
         return jsonify({"error": "Query parameter is required"}), 400
+    try:
+        offset, limit = parse_page_args(request.args)
+    except PaginationError as e:
+        return jsonify({"error": str(e)}), 400
 
     try:
-        books = fetch_books_from_openlibrary(query)
+        books, upload = search_with_upload("openlibrary", query, offset, limit)
         
         if not books and (app.config.get("FLASK_ENV") == "development" or request.args.get("mock") == "true"):
             # If no books found and in development or mock mode, return mock data
@@ -444,15 +828,26 @@ def search_openlibrary():
         
         # Rest of your function stays the same...
         
-        # Upload results to Google Drive
-        file_path = upload_search_results_to_drive(books, query)
-
+        # Upload results to Google Drive in the background
         return jsonify({
             "message": f"Found {len(books)} books for '{query}'",
             "books": books,
-            "drive_link": file_path,
+            "page": page_info(offset, limit, len(books)),
+            "drive_link": None,
+            **upload,
             "mock": False
         })
+
+    except CircuitOpenError as e:
+        # Open Library is known to be down: answer immediately instead of erroring
+        mock_books = get_mock_books(query, "openlibrary")
+        return jsonify({
+            "message": f"Found {len(mock_books)} mock books (API unavailable: {str(e)})",
+            "books": mock_books,
+            "drive_link": None,
+            "mock": True,
+            "error": str(e)
+        })
         
     except Exception as e:
         logger.error(f"Error processing OpenLibrary search: {e}", exc_info=True)
@@ -490,17 +885,164 @@ def get_mock_books(query, source="unknown"):
 @app.before_request
 def before_request():
     g.request_id = request.headers.get('X-Request-ID', str(uuid.uuid4()))
+    g.request_started = time.monotonic()
     logger.info(f"Processing request {g.request_id}: {request.method} {request.path}")
 
+@app.after_request
+def record_request_metrics(response):
+    # Label by route pattern, not path, so /books/<id> stays one series
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    metrics.HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if 'request_started' in g:
+        metrics.HTTP_REQUEST_SECONDS.observe(time.monotonic() - g.request_started, endpoint=endpoint)
+    return response
+
+def fetch_search_page(source, query, offset, limit, deadline=None):
+    """Fetch one page of results from an upstream search source."""
+    if source == "google":
+        return fetch_books_from_google(query, start_index=offset, max_results=limit, deadline=deadline)
+    if source == "openlibrary":
+        return fetch_books_from_openlibrary(query, offset=offset, limit=limit, deadline=deadline)
+    raise ValueError(f"Unknown search source: {source}")
+
+def cached_search(source, query, offset=0, limit=DEFAULT_PAGE_SIZE, prefetch=False, deadline=None):
+    """Return a page of books from the search cache, fetching on a miss.
+
+    With prefetch=True the following page is fetched into the cache in the
+    background, so paging forward is served from memory. If the upstream fails
+    (including an open circuit) an expired cache entry is served instead.
+    """
+    cache = app.extensions['search_cache']
+    page = f"{offset}:{limit}"
+    books = cache.get(source, query, page)
+    if books is not None:
+        logger.info(f"Search cache hit for {source} query: {query} ({page})")
+    else:
+        if deadline is None:
+            deadline = Deadline(app.config['REQUEST_DEADLINE'])
+        try:
+            books = app.extensions['single_flight'].do(
+                ("fetch", source, normalize_query(query), page),
+                lambda: fetch_search_page(source, query, offset, limit, deadline=deadline)
+            )
+        except Exception as e:
+            stale = cache.get(source, query, page, allow_stale=True)
+            if stale is None:
+                raise
+            logger.warning(f"Serving stale {source} results for '{query}' after upstream error: {e}")
+            return stale
+        # Only cache real results so an empty upstream answer is retried next time
+        if books:
+            cache.set(source, query, books, page)
+
+    if prefetch and books and len(books) >= limit:
+        prefetch_search_page(source, query, offset + limit, limit)
+    return books
+
+def prefetch_search_page(source, query, offset, limit):
+    """Warm the cache with a page the user is likely to request next."""
+    if app.extensions['search_cache'].contains(source, query, f"{offset}:{limit}"):
+        return
+
+    def warm():
+        try:
+            cached_search(source, query, offset, limit)
+        except Exception as e:
+            logger.warning(f"Prefetch of {source} '{query}' at offset {offset} failed: {e}")
+
+    app.extensions['search_executor'].submit(warm)
+
+def search_with_upload(source, query, offset, limit):
+    """Search one source and queue the Drive upload, coalescing identical concurrent requests.
+
+    Returns (books, upload fields); every coalesced caller gets the same upload job.
+    """
+    def run():
+        books = cached_search(source, query, offset, limit, prefetch=True)
+        return books, queue_drive_upload(books, query)
+
+    return app.extensions['single_flight'].do(
+        ("search", source, normalize_query(query), f"{offset}:{limit}"), run
+    )
+
+def search_events(query, offset, limit):
+    """Yield streaming search events: book, source, summary and finally drive_link.
+
+    Books are sent as soon as their source answers. The Drive upload is queued
+    with the summary, and the drive_link event follows once it has finished
+    (or STREAM_UPLOAD_WAIT has passed).
+    """
+    deadline = app.config['SEARCH_DEADLINE']
+    budget = Deadline(deadline)
+    fetchers = {
+        source: (lambda q, source=source: cached_search(
+            source, q, offset, limit, prefetch=True, deadline=budget
+        ))
+        for source in ("google", "openlibrary")
+    }
+
+    books = []
+    upload = {"upload_job_id": None, "upload_status_url": None}
+    for event in stream_search(query, fetchers, app.extensions['search_executor'], deadline):
+        if event["event"] == "book":
+            books.append(event["book"])
+        elif event["event"] == "summary":
+            fullest_page = max((info["count"] for info in event["sources"].values()), default=0)
+            upload = queue_drive_upload(books, query)
+            event.update(page=page_info(offset, limit, fullest_page), **upload)
+        yield event
+
+    if upload["upload_job_id"]:
+        job = app.extensions['upload_queue'].wait(upload["upload_job_id"], app.config['STREAM_UPLOAD_WAIT'])
+        yield {
+            "event": "drive_link",
+            "job_id": upload["upload_job_id"],
+            "status": job["status"] if job else "unknown",
+            "drive_link": job["drive_link"] if job else None
+        }
+
+def queue_drive_upload(books, query):
+    """Queue a background Drive upload and return the job fields for the response."""
+    if not books:
+        return {"upload_job_id": None, "upload_status_url": None}
+    try:
+        job = app.extensions['upload_queue'].submit(books, query)
+    except UploadQueueFull as e:
+        logger.warning(f"Skipping Drive upload for '{query}': {e}")
+        return {"upload_job_id": None, "upload_status_url": None}
+    return {
+        "upload_job_id": job.job_id,
+        "upload_status_url": url_for('api_v1.upload_status', job_id=job.job_id)
+    }
+
 # Define fetch_books_from_google function
-@retry(stop=stop_after_attempt(5), wait=wait_exponential(multiplier=1, min=2, max=20))
-def fetch_books_from_google(query):
-    """Fetch books from Google Books API with improved retry logic."""
+@retry(
+    stop=stop_after_attempt(5) | stop_at_deadline,
+    wait=wait_within_deadline(wait_exponential(multiplier=1, min=2, max=20)),
+    retry=retry_if_not_exception_type((ValueError, CircuitOpenError, DeadlineExceeded)),
+    before_sleep=metrics.retry_recorder("google_books_search"),
+    reraise=True
+)
+def fetch_books_from_google(query, start_index=0, max_results=10, deadline=None):
+    """Fetch a page of books from Google Books API with improved retry logic.
+
+    Every attempt goes through the google_books circuit breaker, and retries and
+    timeouts are cut short by the optional deadline (a resilience.Deadline).
+    """
     if not query or not isinstance(query, str) or len(query.strip()) == 0:
         raise ValueError("Query parameter must be a non-empty string.")
 
+    # Work out the time budget first, so a spent deadline never takes a half-open trial slot
+    request_timeout = http_client.timeout(deadline=deadline)
+    breaker = get_breaker("google_books")
+    trial = breaker.check()
+
     from urllib.parse import quote
-    url = f"https://www.googleapis.com/books/v1/volumes?q={quote(query)}&key={app.config['GOOGLE_BOOKS_API_KEY'].strip()}"
+    url = (
+        f"https://www.googleapis.com/books/v1/volumes?q={quote(query)}"
+        f"&startIndex={int(start_index)}&maxResults={int(max_results)}"
+        f"&key={app.config['GOOGLE_BOOKS_API_KEY'].strip()}"
+    )
     
     # Add custom headers to help with DNS resolution
     headers = {
@@ -508,66 +1050,131 @@ def fetch_books_from_google(query):
         'Accept': 'application/json'
     }
     
+    started = time.monotonic()
+    status = None
     try:
-        # Use a longer timeout and custom headers
-        response = requests.get(url, headers=headers, timeout=30)
+        # Reuse the shared keep-alive session with separate connect/read timeouts
+        response = http_client.get_session().get(
+            url, headers=headers, timeout=request_timeout
+        )
+        status = response.status_code
+        metrics.DOWNLOADED_BYTES.inc(len(response.content), host="www.googleapis.com")
         response.raise_for_status()
         data = response.json()
+        breaker.record_success()
         return [extract_book_info(item) for item in data.get("items", [])]
     except requests.RequestException as e:
+        status = e.response.status_code if e.response is not None else None
+        # A 4xx is still an answer from a healthy upstream
+        breaker.record_response(status)
         logger.error(f"Error fetching books from Google: {str(e)}")
         raise BookAPIError(f"Failed to fetch books: {str(e)}")
+    finally:
+        breaker.release(trial)
+        metrics.observe_upstream("www.googleapis.com", status, time.monotonic() - started)
 # Log application details
 logger.info(f"Application root: {os.path.dirname(__file__)}")
 logger.info(f"Running on Heroku: {bool(os.getenv('HEROKU'))}")
 
 from flask import current_app
 
+# Drive credentials and service are built once per process and shared by all workers
+_drive_lock = threading.Lock()
+_drive_state = {"raw": None, "credentials": None, "service": None}
+_drive_http = threading.local()
+
+def parse_drive_credentials(google_credentials):
+    """Parse service account credentials given as base64 or plain JSON."""
+    try:
+        # Remove any whitespace/newlines that might have been added
+        creds_json = base64.b64decode(google_credentials.strip()).decode('utf-8')
+        return json.loads(creds_json)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        logger.debug(f"Base64 decode failed, trying plain JSON: {str(e)}")
+    try:
+        return json.loads(google_credentials)
+    except json.JSONDecodeError as e:
+        logger.error(f"All parsing attempts failed: {str(e)}")
+        raise GoogleDriveError(f"Could not parse credentials: {str(e)}")
+
+def _ensure_drive_token(credentials):
+    """Refresh the shared access token once, even with many concurrent callers."""
+    if credentials.valid:
+        return
+    with _drive_lock:
+        if not credentials.valid:
+            credentials.refresh(GoogleAuthRequest(session=http_client.get_session()))
+            logger.info("Refreshed Google Drive access token")
+
+def _build_drive_request(http, postproc, uri, **kwargs):
+    """Give every thread (greenlet) its own authorized Http; httplib2 is not thread-safe."""
+    credentials = _drive_state["credentials"]
+    _ensure_drive_token(credentials)
+    authorized = getattr(_drive_http, "authorized", None)
+    if authorized is None or authorized.credentials is not credentials:
+        authorized = google_auth_httplib2.AuthorizedHttp(credentials, http=httplib2.Http())
+        _drive_http.authorized = authorized
+    # httplib2 does not go through http_client, so apply HTTP_HOST_OVERRIDES here
+    return HttpRequest(authorized, postproc, http_client.override_url(uri), **kwargs)
+
 def get_drive_service():
-    """Returns an authenticated Google Drive service object."""
+    """Returns the process-wide authenticated Google Drive service object."""
     google_credentials = current_app.config['GOOGLE_APPLICATION_CREDENTIALS']
     if not google_credentials:
         logger.error("GOOGLE_APPLICATION_CREDENTIALS environment variable is not set")
         raise RuntimeError("GOOGLE_APPLICATION_CREDENTIALS is not set")
-    
-    logger.info(f"Credential type: {type(google_credentials)}")
-    logger.info(f"Credential length: {len(google_credentials)}")
-    
-    try:
-        # First, try to decode base64
-        try:
-            logger.info("Attempting base64 decode...")
-            # Remove any whitespace/newlines that might have been added
-            cleaned_creds = google_credentials.strip()
-            creds_json = base64.b64decode(cleaned_creds).decode('utf-8')
-            logger.info("Successfully decoded base64")
-            credentials_info = json.loads(creds_json)
-            logger.info("Successfully parsed JSON after base64 decode")
-        except (binascii.Error, json.JSONDecodeError) as e:
-            logger.warning(f"Base64 decode failed: {str(e)}")
-            # If base64 fails, try direct JSON parsing
-            try:
-                logger.info("Attempting direct JSON parse...")
-                credentials_info = json.loads(google_credentials)
-                logger.info("Successfully parsed JSON directly")
-            except json.JSONDecodeError as e:
-                logger.error(f"All parsing attempts failed: {str(e)}")
-                raise GoogleDriveError(f"Could not parse credentials: {str(e)}")
-
-        # Create credentials object with specific scope
-        credentials = service_account.Credentials.from_service_account_info(
-            credentials_info,
-            scopes=["https://www.googleapis.com/auth/drive.file"]
-        )
 
-        # Build and return the service
-        service = build('drive', 'v3', credentials=credentials)
-        logger.info("Successfully created Google Drive service")
+    service = _drive_state["service"]
+    if service is not None and _drive_state["raw"] == google_credentials:
         return service
 
-    except Exception as e:
-        logger.error(f"Failed to create Drive service: {str(e)}", exc_info=True)
-        raise GoogleDriveError(f"Drive service creation failed: {str(e)}")
+    with _drive_lock:
+        if _drive_state["service"] is not None and _drive_state["raw"] == google_credentials:
+            return _drive_state["service"]
+        try:
+            credentials = service_account.Credentials.from_service_account_info(
+                parse_drive_credentials(google_credentials),
+                scopes=["https://www.googleapis.com/auth/drive.file"]
+            )
+            _drive_state.update(raw=google_credentials, credentials=credentials)
+            # The bundled discovery document avoids a network fetch on startup
+            _drive_state["service"] = build(
+                'drive', 'v3',
+                credentials=credentials,
+                static_discovery=True,
+                cache_discovery=False,
+                requestBuilder=_build_drive_request
+            )
+            logger.info("Successfully created Google Drive service")
+            return _drive_state["service"]
+        except GoogleDriveError:
+            raise
+        except Exception as e:
+            logger.error(f"Failed to create Drive service: {str(e)}", exc_info=True)
+            raise GoogleDriveError(f"Drive service creation failed: {str(e)}")
+
+def reset_drive_service():
+    """Drop the cached credentials and service so the next call rebuilds them."""
+    with _drive_lock:
+        _drive_state.update(raw=None, credentials=None, service=None)
+    logger.warning("Reset cached Google Drive service")
+
+def is_drive_auth_error(error):
+    """Return True if an error means the Drive credentials must be rebuilt."""
+    if isinstance(error, RefreshError):
+        return True
+    return isinstance(error, HttpError) and error.resp.status == 401
+
+def is_retryable_drive_error(error):
+    """Return False for upload errors another attempt cannot fix: credentials and 4xx answers.
+
+    429s and 403 rate-limit answers are retried, as Drive asks.
+    """
+    if isinstance(error, RefreshError):
+        return False
+    if isinstance(error, HttpError) and not is_upstream_failure(error.resp.status):
+        return error.resp.status == 403 and b"ratelimitexceeded" in (error.content or b"").lower()
+    return True
 
 # Define custom exceptions
 class GoogleDriveError(Exception):
@@ -580,11 +1187,19 @@ class BookAPIError(Exception):
 
 # Define upload_to_google_drive function
 def upload_to_google_drive(file_path, file_name):
-    """Uploads a file to Google Drive with enhanced logging."""
+    """Uploads a file to Google Drive with enhanced logging.
+
+    Errors are raised (after updating the google_drive breaker), so the upload
+    queue records the real cause and can tell whether to retry.
+    """
     if not os.path.exists(file_path):
         logger.error(f"File not found at path: {file_path}")
         raise GoogleDriveError(f"File not found: {file_path}")
 
+    # Let the upload queue back off while Drive is failing instead of piling on
+    drive_breaker = get_breaker("google_drive")
+    trial = drive_breaker.check()
+
     logger.info(f"Starting upload process for file: {file_name}")
     logger.info(f"File path: {file_path}")
     logger.info(f"File size: {os.path.getsize(file_path)} bytes")
@@ -614,6 +1229,7 @@ def upload_to_google_drive(file_path, file_name):
             raise GoogleDriveError("Failed to get file ID after upload")
 
         logger.info(f"File uploaded successfully with ID: {file_id}")
+        drive_breaker.record_success()
 
         # Make the file publicly accessible
         @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
@@ -654,11 +1270,20 @@ def upload_to_google_drive(file_path, file_name):
 
     except Exception as e:
         logger.error(f"Error in upload_to_google_drive: {str(e)}", exc_info=True)
-        return None
+        if is_drive_auth_error(e):
+            reset_drive_service()
+        # Bad requests are answers from a healthy Drive; credential problems say nothing either way
+        if isinstance(e, HttpError):
+            drive_breaker.record_response(e.resp.status)
+        elif isinstance(e, (OSError, httplib2.HttpLib2Error, TransportError)):
+            drive_breaker.record_failure()
+        raise
+    finally:
+        drive_breaker.release(trial)
 
 # Fix: A new function to handle both saving to CSV and uploading to Drive
 def upload_search_results_to_drive(books, query):
-    """Saves books to a temporary CSV file and uploads to Google Drive."""
+    """Saves books to a temporary CSV file and uploads to Google Drive; upload errors are raised."""
     if not books:
         logger.warning("No books found for the given query.")
         return None
@@ -684,10 +1309,7 @@ def upload_search_results_to_drive(books, query):
         
         # Upload to Google Drive
         return upload_to_google_drive(temp_file, file_name)
-        
-    except Exception as e:
-        logger.error(f"Error in upload_search_results_to_drive: {e}", exc_info=True)
-        return None
+
     finally:
         if temp_file and os.path.exists(temp_file):
             try:
@@ -0,0 +1,332 @@
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Hosts the fake server stands in for; point them at it with HTTP_HOST_OVERRIDES
+FAKE_HOSTS = (
+    "www.googleapis.com",  # Google Books volumes and the Drive API
+    "openlibrary.org",  # search.json and api/books
+    "covers.openlibrary.org",
+    "archive.org",  # full texts
+    "oauth2.googleapis.com",  # service account token exchange for Drive
+)
+
+COVER_BYTES = 24 * 1024
+TEXT_BYTES = 512 * 1024
+
+
+class FakeUpstreamConfig:
+    """
+    Behaviour of the fake upstreams.
+
+    Args:
+        latency (float): Seconds added to every response.
+        jitter (float): Up to this many extra seconds, drawn uniformly per response.
+        error_rate (float): Fraction of responses that are a 503.
+        throttle_rate (float): Fraction of responses that are a 429 with Retry-After.
+        retry_after (float): Retry-After seconds sent with injected 429s.
+        full_text_ratio (float): Fraction of editions that have a full text (an ocaid).
+        cover_bytes (int): Size of each cover image.
+        text_bytes (int): Size of each full text.
+        relevant_results (Optional[int]): Search results per query that match it; later ones are unrelated.
+        seed (int): Seed for all random choices, so runs are reproducible.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 throttle_rate: float = 0.0, retry_after: float = 1.0, full_text_ratio: float = 0.5,
+                 cover_bytes: int = COVER_BYTES, text_bytes: int = TEXT_BYTES,
+                 relevant_results: Optional[int] = None, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.full_text_ratio = full_text_ratio
+        self.cover_bytes = cover_bytes
+        self.text_bytes = text_bytes
+        self.relevant_results = relevant_results
+        self.seed = seed
+
+    def as_dict(self) -> Dict:
+        return dict(vars(self))
+
+
+def _digest(*parts) -> int:
+    """Stable number for generated data, independent of PYTHONHASHSEED."""
+    return int(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest()[:12], 16)
+
+
+def fake_olid(*parts) -> str:
+    return f"OL{_digest('olid', *parts) % 90000000 + 10000000}M"
+
+
+def has_full_text(olid: str, ratio: float) -> bool:
+    return _digest("ocaid", olid) % 1000 < ratio * 1000
+
+
+def fake_cover(olid: str, size: int) -> bytes:
+    """A JPEG signature followed by filler, large enough not to count as a placeholder."""
+    filler = hashlib.sha256(olid.encode("utf-8")).digest()
+    return (b"\xff\xd8\xff\xe0" + filler * (size // len(filler) + 1))[:size]
+
+
+def fake_text(identifier: str, size: int) -> bytes:
+    line = f"{identifier}: It was a dark and stormy night; the rain fell in torrents.\n".encode("utf-8")
+    return (line * (size // len(line) + 1))[:size]
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeUpstreams"
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real upstreams
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def _dispatch(self, method: str):
+        upstream = self.server.upstream
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        route = upstream.route(method, parts.path, query)
+        delay, fault = upstream.draw(route)
+        if delay:
+            time.sleep(delay)
+        if fault == 429:
+            self._send(429, b'{"error": "rate limited"}', "application/json",
+                       {"Retry-After": f"{upstream.config.retry_after:g}"})
+            return
+        if fault == 503:
+            self._send(503, b'{"error": "unavailable"}', "application/json")
+            return
+
+        status, body, content_type, headers = upstream.respond(route, method, parts.path, query,
+                                                               self.server.server_address)
+        self._send(status, body, content_type, headers)
+
+    def _send(self, status: int, body: bytes, content_type: str, headers: Optional[Dict] = None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeUpstreams:
+    """
+    One local HTTP server answering for every upstream the app and harvest scripts call.
+
+    Routes by path: Google Books /books/v1/volumes, Open Library
+    /search.json and /api/books, covers /b/olid/<olid>-L.jpg, archive.org
+    /stream/<ocaid>/text.txt, the Drive upload and permissions endpoints and
+    the OAuth token endpoint. Responses are generated deterministically from
+    the request, while latency, 503s and 429s are injected per
+    FakeUpstreamConfig from a seeded random generator.
+
+    Args:
+        config (FakeUpstreamConfig): Latency and fault injection settings.
+        host (str): Interface to listen on.
+        port (int): Port to listen on; 0 picks a free one.
+    """
+
+    def __init__(self, config: Optional[FakeUpstreamConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or FakeUpstreamConfig()
+        self._random = random.Random(self.config.seed)
+        self._lock = threading.Lock()
+        self.requests: Counter = Counter()
+        self.faults: Counter = Counter()
+        self._server = ThreadingHTTPServer((host, port), _Handler)
+        self._server.daemon_threads = True
+        self._server.upstream = self
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def host_overrides(self) -> str:
+        """The HTTP_HOST_OVERRIDES value that sends every faked host here."""
+        return ",".join(f"{host}={self.url}" for host in FAKE_HOSTS)
+
+    def start(self) -> "FakeUpstreams":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-upstreams", daemon=True)
+        self._thread.start()
+        logger.info(f"Fake upstreams listening on {self.url}")
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {"requests": dict(self.requests), "faults": dict(self.faults)}
+
+    @staticmethod
+    def route(method: str, path: str, query: Dict[str, str]) -> str:
+        if path == "/books/v1/volumes":
+            return "google_volumes"
+        if path == "/search.json":
+            return "openlibrary_search"
+        if path == "/api/books":
+            return "openlibrary_books"
+        if path.startswith("/b/olid/"):
+            return "covers"
+        if path.startswith("/stream/"):
+            return "archive_text"
+        if path.startswith("/upload/drive/"):
+            return "drive_upload"
+        if path.startswith("/drive/v3/files/") and path.endswith("/permissions"):
+            return "drive_permissions"
+        if path == "/token":
+            return "oauth_token"
+        return "unknown"
+
+    def draw(self, route: str) -> Tuple[float, Optional[int]]:
+        """Pick this response's delay and injected fault (429, 503 or None)."""
+        config = self.config
+        with self._lock:
+            self.requests[route] += 1
+            delay = config.latency + (self._random.uniform(0, config.jitter) if config.jitter else 0.0)
+            if route == "oauth_token":
+                return delay, None
+            roll = self._random.random()
+            fault = None
+            if roll < config.throttle_rate:
+                fault = 429
+            elif roll < config.throttle_rate + config.error_rate:
+                fault = 503
+            if fault:
+                self.faults[f"{route}:{fault}"] += 1
+            return delay, fault
+
+    def respond(self, route: str, method: str, path: str, query: Dict[str, str],
+                address) -> Tuple[int, bytes, str, Dict[str, str]]:
+        handler = getattr(self, f"_{route}", None)
+        if handler is None:
+            return 404, b'{"error": "not found"}', "application/json", {}
+        return handler(method, path, query, address)
+
+    @staticmethod
+    def _json(data) -> Tuple[int, bytes, str, Dict[str, str]]:
+        return 200, json.dumps(data).encode("utf-8"), "application/json", {}
+
+    def _google_volumes(self, method, path, query, address):
+        q = query.get("q", "")
+        start, count = int(query.get("startIndex", 0)), int(query.get("maxResults", 10))
+        items = []
+        for i in range(start, start + count):
+            isbn = str(9780000000000 + _digest("isbn", q, i) % 1000000000)
+            subject = q.replace('+', ' ') if self._relevant(i) else "Unrelated"
+            items.append({"volumeInfo": {
+                "title": f"{subject.title()} Volume {i}",
+                "authors": [f"Author {_digest('author', q, i) % 500}"],
+                "description": f"Generated description {i} for {subject}.",
+                "industryIdentifiers": [{"type": "ISBN_13", "identifier": isbn},
+                                        {"type": "ISBN_10", "identifier": isbn[3:]}],
+            }, "accessInfo": {"publicDomain": i % 2 == 0}})
+        return self._json({"totalItems": start + count * 10, "items": items})
+
+    def _relevant(self, index: int) -> bool:
+        return self.config.relevant_results is None or index < self.config.relevant_results
+
+    def _openlibrary_search(self, method, path, query, address):
+        text = (query.get("q") or query.get("title") or "").strip('"')
+        offset, limit = int(query.get("offset", 0)), int(query.get("limit", 10))
+        docs = []
+        for i in range(offset, offset + min(limit, 100)):
+            olid = fake_olid(text, i)
+            subject = text if self._relevant(i) else "Unrelated"
+            docs.append({
+                "key": f"/works/OL{_digest('work', text, i) % 9000000 + 1000000}W",
+                "title": f"{subject.title()} {i}" if i else subject,
+                "author_name": [f"Author {_digest('author', text, i) % 500}"],
+                "cover_edition_key": olid,
+                "edition_key": [olid],
+                "isbn": [str(9780000000000 + _digest("isbn", text, i) % 1000000000)],
+                "first_sentence": [f"The first sentence of {text} {i}."],
+            })
+        return self._json({"numFound": offset + len(docs) * 10, "docs": docs})
+
+    def _openlibrary_books(self, method, path, query, address):
+        data = {}
+        for bibkey in filter(None, query.get("bibkeys", "").split(",")):
+            olid = bibkey.split(":", 1)[-1]
+            entry = {"bib_key": bibkey, "info_url": f"https://openlibrary.org/books/{olid}"}
+            if has_full_text(olid, self.config.full_text_ratio):
+                entry["ocaid"] = f"fake{olid.lower()}"
+            data[bibkey] = entry
+        return self._json(data)
+
+    def _covers(self, method, path, query, address):
+        olid = path.rsplit("/", 1)[-1].split("-", 1)[0]
+        return 200, fake_cover(olid, self.config.cover_bytes), "image/jpeg", {}
+
+    def _archive_text(self, method, path, query, address):
+        identifier = path.split("/")[2]
+        return 200, fake_text(identifier, self.config.text_bytes), "text/plain; charset=utf-8", {}
+
+    def _drive_upload(self, method, path, query, address):
+        if method == "POST" and query.get("uploadType") == "resumable":
+            upload_id = f"{_digest('upload', time.monotonic_ns()):x}"
+            location = f"http://{address[0]}:{address[1]}{path}?uploadType=resumable&upload_id={upload_id}"
+            return 200, b"", "application/json", {"Location": location}
+        return self._json({"id": f"file{_digest('file', query.get('upload_id'), time.monotonic_ns()):x}"})
+
+    def _drive_permissions(self, method, path, query, address):
+        return self._json({"id": "anyoneWithLink", "type": "anyone", "role": "reader"})
+
+    def _oauth_token(self, method, path, query, address):
+        return self._json({"access_token": "fake-access-token", "expires_in": 3600, "token_type": "Bearer"})
+
+
+def fake_service_account(token_uri: str = "https://oauth2.googleapis.com/token") -> str:
+    """Return service account JSON with a freshly generated key, for the Drive code paths."""
+    import rsa  # installed with google-auth
+
+    _, private_key = rsa.newkeys(1024)
+    return json.dumps({
+        "type": "service_account",
+        "project_id": "benchmark",
+        "private_key_id": "benchmark",
+        "private_key": private_key.save_pkcs1().decode("ascii"),
+        "client_email": "benchmark@benchmark.iam.gserviceaccount.com",
+        "client_id": "0",
+        "token_uri": token_uri,
+    })
+
+
+def sample_titles(count: int, seed: int = 0) -> List[Tuple[str, str]]:
+    """Deterministic (title, author) pairs for generated CSVs."""
+    words = ("river", "glass", "winter", "empire", "garden", "shadow", "letters", "harbor", "orchard",
+             "machine", "silent", "northern", "paper", "lantern", "stone", "voyage")
+    rng = random.Random(seed)
+    return [
+        (" ".join(rng.choice(words) for _ in range(rng.randint(2, 4))).title() + f" {i}",
+         f"Author {rng.randint(1, 500)}")
+        for i in range(count)
+    ]
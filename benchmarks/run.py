@@ -0,0 +1,169 @@
+"""
+Benchmark harness for the harvest scripts and the search endpoints.
+
+Starts local fake upstreams (benchmarks/fake_upstreams.py), points every
+upstream host at them through HTTP_HOST_OVERRIDES and runs each scenario in a
+fresh process with its own working directory, so peak memory and metrics are
+per scenario. Writes a JSON report for comparing runs.
+
+Usage:
+    python -m benchmarks.run --books 500 --latency 0.02 --out benchmarks/reports/baseline.json
+    python -m benchmarks.run --scenarios flask_search --queries 200 --throttle-rate 0.05
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_upstreams import FakeUpstreamConfig, FakeUpstreams, fake_service_account  # noqa: E402
+from benchmarks.scenarios import SCENARIOS, run_scenario  # noqa: E402
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+REPORTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "reports")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark the harvest scripts and search endpoints "
+                                                 "against local fake upstreams.")
+    parser.add_argument("--scenarios", default="all",
+                        help=f"Comma-separated scenarios or 'all': {', '.join(SCENARIOS)}")
+    parser.add_argument("--books", type=int, default=200, help="Books/rows per harvest and import scenario")
+    parser.add_argument("--queries", type=int, default=100, help="Requests per Flask scenario")
+    parser.add_argument("--distinct-ratio", type=float, default=1.0,
+                        help="Fraction of Flask queries that are distinct (the rest hit the search cache)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Workers or concurrent clients")
+    parser.add_argument("--latency", type=float, default=0.01, help="Seconds added to every fake response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Up to this many extra seconds per response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of 503 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--text-kb", type=int, default=512, help="Size of each fake full text")
+    parser.add_argument("--relevant-results", type=int, default=400,
+                        help="Search results per query that match it (the harvest stops paging after them)")
+    parser.add_argument("--max-pages", type=int, default=25, help="Harvest page cap per topic and source")
+    parser.add_argument("--calls-per-minute", type=float, default=60000,
+                        help="Starting rate for every host limiter (use 60 to reproduce production pacing)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="In-flight cap for every host limiter")
+    parser.add_argument("--http-cache", action="store_true",
+                        help="Keep the on-disk HTTP cache on (a fresh one per scenario)")
+    parser.add_argument("--upload-drain-timeout", type=float, default=30.0,
+                        help="Seconds Flask scenarios wait for queued Drive uploads")
+    parser.add_argument("--seed", type=int, default=0, help="Seed for generated data and fault injection")
+    parser.add_argument("--log-level", default="WARNING", help="Log level inside the scenarios")
+    parser.add_argument("--out", help=f"Report path (default: a timestamped file in {REPORTS_DIR})")
+    return parser.parse_args()
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def child_environment(upstreams: FakeUpstreams, args) -> Dict[str, str]:
+    """Environment for the scenario processes: upstream overrides and settings the app requires."""
+    return {
+        "HTTP_HOST_OVERRIDES": upstreams.host_overrides(),
+        "HTTP_CACHE_ENABLED": "true" if args.http_cache else "false",
+        # One pooled connection per request the limiters let through, or the pool becomes the cap
+        "HTTP_POOL_MAXSIZE": str(max(args.max_in_flight, args.concurrency)),
+        "USE_MOCK_DATA": "false",
+        "GOOGLE_BOOKS_API_KEY": "benchmark",
+        "GOOGLE_APPLICATION_CREDENTIALS": fake_service_account(),
+        "GOOGLE_DRIVE_FOLDER_ID": "benchmark",
+        "SECRET_KEY": "benchmark",
+        "API_KEY": "benchmark",
+    }
+
+
+def main():
+    args = parse_args()
+    names = list(SCENARIOS) if args.scenarios == "all" else [name.strip() for name in args.scenarios.split(",")]
+    unknown = [name for name in names if name not in SCENARIOS]
+    if unknown:
+        logger.error(f"Unknown scenarios: {', '.join(unknown)}")
+        sys.exit(2)
+
+    config = FakeUpstreamConfig(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                                throttle_rate=args.throttle_rate, retry_after=args.retry_after,
+                                text_bytes=args.text_kb * 1024, relevant_results=args.relevant_results,
+                                seed=args.seed)
+    upstreams = FakeUpstreams(config).start()
+    # Children read these at import time (http_client.PoolConfig, app settings)
+    os.environ.update(child_environment(upstreams, args))
+
+    params = {
+        "books": args.books,
+        "queries": args.queries,
+        "distinct_ratio": args.distinct_ratio,
+        "concurrency": args.concurrency,
+        "max_pages": args.max_pages,
+        "calls_per_minute": args.calls_per_minute,
+        "max_in_flight": args.max_in_flight,
+        "upload_drain_timeout": args.upload_drain_timeout,
+        "seed": args.seed,
+        "log_level": args.log_level.upper(),
+    }
+    report = {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "fake_upstreams": config.as_dict(),
+        "scenarios": {},
+    }
+
+    spawn = multiprocessing.get_context("spawn")
+    try:
+        for name in names:
+            before = upstreams.stats()["requests"]
+            with tempfile.TemporaryDirectory(prefix=f"bench-{name}-") as workdir:
+                logger.info(f"Running {name}...")
+                started = time.monotonic()
+                with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as executor:
+                    result = executor.submit(run_scenario, name, params, workdir).result()
+            after = upstreams.stats()["requests"]
+            result["upstream_requests"] = {route: count - before.get(route, 0)
+                                           for route, count in after.items() if count != before.get(route, 0)}
+            result["wall_seconds"] = round(time.monotonic() - started, 3)
+            report["scenarios"][name] = result
+            latency = result.get("latency") or {}
+            logger.info(
+                f"{name}: {result['status']}, {result.get('throughput_per_s')} {result.get('unit', '')}/s, "
+                f"p50 {latency.get('p50_ms')} ms, p99 {latency.get('p99_ms')} ms, "
+                f"peak RSS {result.get('memory', {}).get('peak_rss_mb')} MB"
+            )
+    finally:
+        report["fake_upstream_stats"] = upstreams.stats()
+        upstreams.stop()
+
+    out = args.out or os.path.join(REPORTS_DIR, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    logger.info(f"Wrote benchmark report to {out}")
+    if any(result["status"] != "ok" for result in report["scenarios"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
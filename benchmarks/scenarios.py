@@ -0,0 +1,289 @@
+import csv
+import logging
+import os
+import resource
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.fake_upstreams import FAKE_HOSTS, fake_olid, sample_titles  # noqa: E402
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def percentiles(samples: List[float]) -> Optional[Dict]:
+    """Nearest-rank p50/p99 (and mean, max) of latencies in seconds, reported in milliseconds."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(q):
+        return ordered[min(len(ordered) - 1, max(int(q * len(ordered) + 0.5) - 1, 0))]
+
+    return {
+        "count": len(ordered),
+        "p50_ms": round(rank(0.50) * 1000, 2),
+        "p99_ms": round(rank(0.99) * 1000, 2),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+class UpstreamLatencies:
+    """Collects the latency of every response on the shared requests session."""
+
+    def __init__(self):
+        self.samples: List[float] = []
+        self._lock = threading.Lock()
+
+    def attach(self) -> "UpstreamLatencies":
+        import http_client
+        http_client.get_session().hooks["response"].append(self._hook)
+        return self
+
+    def _hook(self, response, *args, **kwargs):
+        with self._lock:
+            self.samples.append(response.elapsed.total_seconds())
+        return response
+
+
+def _lift_rate_limits(params: Dict):
+    """Benchmarks measure our code, so by default the host limiters are opened up."""
+    import rate_limiter
+    for host in FAKE_HOSTS:
+        rate_limiter.configure_host(host, calls_per_minute=params["calls_per_minute"],
+                                    max_in_flight=params["max_in_flight"])
+
+
+def _write_books_csv(path: str, rows: int, seed: int, with_olids: bool = True):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["title", "authors", "description"])
+        for i, (title, author) in enumerate(sample_titles(rows, seed)):
+            olid = fake_olid("csv", seed, i)
+            writer.writerow([title, author, f"Edition {olid} of {title}" if with_olids else title])
+
+
+def _harvest_db(books: int, seed: int) -> sqlite3.Connection:
+    """A fresh books.db (in the working directory) holding books with OLIDs."""
+    import extract_content
+    conn = sqlite3.connect(extract_content.Config.DB_PATH, check_same_thread=False)
+    extract_content.init_database(conn)
+    with conn:
+        conn.executemany(
+            "INSERT INTO books (olid, title, authors, source) VALUES (?, ?, ?, 'Open Library')",
+            [(fake_olid("harvest", seed, i), title, author)
+             for i, (title, author) in enumerate(sample_titles(books, seed))]
+        )
+    return conn
+
+
+def _result(items: int, unit: str, seconds: float, latency: Optional[Dict], latency_of: str,
+            baseline_rss: float, **extra) -> Dict:
+    import metrics
+    return {
+        "items": items,
+        "unit": unit,
+        "seconds": round(seconds, 3),
+        "throughput_per_s": round(items / seconds, 2) if seconds else None,
+        "latency": latency,
+        "latency_of": latency_of,
+        "memory": {"baseline_rss_mb": baseline_rss, "peak_rss_mb": peak_rss_mb()},
+        **extra,
+        "breakdown": metrics.summarize(),
+    }
+
+
+def bench_import_csv(params: Dict) -> Dict:
+    """import_csv_to_database (row by row) or, with bulk, bulk_import_csv_to_database."""
+    import extract_content
+    rows = params["books"]
+    _write_books_csv(os.path.join("data", "raw_csv", "books.csv"), rows, params["seed"])
+    conn = sqlite3.connect(extract_content.Config.DB_PATH)
+    extract_content.init_database(conn)
+    baseline = peak_rss_mb()
+
+    started = time.monotonic()
+    if params.get("bulk"):
+        imported = extract_content.bulk_import_csv_to_database(conn, os.path.join("data", "raw_csv"))
+    else:
+        imported = extract_content.import_csv_to_database(conn, os.path.join("data", "raw_csv"))
+    seconds = time.monotonic() - started
+    conn.close()
+    return _result(imported, "rows", seconds, None, "n/a (single call)", baseline, csv_rows=rows)
+
+
+def bench_process_books_in_batches(params: Dict) -> Dict:
+    """Sequential harvest of texts and covers (process_books_in_batches)."""
+    import extract_content
+    _lift_rate_limits(params)
+    conn = _harvest_db(params["books"], params["seed"])
+    latencies = UpstreamLatencies().attach()
+    baseline = peak_rss_mb()
+
+    started = time.monotonic()
+    processed = extract_content.process_books_in_batches(conn)
+    seconds = time.monotonic() - started
+    texts = conn.execute("SELECT COUNT(*) FROM full_texts").fetchone()[0]
+    covers = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    conn.close()
+    return _result(processed, "books", seconds, percentiles(latencies.samples), "upstream requests",
+                   baseline, texts_saved=texts, covers_saved=covers)
+
+
+def bench_process_books_concurrently(params: Dict) -> Dict:
+    """Concurrent harvest with the batching writer (process_books_concurrently)."""
+    import extract_content
+    _lift_rate_limits(params)
+    conn = _harvest_db(params["books"], params["seed"])
+    latencies = UpstreamLatencies().attach()
+    baseline = peak_rss_mb()
+
+    started = time.monotonic()
+    processed = extract_content.process_books_concurrently(conn, concurrency=params["concurrency"])
+    seconds = time.monotonic() - started
+    texts = conn.execute("SELECT COUNT(*) FROM full_texts").fetchone()[0]
+    covers = conn.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+    conn.close()
+    return _result(processed, "books", seconds, percentiles(latencies.samples), "upstream requests",
+                   baseline, texts_saved=texts, covers_saved=covers, concurrency=params["concurrency"])
+
+
+def bench_extract_book_data(params: Dict) -> Dict:
+    """Google Books + Open Library enrichment of a CSV (extract_book_data.process_books)."""
+    import extract_book_data
+    _lift_rate_limits(params)
+    input_csv = os.path.join("data", "raw_csv", "books.csv")
+    output_csv = os.path.join("data", "processed", "books.csv")
+    os.makedirs(os.path.dirname(output_csv), exist_ok=True)
+    _write_books_csv(input_csv, params["books"], params["seed"], with_olids=False)
+    latencies = UpstreamLatencies().attach()
+    baseline = peak_rss_mb()
+
+    started = time.monotonic()
+    lookups = extract_book_data.process_books(input_csv, output_csv)
+    seconds = time.monotonic() - started
+    with open(output_csv, newline="", encoding="utf-8") as f:
+        rows = sum(1 for _ in csv.DictReader(f))
+
+    # Same input again: answered from the enrichment store
+    rerun_started = time.monotonic()
+    rerun_lookups = extract_book_data.process_books(input_csv, output_csv + ".rerun")
+    rerun_seconds = time.monotonic() - rerun_started
+    return _result(rows, "rows", seconds, percentiles(latencies.samples), "upstream requests", baseline,
+                   lookups=lookups, rerun={"seconds": round(rerun_seconds, 3), "lookups": rerun_lookups})
+
+
+def bench_harvest(params: Dict) -> Dict:
+    """fetch_books.harvest over the default topics on both sources, paging until relevance drops."""
+    import extract_content
+    import fetch_books
+    _lift_rate_limits(params)
+    conn = sqlite3.connect(extract_content.Config.DB_PATH)
+    extract_content.init_database(conn)
+    latencies = UpstreamLatencies().attach()
+    baseline = peak_rss_mb()
+
+    started = time.monotonic()
+    streams = fetch_books.harvest(conn, fetch_books.DEFAULT_TOPICS, max_pages=params["max_pages"])
+    seconds = time.monotonic() - started
+    books = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+    conn.close()
+    pages = sum(stream["pages"] for stream in streams.values())
+    stopped: Dict[str, int] = {}
+    for stream in streams.values():
+        reason = stream["stopped"].split(" ")[0]
+        stopped[reason] = stopped.get(reason, 0) + 1
+    return _result(pages, "pages", seconds, percentiles(latencies.samples), "upstream requests", baseline,
+                   books_stored=books, topics=len(fetch_books.DEFAULT_TOPICS), stopped=stopped)
+
+
+def _flask_requests(params: Dict, request: Callable) -> Dict:
+    """Drive one endpoint with params["concurrency"] clients; request(client, i) returns a status code."""
+    from app import app
+    _lift_rate_limits(params)
+    queries = params["queries"]
+    distinct = max(1, int(queries * params["distinct_ratio"]))
+    samples: List[float] = []
+    statuses: Dict[int, int] = {}
+    lock = threading.Lock()
+    local = threading.local()
+
+    def run(i):
+        client = getattr(local, "client", None)
+        if client is None:
+            client = local.client = app.test_client()
+        started = time.monotonic()
+        status = request(client, f"benchmark query {i % distinct}")
+        with lock:
+            samples.append(time.monotonic() - started)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    baseline = peak_rss_mb()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=params["concurrency"]) as executor:
+        list(executor.map(run, range(queries)))
+    seconds = time.monotonic() - started
+
+    uploads = app.extensions['upload_queue']
+    deadline = time.monotonic() + params["upload_drain_timeout"]
+    while time.monotonic() < deadline:
+        jobs = uploads.stats()["jobs"]
+        if not jobs.get("queued") and not jobs.get("running"):
+            break
+        time.sleep(0.1)
+    return _result(queries, "requests", seconds, percentiles(samples), "endpoint requests", baseline,
+                   statuses=statuses, distinct_queries=distinct, concurrency=params["concurrency"],
+                   uploads=uploads.stats())
+
+
+def bench_flask_search(params: Dict) -> Dict:
+    """GET /api/v1/search (federated Google Books + Open Library, Drive upload queued)."""
+    return _flask_requests(params, lambda client, q: client.get("/api/v1/search", query_string={"query": q}).status_code)
+
+
+def bench_flask_search_stream(params: Dict) -> Dict:
+    """GET /api/v1/search/stream, read to the end (including the Drive link event)."""
+    def request(client, q):
+        response = client.get("/api/v1/search/stream", query_string={"query": q, "format": "ndjson"})
+        response.get_data()
+        return response.status_code
+    return _flask_requests(params, request)
+
+
+SCENARIOS: Dict[str, Callable[[Dict], Dict]] = {
+    "import_csv": bench_import_csv,
+    "bulk_import_csv": lambda params: bench_import_csv({**params, "bulk": True}),
+    "process_books_in_batches": bench_process_books_in_batches,
+    "process_books_concurrently": bench_process_books_concurrently,
+    "extract_book_data": bench_extract_book_data,
+    "harvest": bench_harvest,
+    "flask_search": bench_flask_search,
+    "flask_search_stream": bench_flask_search_stream,
+}
+
+
+def run_scenario(name: str, params: Dict, workdir: str) -> Dict:
+    """Entry point in the benchmark's child process: run one scenario inside workdir."""
+    os.chdir(workdir)
+    logging.basicConfig(level=params["log_level"])
+    logging.getLogger().setLevel(params["log_level"])
+    try:
+        return {"status": "ok", **SCENARIOS[name](params)}
+    except Exception as e:
+        logger.error(f"Benchmark {name} failed: {e}", exc_info=True)
+        return {"status": "failed", "error": f"{type(e).__name__}: {e}"}
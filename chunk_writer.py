@@ -0,0 +1,231 @@
+import glob
+import json
+import logging
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from typing import Dict, Optional
+
+import pandas as pd
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "parquet")
+PARQUET_PART_ROWS = 5000  # rows per Parquet part file, the unit of commit for Parquet output
+
+
+def _pyarrow():
+    """Import pyarrow on first use; it is optional and heavy, and only Parquet output needs it."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet output needs pyarrow (pip install pyarrow)") from None
+    return pyarrow, pyarrow.parquet
+
+
+def _input_signature(input_path: str) -> Dict:
+    stat = os.stat(input_path)
+    return {"input": os.path.abspath(input_path), "input_size": stat.st_size, "input_mtime": stat.st_mtime}
+
+
+def _write_json_atomic(path: str, data: Dict):
+    """Write via a temporary file, fsync and rename, so the file is either old or new, never partial."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)))
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+class ChunkWriter(ABC):
+    """
+    Writes enriched chunks to an output with a row-offset checkpoint for resuming.
+
+    The checkpoint (<output>.checkpoint.json) records how many input rows
+    are committed and exactly how much output they occupy. It is replaced
+    atomically only after the output data is flushed to disk, so whatever
+    is in the output beyond the checkpoint (from a crash mid-write) is
+    discarded when the writer is reopened, and rows_done is where a rerun
+    resumes. A checkpoint for another input file (or a changed one) or
+    another format is ignored and the output is started over.
+
+    Args:
+        input_path (str): The CSV being enriched.
+        output_path (str): Output file (CSV) or directory (Parquet).
+    """
+
+    format = ""
+
+    def __init__(self, input_path: str, output_path: str):
+        self.output_path = output_path
+        self.checkpoint_path = f"{output_path}.checkpoint.json"
+        self.signature = {**_input_signature(input_path), "format": self.format}
+        self.state = self._load_checkpoint()
+        if self.state is None:
+            self.state = {**self.signature, "rows_done": 0, "complete": False}
+            self._reset()
+        else:
+            self._rollback()
+            if self.rows_done:
+                logger.info(f"Resuming {output_path} after {self.rows_done} committed rows")
+
+    def _load_checkpoint(self) -> Optional[Dict]:
+        try:
+            with open(self.checkpoint_path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable checkpoint {self.checkpoint_path}: {e}")
+            return None
+        if any(state.get(name) != value for name, value in self.signature.items()):
+            logger.info(f"Checkpoint {self.checkpoint_path} is for another input or format; starting over")
+            return None
+        return state
+
+    @property
+    def rows_done(self) -> int:
+        return self.state["rows_done"]
+
+    @property
+    def complete(self) -> bool:
+        return self.state["complete"]
+
+    def _save(self, **changes):
+        self.state.update(changes)
+        _write_json_atomic(self.checkpoint_path, self.state)
+
+    @abstractmethod
+    def _reset(self):
+        """Remove any previous output; called when there is no usable checkpoint."""
+
+    @abstractmethod
+    def _rollback(self):
+        """Drop output written after the last checkpoint."""
+
+    @abstractmethod
+    def write(self, chunk: pd.DataFrame):
+        """Add a chunk of enriched rows; it is committed now (CSV) or with its part (Parquet)."""
+
+    def close(self):
+        """Commit anything buffered and mark the output complete."""
+        self._save(complete=True)
+
+
+class CsvChunkWriter(ChunkWriter):
+    """One CSV file; every chunk is appended, fsynced and committed on its own."""
+
+    format = "csv"
+
+    def _reset(self):
+        if os.path.exists(self.output_path):
+            os.remove(self.output_path)
+        self.state["output_bytes"] = 0
+
+    def _rollback(self):
+        size = os.path.getsize(self.output_path) if os.path.exists(self.output_path) else 0
+        if size < self.state["output_bytes"]:
+            logger.warning(f"{self.output_path} is shorter than its checkpoint; starting over")
+            self.state.update(rows_done=0, complete=False)
+            self._reset()
+        elif size > self.state["output_bytes"]:
+            logger.info(f"Discarding {size - self.state['output_bytes']} uncommitted bytes of {self.output_path}")
+            os.truncate(self.output_path, self.state["output_bytes"])
+
+    def write(self, chunk: pd.DataFrame):
+        with open(self.output_path, "a", newline="", encoding="utf-8") as f:
+            # Header only at the start of the file
+            chunk.to_csv(f, index=False, header=self.state["output_bytes"] == 0)
+            f.flush()
+            os.fsync(f.fileno())
+            output_bytes = f.tell()
+        self._save(rows_done=self.rows_done + len(chunk), output_bytes=output_bytes)
+
+
+class ParquetChunkWriter(ChunkWriter):
+    """
+    A directory of Parquet part files with every column stored as a string.
+
+    Chunks are buffered into parts of about PARQUET_PART_ROWS rows; each part
+    is written to a temporary file and renamed into place, then committed.
+    Rows still buffered at a crash are redone on the rerun.
+    """
+
+    format = "parquet"
+
+    def __init__(self, input_path: str, output_path: str, part_rows: int = PARQUET_PART_ROWS):
+        self.pa, self.pq = _pyarrow()
+        self.part_rows = part_rows
+        self._buffer = []
+        self._buffered_rows = 0
+        super().__init__(input_path, output_path)
+
+    def _part_path(self, index: int) -> str:
+        return os.path.join(self.output_path, f"part-{index:05d}.parquet")
+
+    def _reset(self):
+        os.makedirs(self.output_path, exist_ok=True)
+        for path in glob.glob(os.path.join(self.output_path, "part-*.parquet")):
+            os.remove(path)
+        self.state["parts"] = 0
+
+    def _rollback(self):
+        os.makedirs(self.output_path, exist_ok=True)
+        committed = {self._part_path(i) for i in range(self.state["parts"])}
+        for path in glob.glob(os.path.join(self.output_path, "part-*.parquet")):
+            if path not in committed:
+                logger.info(f"Discarding uncommitted part {path}")
+                os.remove(path)
+
+    def write(self, chunk: pd.DataFrame):
+        self._buffer.append(chunk)
+        self._buffered_rows += len(chunk)
+        if self._buffered_rows >= self.part_rows:
+            self._commit_part()
+
+    def _commit_part(self):
+        frame = pd.concat(self._buffer, ignore_index=True)
+        # Explicit dtypes: the same all-string schema for every part, whatever the values in it
+        schema = self.pa.schema([(str(column), self.pa.string()) for column in frame.columns])
+        table = self.pa.Table.from_pandas(frame.astype("string"), schema=schema, preserve_index=False)
+        path = self._part_path(self.state["parts"])
+        # Dot-prefixed so dataset readers skip it
+        fd, tmp_path = tempfile.mkstemp(dir=self.output_path, prefix=".part-", suffix=".tmp")
+        os.close(fd)
+        try:
+            self.pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        self._save(rows_done=self.rows_done + len(frame), parts=self.state["parts"] + 1)
+        self._buffer, self._buffered_rows = [], 0
+
+    def close(self):
+        if self._buffer:
+            self._commit_part()
+        super().close()
+
+
+def open_writer(input_path: str, output_path: str, output_format: str = "csv") -> ChunkWriter:
+    """Open (and resume, if a checkpoint allows) a writer for output_format ("csv" or "parquet")."""
+    if output_format == "csv":
+        return CsvChunkWriter(input_path, output_path)
+    if output_format == "parquet":
+        return ParquetChunkWriter(input_path, output_path)
+    raise ValueError(f"Unknown output format {output_format!r}; expected one of {', '.join(FORMATS)}")
+
+
+def read_processed(path: str) -> pd.DataFrame:
+    """Load a processed output written by either writer, with every column as a string."""
+    if os.path.isdir(path) or path.endswith(".parquet"):
+        _pyarrow()
+        return pd.read_parquet(path)
+    return pd.read_csv(path, dtype="string")
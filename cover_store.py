@@ -0,0 +1,263 @@
+import hashlib
+import io
+import logging
+import mmap
+import os
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, Optional
+
+from singleflight import SingleFlight
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it covers are served at full size
+    Image = None
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Thumbnail widths in pixels by size name
+THUMBNAIL_SIZES = {"small": 96, "medium": 240}
+# Open Library answers missing covers with a tiny stand-in image
+PLACEHOLDER_MAX_BYTES = 1024
+STREAM_BLOCK_SIZE = 64 * 1024
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"RIFF", "image/webp"),
+)
+
+
+def sniff_content_type(data: bytes) -> Optional[str]:
+    """Return the image MIME type from the leading bytes, or None if it is not an image."""
+    for signature, content_type in _SIGNATURES:
+        if data.startswith(signature):
+            return content_type
+    return None
+
+
+def is_placeholder(data: bytes) -> bool:
+    """True for empty, non-image or stand-in (tiny or 1x1 GIF) cover responses."""
+    if not data or len(data) < PLACEHOLDER_MAX_BYTES:
+        return True
+    content_type = sniff_content_type(data)
+    if content_type is None:
+        return True
+    if content_type == "image/gif":
+        width = int.from_bytes(data[6:8], "little")
+        height = int.from_bytes(data[8:10], "little")
+        return width <= 1 or height <= 1
+    return False
+
+
+def init_cover_columns(conn: sqlite3.Connection):
+    """Add the content hash and type columns to the images table."""
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(images)")]
+    for column in ("sha256", "content_type"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE images ADD COLUMN {column} TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS images_sha256 ON images (sha256)")
+    conn.commit()
+
+
+class CoverStore:
+    """
+    Content-addressed cover files with lazily generated, LRU-evicted thumbnails.
+
+    Originals are stored once per SHA-256 under root/ab/cd/<sha256>, so the
+    same image downloaded for many books takes space once. Thumbnails live
+    under root/thumbs/<size>/ and are capped at thumbnail_max_bytes, evicting
+    the least recently served first.
+
+    Args:
+        root (str): Directory for the store; created on first write.
+        thumbnail_max_bytes (int): Disk budget for generated thumbnails.
+    """
+
+    def __init__(self, root: str, thumbnail_max_bytes: int = 64 * 1024 * 1024):
+        self.root = root
+        self.thumbnail_max_bytes = thumbnail_max_bytes
+        self._lock = threading.Lock()
+        self._thumbnails: "Optional[OrderedDict[str, int]]" = None
+        self._thumbnail_bytes = 0
+        self._single_flight = SingleFlight()
+        self._counters = {"stored": 0, "deduplicated": 0, "thumbnails_generated": 0,
+                          "thumbnails_evicted": 0}
+
+    def path(self, sha256: str, size: Optional[str] = None) -> str:
+        if size:
+            return os.path.join(self.root, "thumbs", size, sha256)
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def put(self, data: bytes) -> str:
+        """Store an image unless an identical one exists and return its SHA-256."""
+        sha256 = hashlib.sha256(data).hexdigest()
+        path = self.path(sha256)
+        if os.path.exists(path):
+            with self._lock:
+                self._counters["deduplicated"] += 1
+            return sha256
+        self._write(path, data)
+        with self._lock:
+            self._counters["stored"] += 1
+        return sha256
+
+    def _write(self, path: str, data: bytes):
+        """Write via a temporary file and rename, so readers never see a partial image."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def iter_file(self, path: str) -> Iterator[bytes]:
+        """Yield a stored file from a memory map in STREAM_BLOCK_SIZE pieces."""
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for start in range(0, len(mapped), STREAM_BLOCK_SIZE):
+                yield mapped[start:start + STREAM_BLOCK_SIZE]
+
+    def thumbnail(self, sha256: str, size: str) -> Optional[str]:
+        """
+        Return the path of a thumbnail, generating it on first use.
+
+        Returns None when Pillow is not installed or the original cannot be
+        decoded; callers then serve the original. Concurrent requests for the
+        same missing thumbnail generate it once.
+        """
+        if Image is None or size not in THUMBNAIL_SIZES:
+            return None
+        path = self.path(sha256, size)
+        key = f"{size}/{sha256}"
+        if os.path.exists(path):
+            self._touch(key)
+            return path
+        return self._single_flight.do(key, lambda: self._make_thumbnail(sha256, size, key))
+
+    def _make_thumbnail(self, sha256: str, size: str, key: str) -> Optional[str]:
+        path = self.path(sha256, size)
+        if os.path.exists(path):
+            return path
+        width = THUMBNAIL_SIZES[size]
+        try:
+            with Image.open(self.path(sha256)) as image:
+                image.thumbnail((width, width * 2))
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, format="JPEG", quality=85, optimize=True)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Cannot make {size} thumbnail of cover {sha256}: {e}")
+            return None
+
+        data = buffer.getvalue()
+        self._write(path, data)
+        with self._lock:
+            self._counters["thumbnails_generated"] += 1
+        self._touch(key, len(data))
+        return path
+
+    def _load_thumbnails(self):
+        """Index thumbnails already on disk, least recently used first."""
+        entries = []
+        thumbs_dir = os.path.join(self.root, "thumbs")
+        for size in os.listdir(thumbs_dir) if os.path.isdir(thumbs_dir) else []:
+            for name in os.listdir(os.path.join(thumbs_dir, size)):
+                stat = os.stat(os.path.join(thumbs_dir, size, name))
+                entries.append((stat.st_atime, f"{size}/{name}", stat.st_size))
+        self._thumbnails = OrderedDict((key, nbytes) for _, key, nbytes in sorted(entries))
+        self._thumbnail_bytes = sum(self._thumbnails.values())
+
+    def _touch(self, key: str, nbytes: Optional[int] = None):
+        """Mark a thumbnail as just used (or newly added) and evict past the byte budget."""
+        evicted = []
+        with self._lock:
+            if self._thumbnails is None:
+                self._load_thumbnails()
+            if key in self._thumbnails:
+                self._thumbnails.move_to_end(key)
+            elif nbytes is not None:
+                self._thumbnails[key] = nbytes
+                self._thumbnail_bytes += nbytes
+            while self._thumbnail_bytes > self.thumbnail_max_bytes and len(self._thumbnails) > 1:
+                old_key, old_bytes = self._thumbnails.popitem(last=False)
+                self._thumbnail_bytes -= old_bytes
+                self._counters["thumbnails_evicted"] += 1
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(os.path.join(self.root, "thumbs", old_key))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                **self._counters,
+                "thumbnails": len(self._thumbnails or {}),
+                "thumbnail_bytes": self._thumbnail_bytes,
+                "thumbnails_enabled": Image is not None,
+            }
+
+
+def save_cover(conn: sqlite3.Connection, store: CoverStore, book_id: int, data: bytes) -> Optional[str]:
+    """
+    Store a cover for a book, skipping placeholders. Does not commit.
+
+    Returns:
+        Optional[str]: The SHA-256 of the stored image, or None for a placeholder.
+    """
+    if is_placeholder(data):
+        logger.info(f"Skipping placeholder cover for book {book_id}")
+        return None
+    sha256 = store.put(data)
+    conn.execute("""
+        INSERT INTO images (book_id, image_type, image_data, sha256, content_type)
+        VALUES (?, 'cover', NULL, ?, ?)
+    """, (book_id, sha256, sniff_content_type(data)))
+    return sha256
+
+
+def migrate_image_blobs(conn: sqlite3.Connection, store: CoverStore) -> int:
+    """Move covers stored as BLOBs in the images table into the store. Returns the number moved."""
+    ids = [row[0] for row in conn.execute(
+        "SELECT id FROM images WHERE sha256 IS NULL AND image_data IS NOT NULL"
+    )]
+    moved = 0
+    for image_id in ids:
+        (data,) = conn.execute("SELECT image_data FROM images WHERE id = ?", (image_id,)).fetchone()
+        with conn:
+            if is_placeholder(data):
+                conn.execute("DELETE FROM images WHERE id = ?", (image_id,))
+                continue
+            conn.execute(
+                "UPDATE images SET sha256 = ?, content_type = ?, image_data = NULL WHERE id = ?",
+                (store.put(data), sniff_content_type(data), image_id)
+            )
+        moved += 1
+    if ids:
+        logger.info(f"Moved {moved} cover images into the cover store, dropped {len(ids) - moved} placeholders")
+    return moved
+
+
+def find_cover(conn: sqlite3.Connection, olid: str) -> Optional[Dict]:
+    """Return the latest cover of a book by OLID: its sha256, content type and any legacy BLOB."""
+    row = conn.execute("""
+        SELECT i.sha256, i.content_type, i.image_data
+        FROM images i JOIN books b ON b.id = i.book_id
+        WHERE b.olid = ? AND i.image_type = 'cover'
+        ORDER BY i.id DESC LIMIT 1
+    """, (olid,)).fetchone()
+    if row is None:
+        return None
+    sha256, content_type, data = row
+    if sha256 is None and data is not None:
+        sha256, content_type = hashlib.sha256(data).hexdigest(), sniff_content_type(data)
+    return {"sha256": sha256, "content_type": content_type, "data": data}
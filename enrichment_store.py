@@ -0,0 +1,161 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from federated_search import normalize_text
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class EnrichmentStoreConfig:
+    """Enrichment store settings for extract_book_data, overridable through environment variables."""
+    ENABLED = os.getenv("ENRICHMENT_STORE_ENABLED", "true").lower() == "true"
+    PATH = os.getenv("ENRICHMENT_STORE_PATH", "data/enrichment.db")
+    TTL = float(os.getenv("ENRICHMENT_STORE_TTL", str(90 * 24 * 3600)))  # seconds, for found results
+    NEGATIVE_TTL = float(os.getenv("ENRICHMENT_STORE_NEGATIVE_TTL", str(7 * 24 * 3600)))  # for misses
+
+
+GOOGLE_BOOKS = "google_books"
+OPEN_LIBRARY = "open_library"
+
+# Stored fields and check timestamp column per source. A result counts as
+# found when its last field is set (the summary, or the full-text link).
+SOURCES = {
+    GOOGLE_BOOKS: (("summary",), "google_checked_at"),
+    OPEN_LIBRARY: (("first_sentence", "full_text_link"), "open_library_checked_at"),
+}
+
+
+def enrichment_key(title, authors) -> str:
+    """Normalized title|authors key; missing (NaN) CSV values count as empty."""
+    title = title if isinstance(title, str) else ""
+    authors = authors if isinstance(authors, str) else ""
+    return f"{normalize_text(title)}|{normalize_text(authors)}"
+
+
+class EnrichmentStore:
+    """
+    Persistent results of the Google Books and Open Library enrichment lookups.
+
+    One row per normalized title and author holds each source's fields and
+    when that source was last checked. A found result is reused for ttl
+    seconds and a miss (nothing found) for the shorter negative_ttl, after
+    which the lookup is repeated. Failed lookups are never stored.
+
+    Args:
+        db_path (str): SQLite file for the store.
+        ttl (float): Seconds a found result is reused.
+        negative_ttl (float): Seconds a miss is reused.
+    """
+
+    def __init__(self, db_path: str, ttl: float = EnrichmentStoreConfig.TTL,
+                 negative_ttl: float = EnrichmentStoreConfig.NEGATIVE_TTL):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._owner_pid: Optional[int] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open (or reopen after a fork) the store database. Call with the lock held."""
+        if self._conn is None or self._owner_pid != os.getpid():
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS enrichments (
+                    lookup_key TEXT PRIMARY KEY,
+                    title TEXT,
+                    authors TEXT,
+                    summary TEXT,
+                    google_checked_at REAL,
+                    first_sentence TEXT,
+                    full_text_link TEXT,
+                    open_library_checked_at REAL
+                )
+            """)
+            conn.commit()
+            self._conn = conn
+            self._owner_pid = os.getpid()
+        return self._conn
+
+    def get_many(self, source: str, keys: List[str]) -> Dict[str, Tuple]:
+        """
+        Return the fresh stored results of a source for the given keys.
+
+        Returns:
+            Dict[str, Tuple]: The source's fields per key, for keys whose result
+            (found or not) is still fresh. Other keys are left out.
+        """
+        fields, checked_column = SOURCES[source]
+        now = time.time()
+        results: Dict[str, Tuple] = {}
+        keys = list(dict.fromkeys(keys))
+        with self._lock:
+            conn = self._connection()
+            # Stay under SQLite's bound-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                for key, checked_at, *values in conn.execute(
+                    f"SELECT lookup_key, {checked_column}, {', '.join(fields)} FROM enrichments "
+                    f"WHERE {checked_column} IS NOT NULL AND lookup_key IN ({placeholders})",
+                    chunk
+                ):
+                    ttl = self.ttl if values[-1] else self.negative_ttl
+                    if now - checked_at <= ttl:
+                        results[key] = tuple(values)
+        return results
+
+    def put_many(self, source: str, rows: List[Tuple[str, str, str, Tuple]]):
+        """
+        Store lookup results of a source in one transaction.
+
+        Args:
+            source (str): GOOGLE_BOOKS or OPEN_LIBRARY.
+            rows (List[Tuple[str, str, str, Tuple]]): (key, title, authors, fields).
+        """
+        if not rows:
+            return
+        fields, checked_column = SOURCES[source]
+        columns = ("lookup_key", "title", "authors", *fields, checked_column)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in (*fields, checked_column))
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(f"""
+                    INSERT INTO enrichments ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})
+                    ON CONFLICT (lookup_key) DO UPDATE SET {updates}
+                """, [(key, title, authors, *values, now) for key, title, authors, values in rows])
+
+    def stats(self) -> Dict:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT COUNT(*), COUNT(google_checked_at), COUNT(summary), "
+                "COUNT(open_library_checked_at), COUNT(full_text_link) FROM enrichments"
+            ).fetchone()
+        return {"entries": row[0], GOOGLE_BOOKS: {"checked": row[1], "found": row[2]},
+                OPEN_LIBRARY: {"checked": row[3], "found": row[4]}}
+
+
+_store: Optional[EnrichmentStore] = None
+_store_lock = threading.Lock()
+
+
+def get_enrichment_store() -> Optional[EnrichmentStore]:
+    """Return the process-wide enrichment store, or None if ENRICHMENT_STORE_ENABLED is false."""
+    global _store
+    if not EnrichmentStoreConfig.ENABLED:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = EnrichmentStore(EnrichmentStoreConfig.PATH)
+        return _store
@@ -1,13 +1,22 @@
+import argparse
 import os
 import time
 import logging
 import pandas as pd
 import requests
-from typing import Tuple, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
-from ratelimit import limits, sleep_and_retry
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Deque, Dict, List, Tuple, Optional
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 import glob
+import http_client
+import http_cache
+import enrichment_store
+import metrics
+import rate_limiter
+from chunk_writer import FORMATS, ChunkWriter, open_writer
+from enrichment_store import EnrichmentStore, enrichment_key, get_enrichment_store
 
 # Load environment variables
 load_dotenv()
@@ -16,119 +25,340 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Rate limits
+# Starting rate limits (calls per minute); the shared host limiters adapt them to
+# 429s, Retry-After and rate-limit headers
 GOOGLE_BOOKS_CALLS = 100
 OPEN_LIBRARY_CALLS = 60
-PERIOD = 60  # 1 minute
+# Lookups in flight per API; each API has its own worker pool of this size
+GOOGLE_BOOKS_IN_FLIGHT = 4
+OPEN_LIBRARY_IN_FLIGHT = 4
+rate_limiter.configure_host("www.googleapis.com", calls_per_minute=GOOGLE_BOOKS_CALLS,
+                            max_in_flight=GOOGLE_BOOKS_IN_FLIGHT)
+rate_limiter.configure_host("openlibrary.org", calls_per_minute=OPEN_LIBRARY_CALLS,
+                            max_in_flight=OPEN_LIBRARY_IN_FLIGHT)
+CHUNKS_IN_FLIGHT = 3  # chunks whose lookups are queued ahead of the one being written
+LOOKUP_ATTEMPTS = 3  # tries per lookup on connection errors, 429s and 5xx before the file fails
+
+RUN_SUMMARY_DIR = "data/runs"  # JSON metrics summary per run
 
 # Get API key from environment
 GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
 if not GOOGLE_BOOKS_API_KEY:
     raise RuntimeError("GOOGLE_BOOKS_API_KEY environment variable is not set")
 
-@sleep_and_retry
-@limits(calls=GOOGLE_BOOKS_CALLS, period=PERIOD)
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-def fetch_google_books_summary(title: str, author: str) -> Optional[str]:
+def _google_books_summary(title: str, author: str) -> Optional[str]:
+    """Google Books description of a title; request errors propagate to _lookup."""
+    query = f"{title} {author}".replace(" ", "+")
+    url = f"https://www.googleapis.com/books/v1/volumes?q={query}&key={GOOGLE_BOOKS_API_KEY}"
+
+    response = http_cache.get(url, timeout=http_client.timeout(10))
+    response.raise_for_status()
+    data = response.json()
+
+    for item in data.get("items", []):
+        volume_info = item.get("volumeInfo", {})
+        if description := volume_info.get("description"):
+            logger.info(f"Found Google Books summary for: {title}")
+            return description
+
+    logger.warning(f"No Google Books summary found for: {title}")
+    return None
+
+def _open_library_details(title: str) -> Tuple[Optional[str], Optional[str]]:
+    """Open Library (first sentence, full-text link) of a title; request errors propagate to _lookup."""
+    query = title.replace(" ", "+")
+    url = f"https://openlibrary.org/search.json?title={query}&limit=1"
+
+    response = http_cache.get(url, timeout=http_client.timeout(10))
+    response.raise_for_status()
+    data = response.json()
+
+    if docs := data.get("docs", []):
+        book_data = docs[0]
+        first_sentence = book_data.get("first_sentence", [""])[0] if "first_sentence" in book_data else None
+        key = book_data.get("key")
+        full_text_link = f"https://openlibrary.org{key}" if key else None
+
+        logger.info(f"Found Open Library details for: {title}")
+        return first_sentence, full_text_link
+
+    logger.warning(f"No Open Library details found for: {title}")
+    return None, None
+
+class LookupFailed(Exception):
+    """Raised when a lookup still fails after LOOKUP_ATTEMPTS; its chunk must not be committed"""
+    pass
+
+def _is_transient(error: BaseException) -> bool:
+    """Errors worth another try: anything but a 4xx answer (other than a 429) to the request."""
+    if isinstance(error, requests.HTTPError) and error.response is not None:
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (requests.RequestException, ValueError))
+
+def _with_retries(lookup: Callable, stage: str) -> Callable:
+    """Retry a lookup on transient errors with exponential backoff, up to LOOKUP_ATTEMPTS."""
+    return retry(
+        stop=stop_after_attempt(LOOKUP_ATTEMPTS),
+        wait=wait_exponential(multiplier=1, min=2, max=10),
+        retry=retry_if_exception(_is_transient),
+        before_sleep=metrics.retry_recorder(stage),
+        reraise=True
+    )(lookup)
+
+def _lookup(stage: str, lookup: Callable, *args) -> Tuple[Optional[Tuple], bool]:
     """
-    Fetch book summaries from Google Books API with rate limiting and retries.
-    
-    Args:
-        title (str): Book title
-        author (str): Book author
-        
+    Run a lookup with retries for a worker.
+
     Returns:
-        Optional[str]: Book description or None if not found
+        Tuple[Optional[Tuple], bool]: The lookup's result (None if it failed),
+        and whether the API rejected the request with a 4xx.
+
+    Raises:
+        LookupFailed: A transient error outlasted the retries.
     """
-    query = f"{title} {author}".replace(" ", "+")
-    url = f"https://www.googleapis.com/books/v1/volumes?q={query}&key={GOOGLE_BOOKS_API_KEY}"
+    with metrics.STAGE_SECONDS.time(stage=stage):
+        try:
+            return _with_retries(lookup, stage)(*args), False
+        except (requests.RequestException, ValueError) as e:
+            metrics.STAGE_ITEMS.inc(stage=stage, status="failed")
+            if _is_transient(e):
+                raise LookupFailed(f"{stage} lookup for {args[0]!r} failed {LOOKUP_ATTEMPTS} times: {e}") from e
+            logger.error(f"{stage} lookup for {args[0]!r} was rejected: {e}")
+            return None, True
 
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+def _lookup_google(title: str, author: str) -> Optional[Tuple]:
+    """
+    Worker: (summary,), or None if Google Books rejected the request (not stored).
 
-        for item in data.get("items", []):
-            volume_info = item.get("volumeInfo", {})
-            if description := volume_info.get("description"):
-                logger.info(f"Found Google Books summary for: {title}")
-                return description
-        
-        logger.warning(f"No Google Books summary found for: {title}")
+    Raises:
+        LookupFailed: The lookup kept failing on connection errors, 429s or 5xx.
+    """
+    summary, failed = _lookup("google_summary", _google_books_summary, title, author)
+    if failed:
         return None
+    metrics.STAGE_ITEMS.inc(stage="google_summary", status="found" if summary else "missing")
+    return (summary,)
+
+def _lookup_open_library(title: str, author: str) -> Optional[Tuple]:
+    """
+    Worker: (first sentence, full text link), or None if Open Library rejected the request.
 
-    except requests.RequestException as e:
-        logger.error(f"Error fetching Google Books data for {title}: {e}")
+    Raises:
+        LookupFailed: The lookup kept failing on connection errors, 429s or 5xx.
+    """
+    details, failed = _lookup("open_library_details", _open_library_details, title)
+    if failed:
         return None
+    toc, full_text = details
+    metrics.STAGE_ITEMS.inc(stage="open_library_details", status="found" if full_text else "missing")
+    return toc, full_text
 
-@sleep_and_retry
-@limits(calls=OPEN_LIBRARY_CALLS, period=PERIOD)
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-def fetch_open_library_details(title: str) -> Tuple[Optional[str], Optional[str]]:
+class _SourceLookups:
     """
-    Fetch book details from Open Library with rate limiting and retries.
-    
+    Deduplicated lookups against one API for a run of process_books.
+
+    Each distinct title/author key costs at most one request per run: rows
+    are answered from the enrichment store when it has a fresh result, from
+    the lookup already in flight for an earlier row with the same key, and
+    only otherwise by submitting a new lookup to the API's pool.
+
     Args:
-        title (str): Book title
-        
-    Returns:
-        Tuple[Optional[str], Optional[str]]: (Table of contents, Full text link)
+        source (str): enrichment_store.GOOGLE_BOOKS or OPEN_LIBRARY.
+        pool (ThreadPoolExecutor): The API's worker pool.
+        lookup (Callable): Worker returning the source's fields, or None on failure.
+        store (Optional[EnrichmentStore]): Persistent results, or None to always look up.
     """
-    query = title.replace(" ", "+")
-    url = f"https://openlibrary.org/search.json?title={query}&limit=1"
 
-    try:
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()
-        data = response.json()
+    def __init__(self, source: str, pool: ThreadPoolExecutor, lookup: Callable,
+                 store: Optional[EnrichmentStore]):
+        self.source = source
+        self.pool = pool
+        self.lookup = lookup
+        self.store = store
+        self.empty = (None,) * len(enrichment_store.SOURCES[source][0])
+        self._in_flight: Dict[str, Future] = {}
+        self.counts = {"hit": 0, "negative_hit": 0, "duplicate": 0, "miss": 0}
+        self.skipped = 0  # rows without a title
 
-        if docs := data.get("docs", []):
-            book_data = docs[0]
-            first_sentence = book_data.get("first_sentence", [""])[0] if "first_sentence" in book_data else None
-            key = book_data.get("key")
-            full_text_link = f"https://openlibrary.org{key}" if key else None
-            
-            logger.info(f"Found Open Library details for: {title}")
-            return first_sentence, full_text_link
-
-        logger.warning(f"No Open Library details found for: {title}")
-        return None, None
-
-    except requests.RequestException as e:
-        logger.error(f"Error fetching Open Library data for {title}: {e}")
-        return None, None
-
-def process_books(input_csv: str, output_csv: str, batch_size: int = 10):
-    try:
-        # Read CSV in chunks
-        for chunk in pd.read_csv(input_csv, chunksize=batch_size):
-            # Process this chunk
-            for index, row in chunk.iterrows():
-                title = row["title"]
-                author = row["authors"]
-
-                google_summary = fetch_google_books_summary(title, author)
-                toc, full_text = fetch_open_library_details(title)
-
-                chunk.at[index, "Summary"] = google_summary
-                chunk.at[index, "Table of Contents"] = toc
-                chunk.at[index, "Full Text Link"] = full_text
-
-            # Write this chunk to CSV
-            if not os.path.exists(output_csv):
-                # First chunk - write with headers
-                chunk.to_csv(output_csv, index=False, mode='w')
+    def submit(self, rows: List[Tuple[str, str, str]]) -> List[Future]:
+        """Return a future per (key, title, author) row, in row order."""
+        cached = self.store.get_many(
+            self.source, [key for key, _, _ in rows if key not in self._in_flight]
+        ) if self.store else {}
+        futures = []
+        for key, title, author in rows:
+            if key.startswith("|"):
+                # Nothing to search for without a title
+                future = Future()
+                future.set_result(self.empty)
+                self.skipped += 1
+                futures.append(future)
+                continue
+            future = self._in_flight.get(key)
+            if future is not None:
+                result = "duplicate"
+            elif key in cached:
+                result = "hit" if cached[key][-1] else "negative_hit"
+                future = Future()
+                future.set_result(cached[key])
             else:
-                # Append without headers
-                chunk.to_csv(output_csv, index=False, mode='a', header=False)
-            
-            logger.info(f"Processed and saved batch of {len(chunk)} books")
+                result = "miss"
+                future = self.pool.submit(self.lookup, title, author)
+                self._in_flight[key] = future
+            self.counts[result] += 1
+            metrics.CACHE_LOOKUPS.inc(cache=f"enrichment_{self.source}", result=result)
+            futures.append(future)
+        return futures
+
+    def results(self, rows: List[Tuple[str, str, str]], futures: List[Future]) -> List[Tuple]:
+        """
+        Wait for a chunk's futures and store the lookups it started.
+
+        Rejected lookups come back empty. A LookupFailed from a worker is
+        raised here, before the chunk can be written and checkpointed.
+        """
+        new = []
+        for (key, title, author), future in zip(rows, futures):
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+                if future.result() is not None:
+                    new.append((key, title, author, future.result()))
+        if self.store:
+            with metrics.DB_WRITE_SECONDS.time(operation="store_enrichments"):
+                self.store.put_many(self.source, new)
+        return [future.result() or self.empty for future in futures]
+
+    def summary(self) -> Dict[str, int]:
+        lookups = sum(self.counts.values())
+        return {**self.counts, "skipped": self.skipped, "lookups": lookups, "calls": self.counts["miss"],
+                "calls_saved": lookups - self.counts["miss"]}
 
-    except Exception as e:
-        logger.error(f"Error processing books: {e}", exc_info=True)
-        raise
+def _write_chunk(chunk: pd.DataFrame, rows: List[Tuple[str, str, str]], google: _SourceLookups,
+                 google_futures: List[Future], open_library: _SourceLookups, ol_futures: List[Future],
+                 writer: ChunkWriter, progress: Optional[Callable[[int], None]] = None):
+    """Wait for a chunk's lookups, fill in its columns in row order and hand it to the writer."""
+    chunk["Summary"] = [summary for summary, in google.results(rows, google_futures)]
+    details = open_library.results(rows, ol_futures)
+    chunk["Table of Contents"] = [toc for toc, _ in details]
+    chunk["Full Text Link"] = [full_text for _, full_text in details]
+
+    with metrics.STAGE_SECONDS.time(stage="write_chunk"):
+        writer.write(chunk)
+
+    logger.info(f"Processed and saved batch of {len(chunk)} books")
+    if progress:
+        progress(len(chunk))
+
+def process_books(input_csv: str, output_path: str, batch_size: int = 10,
+                  store: Optional[EnrichmentStore] = None, output_format: str = "csv",
+                  progress: Optional[Callable[[int], None]] = None) -> Dict[str, Dict[str, int]]:
+    """
+    Enrich a CSV of books with Google Books summaries and Open Library details.
+
+    Rows are keyed by normalized title and author. A key is answered from the
+    enrichment store while its result is fresh (misses are kept for a shorter
+    time than finds) and is looked up at most once per run however often it
+    repeats, so re-runs over overlapping inputs make few or no requests.
+
+    The two APIs are queried concurrently, each from its own worker pool and
+    under its own host limiter, so a chunk takes about as long as the slower
+    API rather than the sum of both. Lookups for the next CHUNKS_IN_FLIGHT
+    chunks are queued while the oldest one is waited on. Chunks are written
+    in input order as soon as all of their rows complete, so the output has
+    the same row order as the input.
+
+    Each written chunk is committed with a row-offset checkpoint next to the
+    output (see chunk_writer), so a rerun after a crash resumes after the
+    last committed row instead of duplicating rows or starting over, and a
+    file that was completed is skipped. Lookups are retried on connection
+    errors, 429s and 5xx; one that still fails raises LookupFailed before
+    its chunk is committed, so a rerun looks its rows up again instead of
+    keeping them empty.
+
+    Args:
+        input_csv (str): CSV with "title" and "authors" columns
+        output_path (str): Output CSV file, or Parquet directory
+        batch_size (int): Rows per chunk read and written
+        store (Optional[EnrichmentStore]): Defaults to the process-wide store
+        output_format (str): "csv" or "parquet" (needs pyarrow)
+        progress (Optional[Callable[[int], None]]): Called with the row count of each written chunk
+
+    Returns:
+        Dict[str, Dict[str, int]]: Per API, how rows were answered (hit,
+        negative_hit, duplicate, miss) and the requests made and saved.
+    """
+    writer = open_writer(input_csv, output_path, output_format)
+    if writer.complete:
+        logger.info(f"{output_path} is already complete; skipping {os.path.basename(input_csv)}")
+        return {}
+    store = store or get_enrichment_store()
+    offset = 0  # input rows read so far
+    pending: Deque[Tuple[pd.DataFrame, List[Tuple[str, str, str]], List[Future], List[Future]]] = deque()
+    with ThreadPoolExecutor(max_workers=GOOGLE_BOOKS_IN_FLIGHT, thread_name_prefix="google") as google_pool, \
+            ThreadPoolExecutor(max_workers=OPEN_LIBRARY_IN_FLIGHT, thread_name_prefix="openlibrary") as ol_pool:
+        google = _SourceLookups(enrichment_store.GOOGLE_BOOKS, google_pool, _lookup_google, store)
+        open_library = _SourceLookups(enrichment_store.OPEN_LIBRARY, ol_pool, _lookup_open_library, store)
+        try:
+            # Read CSV in chunks; every column as text, so chunks agree on dtypes
+            for chunk in pd.read_csv(input_csv, chunksize=batch_size, dtype=str):
+                offset += len(chunk)
+                if offset <= writer.rows_done:
+                    continue
+                if offset - len(chunk) < writer.rows_done:
+                    # Resuming inside this chunk
+                    chunk = chunk.iloc[len(chunk) - (offset - writer.rows_done):]
+                rows = [(enrichment_key(title, author), title, author)
+                        for title, author in zip(chunk["title"].tolist(), chunk["authors"].tolist())]
+                pending.append((chunk, rows, google.submit(rows), open_library.submit(rows)))
+
+                if len(pending) > CHUNKS_IN_FLIGHT:
+                    chunk, rows, google_futures, ol_futures = pending.popleft()
+                    _write_chunk(chunk, rows, google, google_futures, open_library, ol_futures, writer, progress)
+
+            while pending:
+                chunk, rows, google_futures, ol_futures = pending.popleft()
+                _write_chunk(chunk, rows, google, google_futures, open_library, ol_futures, writer, progress)
+            writer.close()
+
+        except Exception as e:
+            # Don't wait for lookups of chunks that will never be written
+            for _, _, google_futures, ol_futures in pending:
+                for future in google_futures + ol_futures:
+                    future.cancel()
+            logger.error(f"Error processing books: {e}", exc_info=True)
+            raise
+
+    stats = {google.source: google.summary(), open_library.source: open_library.summary()}
+    logger.info(f"Enrichment lookups for {os.path.basename(input_csv)}: "
+                + ", ".join(f"{source} {s['calls']} requests, {s['calls_saved']} saved"
+                            for source, s in stats.items()))
+    return stats
+
+def merge_lookup_stats(total: Dict[str, Dict[str, int]], stats: Dict[str, Dict[str, int]]):
+    """Add one process_books() result into a run total."""
+    for source, counts in stats.items():
+        for name, value in counts.items():
+            total.setdefault(source, {}).setdefault(name, 0)
+            total[source][name] += value
+
+def processed_output_path(input_file: str, output_format: str = "csv") -> str:
+    """data/processed/processed_<name>.csv, or processed_<name>.parquet (a directory) for Parquet."""
+    filename = os.path.basename(input_file)
+    if output_format == "parquet":
+        filename = f"{os.path.splitext(filename)[0]}.parquet"
+    return os.path.join("data/processed", f"processed_{filename}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enrich data/raw_csv/*.csv with Google Books and Open Library data")
+    parser.add_argument(
+        "--format", choices=FORMATS, default="csv",
+        help="Output format; parquet (needs pyarrow) writes a directory of part files with string columns"
+    )
+    return parser.parse_args()
 
 if __name__ == "__main__":
+    args = parse_args()
     # Create output directory if it doesn't exist
     os.makedirs("data/processed", exist_ok=True)
     
@@ -140,16 +370,27 @@ if __name__ == "__main__":
         exit(1)
         
     logger.info(f"Found {len(csv_files)} CSV files to process")
-    
+    started_at = time.time()
+    failed_files = []
+    lookups: Dict[str, Dict[str, int]] = {}
+
     for input_file in csv_files:
         try:
             # Create output filename
             filename = os.path.basename(input_file)
-            output_file = os.path.join("data/processed", f"processed_{filename}")
+            output_file = processed_output_path(input_file, args.format)
             
             logger.info(f"Processing file: {filename}")
-            process_books(input_file, output_file)
+            merge_lookup_stats(lookups, process_books(input_file, output_file, output_format=args.format))
             
         except Exception as e:
             logger.error(f"Error processing {filename}: {e}")
+            failed_files.append(input_file)
             continue
+
+    metrics.write_run_summary(
+        metrics.run_summary_path(RUN_SUMMARY_DIR, "extract_book_data"), "extract_book_data", started_at,
+        status="ok" if not failed_files else "partial", files=len(csv_files), failed_files=failed_files,
+        output_format=args.format, rate_limits=rate_limiter.limiter_stats(), enrichment_lookups=lookups,
+        calls_saved={source: counts["calls_saved"] for source, counts in lookups.items()}
+    )
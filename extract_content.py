@@ -2,14 +2,24 @@ import requests
 import sqlite3
 import os
 import logging
-from typing import Optional, Dict, Any, Tuple
-from ratelimit import limits, sleep_and_retry
-from tenacity import retry, stop_after_attempt, wait_exponential
+from typing import Optional, Dict, Any, Tuple, List, Callable
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 from dotenv import load_dotenv
 from contextlib import contextmanager
 import glob
 import pandas as pd
 import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import http_client
+import http_cache
+import metrics
+import rate_limiter
+import ingest_state
+import text_store
+from cover_store import CoverStore, init_cover_columns, migrate_image_blobs, save_cover
+from federated_search import normalize_text
+from local_search import init_search_index
 
 # Load environment variables and setup logging
 load_dotenv()
@@ -23,16 +33,49 @@ class Config:
     """Configuration settings."""
     OPEN_LIBRARY_TEXT_URL = "https://archive.org/stream/{identifier}/text.txt"
     OPEN_LIBRARY_COVER_URL = "https://covers.openlibrary.org/b/olid/{olid}-L.jpg"
+    OPEN_LIBRARY_COVER_PARAMS = {"default": "false"}  # 404 instead of a placeholder image
+    COVER_STORE_DIR = "data/covers"
+    RUN_SUMMARY_DIR = "data/runs"  # JSON metrics summary per run
+    # How long cached responses are used without revalidation, per host (seconds)
+    HTTP_CACHE_TTLS = {
+        "openlibrary.org": 7 * 24 * 3600,
+        "archive.org": 30 * 24 * 3600,
+        "covers.openlibrary.org": 30 * 24 * 3600,
+    }
     OPEN_LIBRARY_API_URL = "https://openlibrary.org"
+    OPEN_LIBRARY_BOOKS_API_URL = "https://openlibrary.org/api/books"
     OPEN_LIBRARY_SEARCH_URL = "https://openlibrary.org/search.json"
     DB_PATH = "books.db"
     BATCH_SIZE = 10
     API_TIMEOUT = 10
-    API_CALLS_PER_MINUTE = 60
     INITIAL_BACKOFF = 2  # seconds
     MAX_BACKOFF = 30  # seconds
     MAX_RETRIES = 5
-    MIN_WAIT_BETWEEN_REQUESTS = 2  # seconds
+    # Per-host starting budgets (calls per minute, requests in flight). The rate then
+    # adapts to each host's 429s, Retry-After and rate-limit headers (see rate_limiter)
+    HOST_LIMITS = {
+        "openlibrary.org": (60, 4),
+        "archive.org": (60, 4),
+        "covers.openlibrary.org": (100, 4),
+    }
+    CONCURRENCY = 8
+    WRITE_BATCH_SIZE = 25
+    IMPORT_CHUNK_SIZE = 50000  # CSV rows per chunk/transaction in bulk import
+    # Incremental mode: a failed stage is retried on later runs after a doubling delay
+    STAGE_MAX_ATTEMPTS = 5
+    STAGE_RETRY_BACKOFF = 60  # seconds
+    STAGE_MAX_BACKOFF = 6 * 3600  # seconds
+    BIBKEYS_BATCH_SIZE = 50  # OLIDs/ISBNs per books API request
+    TITLE_BATCH_SIZE = 10  # titles per batched search.json request
+    NEGATIVE_CACHE_TTL = 30 * 24 * 3600  # seconds before an unmatched title is searched again
+
+for _host, (_calls, _in_flight) in Config.HOST_LIMITS.items():
+    rate_limiter.configure_host(_host, calls_per_minute=_calls, max_in_flight=_in_flight)
+for _host, _ttl in Config.HTTP_CACHE_TTLS.items():
+    http_cache.configure_host_ttl(_host, _ttl)
+
+# Covers are stored once per distinct image, outside the database
+cover_store = CoverStore(Config.COVER_STORE_DIR)
 
 def init_database(conn: sqlite3.Connection):
     """Initialize database tables."""
@@ -45,6 +88,7 @@ def init_database(conn: sqlite3.Connection):
             olid TEXT UNIQUE,
             title TEXT,
             authors TEXT,
+            description TEXT,
             source TEXT,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         );
@@ -74,6 +118,16 @@ def init_database(conn: sqlite3.Connection):
         """)
 
         conn.commit()
+
+        # Full-text index over books and full_texts, kept in sync by triggers
+        init_search_index(conn)
+        # Compressed, chunked storage for downloaded texts
+        text_store.init_text_store(conn)
+        # Content-addressed covers; older BLOB covers are moved out of the database
+        init_cover_columns(conn)
+        migrate_image_blobs(conn, cover_store)
+        # Per-book stage state for incremental runs
+        ingest_state.init_stage_tables(conn)
         logger.info("Database initialized successfully")
 
         # Verify tables were created
@@ -99,32 +153,46 @@ def get_db_connection():
         if conn:
             conn.close()
 
-@sleep_and_retry
-@limits(calls=Config.API_CALLS_PER_MINUTE, period=60)
+class RetryableResponse(requests.RequestException):
+    """Raised for a 429 or 5xx answer, which is worth retrying"""
+    pass
+
 @retry(
     stop=stop_after_attempt(Config.MAX_RETRIES),
     wait=wait_exponential(multiplier=Config.INITIAL_BACKOFF, min=Config.INITIAL_BACKOFF, max=Config.MAX_BACKOFF),
+    retry=retry_if_exception_type((RetryableResponse, requests.ConnectionError, requests.Timeout)),
+    before_sleep=metrics.retry_recorder("api_request"),
     reraise=True
 )
-def make_api_request(url: str, params: Optional[Dict] = None) -> Optional[requests.Response]:
-    """Make rate-limited API request with retries and exponential backoff."""
+def _api_get(url: str, params: Optional[Dict] = None, stream: bool = False) -> requests.Response:
+    response = http_cache.get(
+        url, params=params, stream=stream, timeout=http_client.timeout(Config.API_TIMEOUT)
+    )
+    if response.status_code == 429 or response.status_code >= 500:
+        # The host limiter has already slowed down (and paused for any Retry-After)
+        logger.warning(f"{url} returned {response.status_code}, retrying...")
+        response.close()
+        raise RetryableResponse(f"{url} returned {response.status_code}")
+    response.raise_for_status()
+    return response
+
+def make_api_request(url: str, params: Optional[Dict] = None, stream: bool = False) -> Optional[requests.Response]:
+    """Make an API request through the on-disk HTTP cache and the adaptive per-host limiter.
+
+    Fresh cache hits return at once without using any of the host's budget.
+    Network requests are paced by the host's limiter, which is shared by
+    every caller in the process and safe to use from many threads; 429s and
+    server errors are retried with exponential backoff, other errors are not.
+    With stream=True the body is left unread for iter_content().
+
+    Returns:
+        Optional[requests.Response]: The response, or None if the request failed.
+    """
     try:
-        response = requests.get(url, params=params, timeout=Config.API_TIMEOUT)
-        
-        # Handle different error codes
-        if response.status_code == 429:  # Too Many Requests
-            logger.warning("Rate limit hit, backing off...")
-            time.sleep(Config.MAX_BACKOFF)
-            raise requests.exceptions.RequestException("Rate limit exceeded")
-        elif response.status_code >= 500:  # Server errors
-            logger.warning(f"Server error {response.status_code}, retrying...")
-            time.sleep(Config.INITIAL_BACKOFF)
-            raise requests.exceptions.RequestException(f"Server error: {response.status_code}")
-            
-        response.raise_for_status()
-        time.sleep(Config.MIN_WAIT_BETWEEN_REQUESTS)  # Ensure minimum wait between requests
-        return response
-        
+        return _api_get(url, params, stream=stream)
+    except http_cache.OfflineCacheMiss as e:
+        logger.warning(f"Offline mode: {e}")
+        return None
     except requests.RequestException as e:
         logger.error(f"API request failed: {e}")
         return None
@@ -135,62 +203,114 @@ def validate_olid(olid: str) -> bool:
         return False
     return bool(olid.strip().startswith('OL') and olid.endswith('M'))
 
-def check_openlibrary_full_text(olid: str) -> bool:
-    """Check if book has full text available."""
-    if not validate_olid(olid):
-        return False
+def fetch_bibkeys(bibkeys: List[str], request=None) -> Dict[str, Dict]:
+    """Look up editions on the books API, Config.BIBKEYS_BATCH_SIZE keys per request.
 
-    params = {
-        'bibkeys': f'OLID:{olid}',
-        'jscmd': 'data',
-        'format': 'json'
+    Args:
+        bibkeys (List[str]): Keys such as "OLID:OL123M" or "ISBN:9780140328721".
+        request: Request function, make_api_request by default.
+
+    Returns:
+        Dict[str, Dict]: Edition data per bibkey; {} for keys the API does not
+        know. Keys whose request failed are left out.
+    """
+    results: Dict[str, Dict] = {}
+    bibkeys = list(dict.fromkeys(bibkeys))
+    for i in range(0, len(bibkeys), Config.BIBKEYS_BATCH_SIZE):
+        chunk = bibkeys[i:i + Config.BIBKEYS_BATCH_SIZE]
+        params = {
+            'bibkeys': ','.join(chunk),
+            'jscmd': 'data',
+            'format': 'json'
+        }
+        response = (request or make_api_request)(Config.OPEN_LIBRARY_BOOKS_API_URL, params)
+        if not response:
+            continue
+        try:
+            data = response.json()
+        except ValueError as e:
+            logger.error(f"Invalid books API response for {len(chunk)} bibkeys: {e}")
+            continue
+        for bibkey in chunk:
+            results[bibkey] = data.get(bibkey) or {}
+    return results
+
+def get_openlibrary_ocaids(olids: List[str], request=None) -> Dict[str, Optional[str]]:
+    """Return the ocaid (or None when there is no full text) of each OLID, batching requests.
+
+    OLIDs whose lookup failed are left out so callers can retry them.
+    """
+    valid = [olid for olid in olids if validate_olid(olid)]
+    books = fetch_bibkeys([f"OLID:{olid}" for olid in valid], request=request)
+    return {
+        olid: books[f"OLID:{olid}"].get("ocaid")
+        for olid in valid if f"OLID:{olid}" in books
     }
-    response = make_api_request(Config.OPEN_LIBRARY_API_URL, params)
-    
-    if response:
-        book_data = response.json().get(f"OLID:{olid}", {})
-        return "ocaid" in book_data
-    return False
 
+def get_openlibrary_ocaid(olid: str, request=None) -> Optional[str]:
+    """Return the archive.org identifier (ocaid) of a book, or None if it has no full text."""
+    return get_openlibrary_ocaids([olid], request=request).get(olid)
+
+def check_openlibrary_full_text(olid: str) -> bool:
+    """Check if book has full text available."""
+    return get_openlibrary_ocaid(olid) is not None
+
+@metrics.STAGE_SECONDS.time(stage="download_text")
 def download_openlibrary_text(conn: sqlite3.Connection, olid: str, identifier: str) -> bool:
-    """Download and save full text content."""
+    """Download and save full text content, streamed to disk and stored compressed."""
     text_url = Config.OPEN_LIBRARY_TEXT_URL.format(identifier=identifier)
-    response = make_api_request(text_url)
+    response = make_api_request(text_url, stream=True)
 
     if response:
-        cursor = conn.cursor()
         try:
-            cursor.execute("""
-                INSERT INTO full_texts (book_id, text_content)
-                VALUES ((SELECT id FROM books WHERE olid = ?), ?)
-            """, (olid, response.text))
-            conn.commit()
+            path = text_store.download_to_file(response)
+        except requests.RequestException as e:
+            logger.error(f"Error downloading text for {olid}: {e}")
+            return False
+        try:
+            with metrics.DB_WRITE_SECONDS.time(operation="text"), conn:
+                store_text_for_olid(conn, olid, path)
             logger.info(f"Full text saved for OLID {olid}")
             return True
         except sqlite3.Error as e:
             logger.error(f"Database error saving text for {olid}: {e}")
             return False
+        finally:
+            os.remove(path)
     return False
 
+def book_id_for_olid(conn: sqlite3.Connection, olid: str) -> int:
+    row = conn.execute("SELECT id FROM books WHERE olid = ?", (olid,)).fetchone()
+    if row is None:
+        raise sqlite3.IntegrityError(f"No book with OLID {olid}")
+    return row[0]
+
+def store_text_for_olid(conn: sqlite3.Connection, olid: str, path: str):
+    """Store a downloaded text file for the book with this OLID. Does not commit."""
+    text_store.store_text_file(conn, book_id_for_olid(conn, olid), path)
+
+@metrics.STAGE_SECONDS.time(stage="download_cover")
 def download_openlibrary_cover(conn: sqlite3.Connection, olid: str) -> bool:
-    """Download and save cover image."""
-    image_url = Config.OPEN_LIBRARY_COVER_URL.format(olid=olid)
-    response = make_api_request(image_url)
+    """Download and save cover image in the content-addressed cover store.
 
-    if response:
-        cursor = conn.cursor()
-        try:
-            cursor.execute("""
-                INSERT INTO images (book_id, image_type, image_data)
-                VALUES ((SELECT id FROM books WHERE olid = ?), 'cover', ?)
-            """, (olid, response.content))
-            conn.commit()
-            logger.info(f"Cover image saved for OLID {olid}")
-            return True
-        except sqlite3.Error as e:
-            logger.error(f"Database error saving image for {olid}: {e}")
-            return False
-    return False
+    Returns False when there is no cover (a 404) or it could not be fetched or saved.
+    """
+    try:
+        image = fetch_cover(olid)
+    except StageFailed:
+        return False
+    if image is None:
+        logger.info(f"No cover for OLID {olid}")
+        return False
+    try:
+        with metrics.DB_WRITE_SECONDS.time(operation="cover"), conn:
+            if not save_cover(conn, cover_store, book_id_for_olid(conn, olid), image):
+                return False
+        logger.info(f"Cover image saved for OLID {olid}")
+        return True
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving image for {olid}: {e}")
+        return False
 
 def process_books_in_batches(conn: sqlite3.Connection, batch_size: int = Config.BATCH_SIZE):
     """Process books in batches."""
@@ -202,16 +322,22 @@ def process_books_in_batches(conn: sqlite3.Connection, batch_size: int = Config.
         batch = cursor.fetchmany(batch_size)
         if not batch:
             break
-            
+
+        # One books API request for the whole batch instead of one per book
+        ocaids = get_openlibrary_ocaids([olid for (olid,) in batch if olid])
+
         for (olid,) in batch:
             if not olid or not validate_olid(olid):
                 continue
                 
             logger.info(f"Processing Open Library book: {olid}")
             
-            if check_openlibrary_full_text(olid):
-                download_openlibrary_text(conn, olid, olid)
-            download_openlibrary_cover(conn, olid)
+            ocaid = ocaids[olid] if olid in ocaids else get_openlibrary_ocaid(olid)
+            if ocaid:
+                saved = download_openlibrary_text(conn, olid, ocaid)
+                metrics.STAGE_ITEMS.inc(stage="download_text", status="done" if saved else "failed")
+            saved = download_openlibrary_cover(conn, olid)
+            metrics.STAGE_ITEMS.inc(stage="download_cover", status="done" if saved else "skipped")
             
             processed += 1
             if processed % 10 == 0:
@@ -219,16 +345,162 @@ def process_books_in_batches(conn: sqlite3.Connection, batch_size: int = Config.
 
     return processed
 
-def import_csv_to_database(conn: sqlite3.Connection, csv_dir: str = "data/raw_csv") -> int:
-    """Import books from CSV files into database."""
+class StageFailed(Exception):
+    """Raised when a pipeline stage could not be completed for a book"""
+    pass
+
+class StageSkipped(Exception):
+    """Raised when a pipeline stage has nothing to do for a book; not retried"""
+    pass
+
+def _require(request: Callable) -> Callable:
+    """Wrap a request function so a failed request raises StageFailed instead of returning None."""
+    def checked(url: str, params: Optional[Dict] = None, **kwargs) -> requests.Response:
+        response = request(url, params, **kwargs)
+        if response is None:
+            raise StageFailed(f"Request to {url} failed")
+        return response
+    return checked
+
+def fetch_cover(olid: str) -> Optional[bytes]:
+    """Return the cover image of an edition, or None when Open Library has no cover for it.
+
+    Config.OPEN_LIBRARY_COVER_PARAMS asks for a 404 instead of a placeholder
+    image, so a 404 is the usual "no cover" answer rather than an error.
+
+    Raises:
+        StageFailed: The request failed (connection error, 429 or 5xx, or not cached offline).
+    """
+    url = Config.OPEN_LIBRARY_COVER_URL.format(olid=olid)
+    try:
+        return _api_get(url, Config.OPEN_LIBRARY_COVER_PARAMS).content
+    except requests.HTTPError as e:
+        # _api_get retries 429s and 5xx, so what is left is a 4xx: not worth asking again
+        if e.response is not None and e.response.status_code != 404:
+            logger.warning(f"No cover for {olid}: {e}")
+        return None
+    except http_cache.OfflineCacheMiss as e:
+        logger.warning(f"Offline mode: {e}")
+        raise StageFailed(str(e))
+    except requests.RequestException as e:
+        logger.error(f"Cover request for {olid} failed: {e}")
+        raise StageFailed(str(e))
+
+@metrics.STAGE_SECONDS.time(stage="fetch_assets")
+def fetch_book_assets(olid: str, ocaids: Optional[Dict[str, Optional[str]]] = None) -> Dict[str, Any]:
+    """Fetch the full text (if any) and cover of one book. Network only, no DB access.
+
+    ocaids holds already batch-resolved ocaids; the book is looked up on its own if missing.
+    The text is streamed to a temporary file whose path is returned as "text_path".
+    """
+    assets = {"olid": olid, "text_path": None, "cover": None}
+
+    if ocaids is not None and olid in ocaids:
+        ocaid = ocaids[olid]
+    else:
+        ocaid = get_openlibrary_ocaid(olid)
+    if ocaid:
+        response = make_api_request(Config.OPEN_LIBRARY_TEXT_URL.format(identifier=ocaid), stream=True)
+        if response:
+            try:
+                assets["text_path"] = text_store.download_to_file(response)
+            except requests.RequestException as e:
+                logger.error(f"Error downloading text for {olid}: {e}")
+
+    try:
+        assets["cover"] = fetch_cover(olid)
+    except StageFailed:
+        pass
+    return assets
+
+def write_book_assets(conn: sqlite3.Connection, batch: List[Dict[str, Any]]):
+    """Insert a batch of fetched assets in a single transaction and remove their text files."""
+    texts = [(a["olid"], a["text_path"]) for a in batch if a["text_path"]]
+    covers = [(a["olid"], a["cover"]) for a in batch if a["cover"]]
+    try:
+        with metrics.DB_WRITE_SECONDS.time(operation="book_assets"), conn:
+            for olid, path in texts:
+                store_text_for_olid(conn, olid, path)
+            saved_covers = sum(
+                1 for olid, image in covers
+                if save_cover(conn, cover_store, book_id_for_olid(conn, olid), image)
+            )
+        logger.info(f"Saved {len(texts)} full texts and {saved_covers} covers")
+    except sqlite3.Error as e:
+        logger.error(f"Database error saving batch of {len(batch)} books: {e}")
+    finally:
+        for _, path in texts:
+            os.remove(path)
+
+def process_books_concurrently(conn: sqlite3.Connection, concurrency: int = Config.CONCURRENCY,
+                               write_batch_size: int = Config.WRITE_BATCH_SIZE) -> int:
+    """Process books with a pool of fetch workers and a single batching DB writer.
+
+    Workers only do network I/O, paced per host; this thread is the only one
+    touching the database. At most 2 * concurrency books are in flight, so
+    memory stays bounded however many books are queued.
+    """
+    cursor = conn.cursor()
+    cursor.execute("SELECT olid FROM books WHERE source = 'Open Library'")
+    olids: List[str] = [olid for (olid,) in cursor.fetchall() if olid and validate_olid(olid)]
+
+    processed = 0
+    pending = set()
+    buffer: List[Dict[str, Any]] = []
+    ocaids: Dict[str, Optional[str]] = {}
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingest") as executor:
+        for i, olid in enumerate(olids):
+            if i % Config.BIBKEYS_BATCH_SIZE == 0:
+                # Resolve the next batch of ocaids with one books API request
+                ocaids = get_openlibrary_ocaids(olids[i:i + Config.BIBKEYS_BATCH_SIZE])
+            pending.add(executor.submit(fetch_book_assets, olid, ocaids))
+            if len(pending) < concurrency * 2:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            processed += _collect(done, buffer)
+            if len(buffer) >= write_batch_size:
+                write_book_assets(conn, buffer)
+                buffer.clear()
+                logger.info(f"Processed {processed} books")
+
+        done, _ = wait(pending)
+        processed += _collect(done, buffer)
+    if buffer:
+        write_book_assets(conn, buffer)
+
+    logger.info(f"Processed {processed} books")
+    return processed
+
+def _collect(done, buffer: List[Dict[str, Any]]) -> int:
+    count = 0
+    for future in done:
+        try:
+            buffer.append(future.result())
+            count += 1
+            metrics.STAGE_ITEMS.inc(stage="fetch_assets", status="done")
+        except Exception as e:
+            metrics.STAGE_ITEMS.inc(stage="fetch_assets", status="failed")
+            logger.error(f"Failed to fetch book assets: {e}")
+    return count
+
+def import_csv_to_database(conn: sqlite3.Connection, csv_dir: str = "data/raw_csv",
+                           csv_files: Optional[List[str]] = None,
+                           on_file_done: Optional[Callable[[str, int], None]] = None) -> int:
+    """Import books from CSV files (all of csv_dir unless csv_files is given) into database.
+
+    on_file_done(csv_file, imported) is called after each file that imported without error.
+    """
     imported = 0
     cursor = conn.cursor()
 
     try:
-        csv_files = glob.glob(os.path.join(csv_dir, "*.csv"))
+        if csv_files is None:
+            csv_files = glob.glob(os.path.join(csv_dir, "*.csv"))
         logger.info(f"Found {len(csv_files)} CSV files to import")
 
         for csv_file in csv_files:
+            file_start = imported
             try:
                 df = pd.read_csv(csv_file)
                 logger.info(f"Processing {csv_file} with {len(df)} records")
@@ -246,9 +518,10 @@ def import_csv_to_database(conn: sqlite3.Connection, csv_dir: str = "data/raw_cs
                                 olid = olid_match.group(0)
 
                         cursor.execute("""
-                            INSERT OR IGNORE INTO books (olid, title, authors, source)
-                            VALUES (?, ?, ?, ?)
-                        """, (olid, row.get('title', ''), row.get('authors', ''), 'Open Library'))
+                            INSERT OR IGNORE INTO books (olid, title, authors, description, source)
+                            VALUES (?, ?, ?, ?, ?)
+                        """, (olid, row.get('title', ''), row.get('authors', ''),
+                              row.get('description'), 'Open Library'))
                         
                         if cursor.rowcount > 0:
                             imported += 1
@@ -261,8 +534,12 @@ def import_csv_to_database(conn: sqlite3.Connection, csv_dir: str = "data/raw_cs
                         logger.error(f"Error importing row: {row.get('title', 'Unknown')} - {e}")
                         continue
 
-                conn.commit()
+                with metrics.DB_WRITE_SECONDS.time(operation="csv_import"):
+                    conn.commit()
+                metrics.STAGE_ITEMS.inc(imported - file_start, stage="csv_import", status="imported")
                 logger.info(f"Imported {imported} books from {csv_file}")
+                if on_file_done:
+                    on_file_done(csv_file, imported - file_start)
 
             except Exception as e:
                 logger.error(f"Error processing {csv_file}: {e}")
@@ -280,113 +557,495 @@ def import_csv_to_database(conn: sqlite3.Connection, csv_dir: str = "data/raw_cs
         logger.error(f"Import failed: {e}")
         raise
 
+@contextmanager
+def bulk_load_pragmas(conn: sqlite3.Connection):
+    """Switch to WAL with synchronous=NORMAL for a bulk load, restoring the old settings after."""
+    journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    try:
+        yield
+    finally:
+        conn.execute(f"PRAGMA synchronous={int(synchronous)}")
+        conn.execute(f"PRAGMA journal_mode={journal_mode}")
+
+def bulk_import_csv_to_database(conn: sqlite3.Connection, csv_dir: str = "data/raw_csv",
+                                chunksize: int = Config.IMPORT_CHUNK_SIZE,
+                                csv_files: Optional[List[str]] = None,
+                                on_file_done: Optional[Callable[[str, int], None]] = None) -> int:
+    """Import books from CSV files in streamed chunks with vectorized parsing.
+
+    Same rows as import_csv_to_database, but each chunk is parsed with pandas
+    string operations and written with one executemany per transaction, so
+    memory is bounded by chunksize regardless of file size.
+    """
+    imported = 0
+    if csv_files is None:
+        csv_files = glob.glob(os.path.join(csv_dir, "*.csv"))
+    logger.info(f"Found {len(csv_files)} CSV files to bulk import")
+
+    with bulk_load_pragmas(conn):
+        for csv_file in csv_files:
+            file_imported = 0
+            try:
+                chunks = pd.read_csv(
+                    csv_file,
+                    chunksize=chunksize,
+                    usecols=lambda column: column in ("title", "authors", "description"),
+                    dtype=str,
+                    keep_default_na=False
+                )
+                for chunk in chunks:
+                    empty = pd.Series("", index=chunk.index)
+                    description = chunk["description"] if "description" in chunk else empty
+                    olids = description.str.extract(r"(OL\d+M)", expand=False)
+
+                    frame = pd.DataFrame({
+                        "olid": olids,
+                        "title": chunk["title"] if "title" in chunk else empty,
+                        "authors": chunk["authors"] if "authors" in chunk else empty,
+                        "description": description.replace("", None),
+                    })
+                    rows = frame.astype(object).where(frame.notna(), None)
+                    rows["source"] = "Open Library"
+
+                    with metrics.DB_WRITE_SECONDS.time(operation="csv_import"), conn:
+                        cursor = conn.executemany("""
+                            INSERT OR IGNORE INTO books (olid, title, authors, description, source)
+                            VALUES (?, ?, ?, ?, ?)
+                        """, rows.itertuples(index=False, name=None))
+                        file_imported += cursor.rowcount
+                    metrics.STAGE_ITEMS.inc(cursor.rowcount, stage="csv_import", status="imported")
+
+                imported += file_imported
+                logger.info(f"Imported {file_imported} books from {csv_file}")
+                if on_file_done:
+                    on_file_done(csv_file, file_imported)
+            except (sqlite3.Error, ValueError, pd.errors.ParserError) as e:
+                logger.error(f"Error processing {csv_file}: {e}")
+                continue
+
+    logger.info(f"Total books imported: {imported}")
+    return imported
+
+def edition_olid(doc: Dict) -> Optional[str]:
+    """Pick an edition OLID from a search.json doc (its key is a work, not an edition)."""
+    candidates = [doc.get('cover_edition_key')] + list(doc.get('edition_key') or [])[:1]
+    candidates.append(str(doc.get('key', '')).split('/')[-1])
+    return next((olid for olid in candidates if olid and validate_olid(olid)), None)
+
+def _quote(value: str) -> str:
+    """Quote a value for a search.json field query."""
+    return '"' + ' '.join(str(value).replace('"', ' ').replace('\\', ' ').split()) + '"'
+
+def _lookup_key(title: Optional[str], authors: Optional[str]) -> str:
+    return f"{normalize_text(title or '')}|{normalize_text(authors or '')}"
+
+def _authors_match(authors: Optional[str], doc: Dict) -> bool:
+    """True when the book has no author or shares a name token with one of the doc's authors."""
+    wanted = set(normalize_text(authors or '').split())
+    if not wanted:
+        return True
+    found = set(normalize_text(' '.join(doc.get('author_name') or [])).split())
+    return bool(wanted & found)
+
+SEARCH_FIELDS = 'key,title,author_name,edition_key,cover_edition_key'
+
+def search_olid(title: str, authors: Optional[str], request=None) -> Optional[str]:
+    """Search Open Library for a book by title and author and return its edition OLID.
+
+    Tries the most specific query first (fielded title and author), then the
+    title alone, then free text, and stops at the first hit. Variations that
+    come out identical are only sent once.
+    """
+    title = ' '.join(str(title or '').split())
+    authors = ' '.join(str(authors or '').split())
+    if not title:
+        return None
+
+    search_variations = []
+    if authors:
+        search_variations.append(f"title:{_quote(title)} AND author:{_quote(authors)}")
+    search_variations.append(f"title:{_quote(title)}")
+    search_variations.append(f"{title} {authors}".strip())  # Free-text search
+    search_variations.append(' '.join(title.split()[:3]))  # First 3 words of title
+
+    for search_query in dict.fromkeys(search_variations):
+        params = {
+            'q': search_query,
+            'fields': SEARCH_FIELDS,
+            'limit': 1
+        }
+
+        logger.info(f"Searching for: {search_query}")
+        response = (request or make_api_request)(Config.OPEN_LIBRARY_SEARCH_URL, params)
+
+        if response and response.status_code == 200:
+            data = response.json()
+            logger.debug(f"Search '{search_query}' found {data.get('num_found', 0)} results")
+            olid = next((edition_olid(doc) for doc in data.get('docs', []) if edition_olid(doc)), None)
+            if olid:
+                logger.info(f"Found OLID {olid} for '{title}' using query: {search_query}")
+                return olid
+    return None
+
+def search_olids_batch(books: List[Tuple[int, str, Optional[str]]], request=None) -> Dict[int, str]:
+    """Resolve several books with one search.json request, matching docs back by title and author.
+
+    Args:
+        books (List[Tuple[int, str, Optional[str]]]): (book_id, title, authors)
+
+    Returns:
+        Dict[int, str]: Edition OLID per book_id for the books that matched.
+    """
+    titled = [(book_id, title, authors) for book_id, title, authors in books if normalize_text(title or '')]
+    if not titled:
+        return {}
+
+    params = {
+        'q': ' OR '.join(f"title:{_quote(title)}" for _, title, _ in titled),
+        'fields': SEARCH_FIELDS,
+        'limit': len(titled) * 5
+    }
+    response = (request or make_api_request)(Config.OPEN_LIBRARY_SEARCH_URL, params)
+    if not response or response.status_code != 200:
+        return {}
+    try:
+        docs = response.json().get('docs', [])
+    except ValueError as e:
+        logger.error(f"Invalid search response for {len(titled)} titles: {e}")
+        return {}
+
+    docs_by_title: Dict[str, List[Dict]] = {}
+    for doc in docs:
+        docs_by_title.setdefault(normalize_text(doc.get('title', '')), []).append(doc)
+
+    found = {}
+    for book_id, title, authors in titled:
+        for doc in docs_by_title.get(normalize_text(title), []):
+            olid = edition_olid(doc)
+            if olid and _authors_match(authors, doc):
+                found[book_id] = olid
+                break
+    return found
+
+def resolve_olids(conn: sqlite3.Connection, books: List[Tuple[int, str, Optional[str]]],
+                  request=None) -> Dict[int, Optional[str]]:
+    """Find edition OLIDs for books by title and author with as few requests as possible.
+
+    Titles that recently found nothing are skipped (Config.NEGATIVE_CACHE_TTL).
+    The rest are resolved Config.TITLE_BATCH_SIZE at a time with one search
+    request, and only the books a batch did not match go through the
+    per-book search cascade.
+
+    Returns:
+        Dict[int, Optional[str]]: OLID, or None when nothing matched, per
+        book_id. Books whose lookup failed on a request error are left out.
+    """
+    checked = _require(request or make_api_request)
+    keys = {book_id: _lookup_key(title, authors) for book_id, title, authors in books}
+    misses = ingest_state.known_misses(conn, "title", list(keys.values()), Config.NEGATIVE_CACHE_TTL)
+
+    results: Dict[int, Optional[str]] = {}
+    todo = []
+    for book in books:
+        if keys[book[0]] in misses or not normalize_text(book[1] or ''):
+            results[book[0]] = None
+        else:
+            todo.append(book)
+    metrics.CACHE_LOOKUPS.inc(len(results), cache="lookup_misses", result="hit")
+    metrics.CACHE_LOOKUPS.inc(len(todo), cache="lookup_misses", result="miss")
+    if results:
+        logger.info(f"Skipping {len(results)} titles without a recent match")
+
+    for i in range(0, len(todo), Config.TITLE_BATCH_SIZE):
+        batch = todo[i:i + Config.TITLE_BATCH_SIZE]
+        found = search_olids_batch(batch, request=request) if len(batch) > 1 else {}
+        for book_id, title, authors in batch:
+            if book_id not in found:
+                try:
+                    found[book_id] = search_olid(title, authors, request=checked)
+                except StageFailed as e:
+                    logger.warning(f"Lookup failed for '{title}': {e}")
+                    continue
+            results[book_id] = found[book_id]
+
+        ingest_state.record_misses(
+            conn, "title", [keys[book_id] for book_id, *_ in batch if book_id in results and not results[book_id]]
+        )
+        ingest_state.clear_misses(conn, "title", [keys[book_id] for book_id, *_ in batch if results.get(book_id)])
+    return results
+
 def fetch_missing_olids(conn: sqlite3.Connection) -> int:
     """Fetch OLIDs for books that don't have them."""
     cursor = conn.cursor()
     updated = 0
-    batch_size = 10
-    
+    batch_size = Config.TITLE_BATCH_SIZE * 5
+
     try:
         cursor.execute("SELECT id, title, authors FROM books WHERE olid IS NULL")
         books = cursor.fetchall()
         total_books = len(books)
         logger.info(f"Found {total_books} books without OLIDs")
-        
+
         for i in range(0, total_books, batch_size):
             batch = books[i:i+batch_size]
             logger.info(f"Processing batch {i//batch_size + 1} of {(total_books + batch_size - 1)//batch_size}")
-            
-            for book_id, title, authors in batch:
-                try:
-                    # Try different search variations
-                    search_variations = [
-                        f"{title} {authors}".strip(),  # Full search
-                        title.strip(),  # Just title
-                        ' '.join(title.split()[:3])  # First 3 words of title
-                    ]
-                    
-                    for search_query in search_variations:
-                        params = {
-                            'q': search_query,
-                            'fields': 'key,title,author_name',
-                            'limit': 1
-                        }
-                        
-                        logger.info(f"Searching for: {search_query}")
-                        response = make_api_request(Config.OPEN_LIBRARY_SEARCH_URL, params)
-                        
-                        if response and response.status_code == 200:
-                            data = response.json()
-                            num_found = data.get('num_found', 0)
-                            logger.debug(f"Search '{search_query}' found {num_found} results")
-                            if data.get('docs'):
-                                logger.debug(f"First result: {data['docs'][0]}")
-                                doc = data['docs'][0]
-                                key = doc.get('key', '')
-                                if key and isinstance(key, str):
-                                    olid = key.split('/')[-1]
-                                    if validate_olid(olid):
-                                        cursor.execute(
-                                            "UPDATE books SET olid = ? WHERE id = ?",
-                                            (olid, book_id)
-                                        )
-                                        updated += 1
-                                        logger.info(f"Found OLID {olid} for '{title}' using query: {search_query}")
-                                        break  # Stop trying variations if we found a match
-                        
-                        time.sleep(Config.MIN_WAIT_BETWEEN_REQUESTS)
-                    
-                    # Commit every 10 updates
-                    if updated % 10 == 0:
-                        conn.commit()
-                        logger.info(f"Committed {updated} updates")
-                        
-                except Exception as e:
-                    logger.error(f"Error processing book '{title}': {e}")
+
+            for book_id, olid in resolve_olids(conn, batch).items():
+                if not olid:
                     continue
-                
+                try:
+                    cursor.execute("UPDATE books SET olid = ? WHERE id = ?", (olid, book_id))
+                    updated += 1
+                except sqlite3.Error as e:
+                    logger.error(f"Error saving OLID {olid} for book {book_id}: {e}")
+
             # Commit at end of batch
             conn.commit()
             logger.info(f"Completed batch. Total updated: {updated}")
-            
+
         logger.info(f"Finished processing. Updated {updated} books with OLIDs")
         return updated
-        
+
     except Exception as e:
         logger.error(f"Error fetching OLIDs: {e}")
         return 0
 
+def run_stage(conn: sqlite3.Connection, stage: str, fetch: Callable, store: Callable,
+              concurrency: int = 1, prefetch: Optional[Callable[[List[Tuple]], None]] = None,
+              window: Optional[int] = None) -> Dict[str, int]:
+    """Run one pipeline stage for every book it is pending for.
+
+    fetch(row) does the network work, on up to concurrency worker threads.
+    store(conn, row, result) writes the result and returns the stage detail;
+    it runs on this thread in the same transaction that marks the stage done,
+    so a book's data and its stage state cannot drift apart. Failures are
+    recorded with a retry time instead of being raised; a fetch that raises
+    StageSkipped marks the stage skipped for good. prefetch(rows), if
+    given, runs on this thread before each window of rows so lookups can be
+    batched.
+    """
+    rows = ingest_state.pending(conn, stage, Config.STAGE_MAX_ATTEMPTS)
+    logger.info(f"Stage {stage}: {len(rows)} books pending")
+    counts = {"done": 0, "skipped": 0, "failed": 0}
+
+    def attempt(row):
+        try:
+            with metrics.STAGE_SECONDS.time(stage=stage):
+                return row, fetch(row), None
+        except Exception as e:
+            return row, None, e
+
+    window = window or max(concurrency * 2, 1)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=stage) as executor:
+        for i in range(0, len(rows), window):
+            if prefetch:
+                with metrics.STAGE_SECONDS.time(stage=f"{stage}.prefetch"):
+                    prefetch(rows[i:i + window])
+            for row, result, error in executor.map(attempt, rows[i:i + window]):
+                if isinstance(error, StageSkipped):
+                    with conn:
+                        ingest_state.mark_skipped(conn, row[0], stage, str(error))
+                    counts["skipped"] += 1
+                    metrics.STAGE_ITEMS.inc(stage=stage, status="skipped")
+                    continue
+                if error is None:
+                    try:
+                        with metrics.DB_WRITE_SECONDS.time(operation=stage), conn:
+                            detail = store(conn, row, result)
+                            ingest_state.mark_done(conn, row[0], stage, detail)
+                        counts["done"] += 1
+                        metrics.STAGE_ITEMS.inc(stage=stage, status="done")
+                        continue
+                    except sqlite3.Error as e:
+                        error = e
+
+                logger.warning(f"Stage {stage} failed for book {row[0]}: {error}")
+                with conn:
+                    ingest_state.mark_failed(conn, row[0], stage, str(error),
+                                             Config.STAGE_RETRY_BACKOFF, Config.STAGE_MAX_BACKOFF)
+                counts["failed"] += 1
+                metrics.STAGE_ITEMS.inc(stage=stage, status="failed")
+
+    logger.info(f"Stage {stage}: {counts['done']} done, {counts['skipped']} skipped, {counts['failed']} failed")
+    return counts
+
+def run_incremental(conn: sqlite3.Connection, csv_dir: str = "data/raw_csv", concurrency: int = 1,
+                    bulk_import: bool = False) -> Dict[str, Dict[str, int]]:
+    """Bring an existing database up to date without redoing finished work.
+
+    Imports only CSV files not seen before, then runs each per-book stage for
+    the books where it has not completed yet, including failed stages whose
+    backoff has passed.
+
+    Returns:
+        Dict[str, Dict[str, int]]: Book counts per stage and status.
+    """
+    csv_files = ingest_state.new_csv_files(conn, sorted(glob.glob(os.path.join(csv_dir, "*.csv"))))
+    importer = bulk_import_csv_to_database if bulk_import else import_csv_to_database
+    if csv_files:
+        importer(conn, csv_files=csv_files,
+                 on_file_done=lambda csv_file, rows: ingest_state.record_csv_import(conn, csv_file, rows))
+    logger.info(f"Imported {len(csv_files)} new CSV files; {ingest_state.mark_imported(conn)} new books")
+
+    request = _require(make_api_request)
+    # Filled by the batched lookups before each window of a stage runs
+    olids: Dict[int, Optional[str]] = {}
+    ocaids: Dict[str, Optional[str]] = {}
+
+    def prefetch_olids(rows):
+        missing = [(book_id, title, authors) for book_id, olid, title, authors, _ in rows
+                   if not (olid and validate_olid(olid))]
+        olids.update(resolve_olids(conn, missing, request=make_api_request))
+
+    def resolve_olid(row):
+        book_id, olid, title, authors, _ = row
+        if olid and validate_olid(olid):
+            return olid
+        if book_id not in olids:
+            raise StageFailed("Open Library search request failed")
+        if not olids[book_id]:
+            raise StageSkipped("no matching Open Library edition")
+        return olids[book_id]
+
+    def prefetch_ocaids(rows):
+        ocaids.update(get_openlibrary_ocaids([row[4] for row in rows], request=make_api_request))
+
+    def check_text(row):
+        if row[4] in ocaids:
+            return ocaids[row[4]]
+        return get_openlibrary_ocaid(row[4], request=request)
+
+    def store_olid(conn, row, olid):
+        if row[1] != olid:
+            conn.execute("UPDATE books SET olid = ? WHERE id = ?", (olid, row[0]))
+        return olid
+
+    def store_ocaid(conn, row, ocaid):
+        if not ocaid:
+            ingest_state.mark_skipped(conn, row[0], ingest_state.TEXT_DOWNLOADED, "no full text")
+        return ocaid
+
+    def download_text(row):
+        response = request(Config.OPEN_LIBRARY_TEXT_URL.format(identifier=row[4]), stream=True)
+        return text_store.download_to_file(response)
+
+    def store_text(conn, row, path):
+        try:
+            text_store.store_text_file(conn, row[0], path)
+        finally:
+            os.remove(path)
+
+    def download_cover(row):
+        image = fetch_cover(row[4])
+        if image is None:
+            raise StageSkipped("no cover")
+        return image
+
+    def store_cover(conn, row, image):
+        # None (no detail) when Open Library only had a placeholder
+        return save_cover(conn, cover_store, row[0], image)
+
+    # row[4] is the detail of the stage depended on: the OLID, then the ocaid
+    stages = [
+        (ingest_state.OLID_RESOLVED, resolve_olid, store_olid, prefetch_olids),
+        (ingest_state.TEXT_CHECKED, check_text, store_ocaid, prefetch_ocaids),
+        (ingest_state.TEXT_DOWNLOADED, download_text, store_text, None),
+        (ingest_state.COVER_DOWNLOADED, download_cover, store_cover, None),
+    ]
+    for stage, fetch, store, prefetch in stages:
+        run_stage(conn, stage, fetch, store, concurrency=concurrency, prefetch=prefetch,
+                  window=Config.BIBKEYS_BATCH_SIZE if prefetch else None)
+
+    summary = ingest_state.stage_summary(conn)
+    for stage, statuses in summary.items():
+        logger.info(f"Stage {stage}: {statuses}")
+    return summary
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import books and harvest their full texts and covers.")
+    parser.add_argument(
+        "--concurrency", type=int, default=1,
+        help="Books fetched in parallel; 1 keeps the original sequential mode"
+    )
+    parser.add_argument(
+        "--bulk-import", action="store_true",
+        help="Import CSVs in streamed, vectorized chunks (for large library exports)"
+    )
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="Serve every request, full texts included, from the HTTP cache and skip anything not cached"
+    )
+    parser.add_argument(
+        "--incremental", action="store_true",
+        help="Keep the existing database, import only new CSVs and resume unfinished or failed stages"
+    )
+    parser.add_argument(
+        "--summary", metavar="PATH",
+        help=f"Where to write the JSON run summary (default: a timestamped file in {Config.RUN_SUMMARY_DIR})"
+    )
+    return parser.parse_args()
+
 if __name__ == "__main__":
+    args = parse_args()
+    started_at = time.time()
+    status = "interrupted"
+    if args.offline:
+        if http_cache.get_http_cache() is None:
+            logger.error("--offline needs the HTTP cache; unset HTTP_CACHE_ENABLED=false")
+            exit(1)
+        http_cache.get_http_cache().offline = True
     try:
         # Create data directories
         os.makedirs("data/raw_csv", exist_ok=True)
         os.makedirs("data/processed", exist_ok=True)
 
         # Remove existing database if it exists
-        if os.path.exists(Config.DB_PATH):
+        if not args.incremental and os.path.exists(Config.DB_PATH):
             os.remove(Config.DB_PATH)
             logger.info(f"Removed existing database: {Config.DB_PATH}")
 
         with get_db_connection() as conn:
             init_database(conn)
-            
-            try:
-                # Import CSV data
-                total_imported = import_csv_to_database(conn)
-                logger.info(f"Imported {total_imported} books from CSV files")
 
-                # Fetch missing OLIDs
-                updated_olids = fetch_missing_olids(conn)
-                logger.info(f"Updated {updated_olids} books with OLIDs")
+            if args.incremental:
+                run_incremental(conn, concurrency=args.concurrency, bulk_import=args.bulk_import)
+            else:
+                try:
+                    # Import CSV data
+                    if args.bulk_import:
+                        total_imported = bulk_import_csv_to_database(conn)
+                    else:
+                        total_imported = import_csv_to_database(conn)
+                    logger.info(f"Imported {total_imported} books from CSV files")
+
+                    # Fetch missing OLIDs
+                    updated_olids = fetch_missing_olids(conn)
+                    logger.info(f"Updated {updated_olids} books with OLIDs")
 
-                # Process the imported books
-                total_processed = process_books_in_batches(conn)
-                logger.info(f"✅ Processing complete! Processed {total_processed} books")
+                    # Process the imported books
+                    if args.concurrency > 1:
+                        total_processed = process_books_concurrently(conn, concurrency=args.concurrency)
+                    else:
+                        total_processed = process_books_in_batches(conn)
+                    logger.info(f"✅ Processing complete! Processed {total_processed} books")
                 
-            except sqlite3.Error as e:
-                logger.error(f"Database operation failed: {e}")
-                raise
-            
+                except sqlite3.Error as e:
+                    logger.error(f"Database operation failed: {e}")
+                    raise
+        status = "ok"
+
     except Exception as e:
+        status = "failed"
         logger.error(f"Script failed: {e}", exc_info=True)
         exit(1)
+    finally:
+        cache = http_cache.get_http_cache()
+        metrics.write_run_summary(
+            args.summary or metrics.run_summary_path(Config.RUN_SUMMARY_DIR, "extract_content"),
+            "extract_content", started_at, status=status, args=vars(args),
+            http_cache=cache.stats() if cache else None,
+            rate_limits=rate_limiter.limiter_stats()
+        )
@@ -0,0 +1,199 @@
+import logging
+import re
+import time
+from concurrent.futures import Executor, TimeoutError, as_completed, wait
+from typing import Callable, Dict, Iterator, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_isbn(value: Optional[str]) -> Optional[str]:
+    """Strip separators from an ISBN and return it as ISBN-13, or None if invalid."""
+    if not value:
+        return None
+    isbn = re.sub(r'[^0-9Xx]', '', str(value)).upper()
+    if len(isbn) == 13 and isbn.isdigit():
+        return isbn
+    if len(isbn) == 10 and isbn[:9].isdigit():
+        # ISBN-10 -> ISBN-13 so both forms of the same edition compare equal
+        core = "978" + isbn[:9]
+        total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(core))
+        return core + str((10 - total % 10) % 10)
+    return None
+
+
+def normalize_text(value: str) -> str:
+    """Lower-case, drop punctuation and collapse whitespace."""
+    return " ".join(re.sub(r'[^\w\s]', ' ', str(value or '')).lower().split())
+
+
+def book_keys(book: Dict) -> List[str]:
+    """Return the identity keys used to spot the same book from different sources."""
+    keys = []
+    for field in ("isbn_13", "isbn_10", "isbn"):
+        isbn = normalize_isbn(book.get(field))
+        if isbn and f"isbn:{isbn}" not in keys:
+            keys.append(f"isbn:{isbn}")
+
+    authors = book.get("authors") or []
+    if isinstance(authors, str):
+        authors = [authors]
+    title = normalize_text(book.get("title", ""))
+    if title:
+        first_author = normalize_text(authors[0]) if authors else ""
+        keys.append(f"title:{title}|{first_author}")
+    return keys
+
+
+def merge_results(results: Dict[str, List[Dict]]) -> List[Dict]:
+    """
+    Merge books from several sources, de-duplicating on ISBN then title+author.
+
+    Sources are merged in the order given; when a book is found twice the
+    first record wins and only its empty fields are filled from the later one.
+
+    Args:
+        results (Dict[str, List[Dict]]): Books keyed by source name.
+
+    Returns:
+        List[Dict]: Merged books, each with a "sources" list.
+    """
+    merged: List[Dict] = []
+    index: Dict[str, Dict] = {}
+
+    for source, books in results.items():
+        for book in books or []:
+            keys = book_keys(book)
+            existing = next((index[key] for key in keys if key in index), None)
+
+            if existing is None:
+                existing = {**book, "sources": [source]}
+                merged.append(existing)
+            else:
+                for field, value in book.items():
+                    if value and not existing.get(field):
+                        existing[field] = value
+                if source not in existing["sources"]:
+                    existing["sources"].append(source)
+
+            for key in book_keys(existing):
+                index.setdefault(key, existing)
+
+    return merged
+
+
+def federated_search(query: str, fetchers: Dict[str, Callable[[str], List[Dict]]],
+                     executor: Executor, deadline: float) -> Dict:
+    """
+    Query every source at once and merge whatever arrives before the deadline.
+
+    Args:
+        query (str): Search query string.
+        fetchers (Dict[str, Callable]): Fetch function per source name.
+        executor (Executor): Pool the fetches run on.
+        deadline (float): Seconds to wait for all sources together.
+
+    Returns:
+        Dict: {"books": merged books, "sources": per-source status and timing}
+    """
+    started = time.monotonic()
+    timings: Dict[str, Dict] = {}
+
+    def timed(source, fetch):
+        source_started = time.monotonic()
+        try:
+            return fetch(query)
+        finally:
+            timings[source] = {"elapsed_ms": round((time.monotonic() - source_started) * 1000, 1)}
+
+    futures = {source: executor.submit(timed, source, fetch) for source, fetch in fetchers.items()}
+    wait(futures.values(), timeout=deadline)
+
+    results: Dict[str, List[Dict]] = {}
+    sources: Dict[str, Dict] = {}
+    for source, future in futures.items():
+        if not future.done():
+            sources[source] = {"status": "timeout", "count": 0,
+                               "elapsed_ms": round((time.monotonic() - started) * 1000, 1)}
+            logger.warning(f"{source} did not answer '{query}' within {deadline}s")
+            continue
+        try:
+            books = future.result() or []
+            results[source] = books
+            sources[source] = {"status": "ok", "count": len(books), **timings.get(source, {})}
+        except Exception as e:
+            sources[source] = {"status": "error", "count": 0, "error": str(e), **timings.get(source, {})}
+            logger.error(f"{source} search failed for '{query}': {e}")
+
+    books = merge_results(results)
+    return {
+        "books": books,
+        "sources": sources,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
+
+
+def stream_search(query: str, fetchers: Dict[str, Callable[[str], List[Dict]]],
+                  executor: Executor, deadline: float) -> Iterator[Dict]:
+    """
+    Query every source at once and yield events as each one answers.
+
+    Yields a "book" event per new (not yet seen) book as soon as its source
+    returns, a "source" event with status and timing when a source finishes
+    or misses the deadline, and a final "summary" event.
+
+    Args:
+        query (str): Search query string.
+        fetchers (Dict[str, Callable]): Fetch function per source name.
+        executor (Executor): Pool the fetches run on.
+        deadline (float): Seconds to wait for all sources together.
+    """
+    started = time.monotonic()
+
+    def timed(fetch):
+        source_started = time.monotonic()
+        books = fetch(query)
+        return books, round((time.monotonic() - source_started) * 1000, 1)
+
+    futures = {executor.submit(timed, fetch): source for source, fetch in fetchers.items()}
+    sources: Dict[str, Dict] = {}
+    seen = set()
+    emitted = 0
+
+    try:
+        for future in as_completed(futures, timeout=deadline):
+            source = futures[future]
+            try:
+                books, elapsed_ms = future.result()
+            except Exception as e:
+                logger.error(f"{source} search failed for '{query}': {e}")
+                sources[source] = {"status": "error", "count": 0, "error": str(e),
+                                   "elapsed_ms": round((time.monotonic() - started) * 1000, 1)}
+                yield {"event": "source", "source": source, **sources[source]}
+                continue
+
+            for book in books or []:
+                keys = book_keys(book)
+                if any(key in seen for key in keys):
+                    continue
+                seen.update(keys)
+                emitted += 1
+                yield {"event": "book", "source": source, "book": {**book, "sources": [source]}}
+
+            sources[source] = {"status": "ok", "count": len(books or []), "elapsed_ms": elapsed_ms}
+            yield {"event": "source", "source": source, **sources[source]}
+    except TimeoutError:
+        for future, source in futures.items():
+            if source not in sources:
+                logger.warning(f"{source} did not answer '{query}' within {deadline}s")
+                sources[source] = {"status": "timeout", "count": 0,
+                                   "elapsed_ms": round((time.monotonic() - started) * 1000, 1)}
+                yield {"event": "source", "source": source, **sources[source]}
+
+    yield {
+        "event": "summary",
+        "count": emitted,
+        "sources": sources,
+        "elapsed_ms": round((time.monotonic() - started) * 1000, 1),
+    }
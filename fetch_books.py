@@ -1,65 +1,68 @@
-import requests
+"""
+Harvest a topic corpus into books.db from Google Books and Open Library search.
+
+Every (topic, source) pair is paged through concurrently: Google Books
+volumes GOOGLE_PAGE_SIZE at a time (startIndex), Open Library search.json
+OPEN_LIBRARY_PAGE_SIZE at a time (offset), within the per-host limits of
+rate_limiter. Paging a topic stops at the last page, at max_pages, or as
+soon as a page's relevance to the topic falls below the threshold. The main
+thread is the only database writer and commits one transaction per page.
+
+Usage:
+    python fetch_books.py                                   # the default design topics
+    python fetch_books.py --topics "Color theory" "Grid systems" --max-pages 10
+    python fetch_books.py --topics-file topics.txt --min-relevance 0.5
+"""
+import argparse
+import logging
+import os
 import sqlite3
 import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional, Set, Tuple
+
+from dotenv import load_dotenv
+
+import extract_content
+import metrics
+import rate_limiter
+from extract_content import edition_olid, init_database, make_api_request
+from federated_search import normalize_text
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_BOOKS = "Google Books"
+OPEN_LIBRARY = "Open Library"
 
-# Google Books API Key (replace with your actual key)
-GOOGLE_BOOKS_API_KEY = "YOUR_GOOGLE_BOOKS_API_KEY"
-
-# Open Library Search URL
-OPEN_LIBRARY_SEARCH_URL = "https://openlibrary.org/search.json?q={query}&limit=5"
-
-# Google Books Search URL
-GOOGLE_BOOKS_SEARCH_URL = "https://www.googleapis.com/books/v1/volumes?q={query}&key=" + GOOGLE_BOOKS_API_KEY
-
-# Connect to SQLite database
-conn = sqlite3.connect("books.db")
-cursor = conn.cursor()
-
-# Function to fetch books from Open Library
-def fetch_openlibrary_books(query):
-    url = OPEN_LIBRARY_SEARCH_URL.format(query=query.replace(" ", "+"))
-    response = requests.get(url)
-    
-    if response.status_code == 200:
-        data = response.json()
-        for book in data.get("docs", []):
-            title = book.get("title")
-            author = ", ".join(book.get("author_name", []))
-            year = book.get("first_publish_year")
-            olid = book.get("key").split("/")[-1] if "key" in book else None
-
-            # Insert into database if public domain
-            cursor.execute("""
-                INSERT OR IGNORE INTO books (title, author, year, olid, source, license)
-                VALUES (?, ?, ?, ?, 'Open Library', 'Public Domain')
-            """, (title, author, year, olid))
-        conn.commit()
-
-# Function to fetch books from Google Books
-def fetch_google_books(query):
-    url = GOOGLE_BOOKS_SEARCH_URL.format(query=query.replace(" ", "+"))
-    response = requests.get(url)
-
-    if response.status_code == 200:
-        data = response.json()
-        for book in data.get("items", []):
-            volume_info = book.get("volumeInfo", {})
-            title = volume_info.get("title")
-            author = ", ".join(volume_info.get("authors", []))
-            year = volume_info.get("publishedDate", "").split("-")[0] if volume_info.get("publishedDate") else None
-            isbn = next((id["identifier"] for id in volume_info.get("industryIdentifiers", []) if id["type"] == "ISBN_13"), None)
-
-            # Check if book is public domain
-            access_info = book.get("accessInfo", {})
-            if access_info.get("publicDomain", False):
-                cursor.execute("""
-                    INSERT OR IGNORE INTO books (title, author, year, isbn, source, license)
-                    VALUES (?, ?, ?, ?, 'Google Books', 'Public Domain')
-                """, (title, author, year, isbn))
-        conn.commit()
-
-# List of Search Queries (Your Design Principle Topics)
-search_queries = [
+
+class Config:
+    """Harvest settings."""
+    GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1/volumes"
+    GOOGLE_BOOKS_API_KEY = os.getenv("GOOGLE_BOOKS_API_KEY")
+    GOOGLE_PAGE_SIZE = 40  # maxResults; the API's maximum
+    # Partial response: only the fields the harvest reads
+    GOOGLE_FIELDS = ("totalItems,items(volumeInfo(title,subtitle,authors,description,categories),"
+                     "accessInfo/publicDomain)")
+    OPEN_LIBRARY_SEARCH_URL = extract_content.Config.OPEN_LIBRARY_SEARCH_URL
+    OPEN_LIBRARY_PAGE_SIZE = 100
+    OPEN_LIBRARY_FIELDS = "key,title,subtitle,author_name,subject,first_sentence,edition_key,cover_edition_key"
+    # Starting budgets (calls per minute, requests in flight); Open Library's is set by extract_content
+    GOOGLE_BOOKS_LIMITS = (100, 4)
+    PAGES_AHEAD = 2  # pages requested ahead of the last one answered, per topic and source
+    MAX_PAGES = 25  # per topic and source
+    MIN_RELEVANCE = 0.34  # mean share of topic terms a page's results must contain
+    DB_PATH = extract_content.Config.DB_PATH
+    RUN_SUMMARY_DIR = "data/runs"  # JSON metrics summary per run
+
+
+rate_limiter.configure_host("www.googleapis.com", calls_per_minute=Config.GOOGLE_BOOKS_LIMITS[0],
+                            max_in_flight=Config.GOOGLE_BOOKS_LIMITS[1])
+
+# Design principle topics harvested when none are given
+DEFAULT_TOPICS = [
     "Balance in graphic design",
     "Contrast in graphic design",
     "Emphasis in visual design",
@@ -74,14 +77,309 @@ search_queries = [
     "Gestalt principles in UX design"
 ]
 
-# Run searches
-for query in search_queries:
-    print(f"🔎 Searching: {query}")
-    fetch_openlibrary_books(query)
-    fetch_google_books(query)
-    time.sleep(1)  # Avoid rate limits
+# Words too common to say anything about relevance
+STOPWORDS = {"a", "an", "and", "for", "in", "of", "on", "the", "to", "with", "by", "from", "at", "or"}
+
+
+def topic_terms(topic: str) -> Set[str]:
+    """The normalized words of a topic that count towards relevance."""
+    return {word for word in normalize_text(topic).split() if word not in STOPWORDS and len(word) > 1}
+
+
+def relevance(terms: Set[str], text: str) -> float:
+    """Share of the topic terms that occur in a result's text (title, subjects, description)."""
+    if not terms:
+        return 1.0
+    words = set(normalize_text(text).split())
+    return len(terms & words) / len(terms)
+
+
+def parse_google_page(data: Dict) -> Tuple[List[Dict], List[Dict], Optional[int]]:
+    """
+    Split a volumes response into books to store and all results (for scoring).
+
+    Returns:
+        Tuple[List[Dict], List[Dict], Optional[int]]: (public-domain books as
+        books rows, every result with its scoring text, totalItems).
+    """
+    books, results = [], []
+    for item in data.get("items") or []:
+        info = item.get("volumeInfo", {})
+        text = " ".join([info.get("title", ""), info.get("subtitle", ""), " ".join(info.get("categories") or []),
+                         info.get("description", "")])
+        results.append({"text": text})
+        # Only public-domain volumes are harvested from Google Books
+        if info.get("title") and item.get("accessInfo", {}).get("publicDomain", False):
+            books.append({"olid": None, "title": info["title"], "authors": ", ".join(info.get("authors") or []),
+                          "description": info.get("description"), "source": GOOGLE_BOOKS})
+    return books, results, data.get("totalItems")
+
+
+def parse_open_library_page(data: Dict) -> Tuple[List[Dict], List[Dict], Optional[int]]:
+    """Same as parse_google_page for a search.json response (numFound as the total)."""
+    books, results = [], []
+    for doc in data.get("docs") or []:
+        subjects = " ".join((doc.get("subject") or [])[:20])
+        results.append({"text": " ".join([doc.get("title", ""), doc.get("subtitle", ""), subjects])})
+        if doc.get("title"):
+            first_sentence = doc.get("first_sentence")
+            books.append({"olid": edition_olid(doc), "title": doc["title"],
+                          "authors": ", ".join(doc.get("author_name") or []),
+                          "description": first_sentence[0] if first_sentence else None, "source": OPEN_LIBRARY})
+    return books, results, data.get("numFound", data.get("num_found"))
+
+
+def fetch_page(source: str, topic: str, page: int) -> Optional[Dict]:
+    """
+    Fetch and parse one page of a topic's results.
+
+    Returns:
+        Optional[Dict]: {"books", "results", "total", "page_size"}, or None if the request failed.
+    """
+    if source == GOOGLE_BOOKS:
+        page_size = Config.GOOGLE_PAGE_SIZE
+        url, parse = Config.GOOGLE_BOOKS_URL, parse_google_page
+        params = {"q": topic, "startIndex": page * page_size, "maxResults": page_size,
+                  "fields": Config.GOOGLE_FIELDS, "key": Config.GOOGLE_BOOKS_API_KEY}
+    else:
+        page_size = Config.OPEN_LIBRARY_PAGE_SIZE
+        url, parse = Config.OPEN_LIBRARY_SEARCH_URL, parse_open_library_page
+        params = {"q": topic, "offset": page * page_size, "limit": page_size, "fields": Config.OPEN_LIBRARY_FIELDS}
+
+    with metrics.STAGE_SECONDS.time(stage=f"harvest_page_{_stage(source)}"):
+        response = make_api_request(url, params)
+        if response is None or response.status_code != 200:
+            return None
+        try:
+            books, results, total = parse(response.json())
+        except ValueError as e:
+            logger.error(f"Invalid {source} response for '{topic}' page {page}: {e}")
+            return None
+    return {"books": books, "results": results, "total": total, "page_size": page_size}
+
+
+def _stage(source: str) -> str:
+    return source.lower().replace(" ", "_")
+
+
+class TopicStream:
+    """Paging state of one topic on one source."""
+
+    def __init__(self, topic: str, source: str, max_pages: int):
+        self.topic = topic
+        self.source = source
+        self.terms = topic_terms(topic)
+        self.max_pages = max_pages
+        self.next_page = 0
+        self.stop_at: Optional[int] = None  # first page not to request or write
+        self.reason = ""
+        self.in_flight: Dict[int, Future] = {}
+        self.pages = 0
+        self.stored = 0
+
+    def stop(self, page: int, reason: str):
+        """Request and write nothing from page on; pages before it still count."""
+        if self.stop_at is None or page < self.stop_at:
+            self.stop_at, self.reason = page, reason
+            for later, future in list(self.in_flight.items()):
+                if later >= page:
+                    future.cancel()
+
+    def wants_more(self) -> bool:
+        limit = self.max_pages if self.stop_at is None else min(self.stop_at, self.max_pages)
+        return self.next_page < limit
+
+    @property
+    def done(self) -> bool:
+        return not self.in_flight and not self.wants_more()
+
+
+class HarvestWriter:
+    """
+    Single writer for harvested books: one transaction per page.
+
+    Books already in books.db (by OLID, or by normalized title and author
+    for results without one) and books seen earlier in the run are skipped.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+        self.seen: Set[str] = {
+            self.key(title, authors) for title, authors in conn.execute("SELECT title, authors FROM books")
+        }
+        self.written = 0
+
+    @staticmethod
+    def key(title: Optional[str], authors: Optional[str]) -> str:
+        return f"{normalize_text(title or '')}|{normalize_text(authors or '')}"
+
+    def write_page(self, books: List[Dict]) -> int:
+        """Insert a page's new books in one transaction; returns how many were added."""
+        rows = []
+        for book in books:
+            key = self.key(book["title"], book["authors"])
+            if key in self.seen:
+                continue
+            self.seen.add(key)
+            rows.append((book["olid"], book["title"], book["authors"], book["description"], book["source"]))
+        if not rows:
+            return 0
+        with metrics.DB_WRITE_SECONDS.time(operation="harvest_page"), self.conn:
+            cursor = self.conn.executemany("""
+                INSERT OR IGNORE INTO books (olid, title, authors, description, source)
+                VALUES (?, ?, ?, ?, ?)
+            """, rows)
+        self.written += cursor.rowcount
+        return cursor.rowcount
+
+
+def harvest(conn: sqlite3.Connection, topics: List[str], sources: Tuple[str, ...] = (GOOGLE_BOOKS, OPEN_LIBRARY),
+            max_pages: int = Config.MAX_PAGES, min_relevance: float = Config.MIN_RELEVANCE,
+            pages_ahead: int = Config.PAGES_AHEAD) -> Dict[str, Dict]:
+    """
+    Page through every topic on every source concurrently and store the books found.
+
+    Each source has its own worker pool, sized to its host's in-flight cap,
+    and requests are paced by the host limiters. Up to pages_ahead pages of
+    each topic are requested before the earlier ones are answered. A topic
+    stops at an empty or short page, at the reported total, after
+    max_pages, on a failed request, or when a page's mean relevance falls
+    below min_relevance; pages requested beyond that point are cancelled or
+    discarded.
+
+    Args:
+        conn (sqlite3.Connection): books.db, initialized with init_database.
+        topics (List[str]): Search topics.
+        sources (Tuple[str, ...]): GOOGLE_BOOKS and/or OPEN_LIBRARY.
+        max_pages (int): Page cap per topic and source.
+        min_relevance (float): Mean share of topic terms below which paging stops.
+        pages_ahead (int): Pages in flight per topic and source.
+
+    Returns:
+        Dict[str, Dict]: Per "source: topic", pages read, books stored and why paging stopped.
+    """
+    streams = [TopicStream(topic, source, max_pages) for topic in topics for source in sources]
+    writer = HarvestWriter(conn)
+    pools = {
+        source: ThreadPoolExecutor(
+            max_workers=rate_limiter.get_host_limiter(
+                Config.GOOGLE_BOOKS_URL if source == GOOGLE_BOOKS else Config.OPEN_LIBRARY_SEARCH_URL
+            ).max_in_flight,
+            thread_name_prefix=_stage(source)
+        )
+        for source in sources
+    }
+    owners: Dict[Future, Tuple[TopicStream, int]] = {}
+
+    def fill(stream: TopicStream):
+        # Before the first page answers, only it is requested: the total is unknown
+        ahead = pages_ahead if stream.pages else 1
+        while stream.wants_more() and len(stream.in_flight) < ahead:
+            page = stream.next_page
+            future = pools[stream.source].submit(fetch_page, stream.source, stream.topic, page)
+            stream.in_flight[page] = future
+            owners[future] = (stream, page)
+            stream.next_page += 1
+
+    try:
+        for stream in streams:
+            fill(stream)
+        while owners:
+            done, _ = wait(list(owners), return_when=FIRST_COMPLETED)
+            for future in done:
+                stream, page = owners.pop(future)
+                stream.in_flight.pop(page, None)
+                if future.cancelled() or (stream.stop_at is not None and page >= stream.stop_at):
+                    continue
+                result = future.result()
+                if result is None:
+                    stream.stop(page, "request failed")
+                    continue
+
+                stream.pages += 1
+                if not result["results"]:
+                    stream.stop(page, "no more results")
+                    continue
+                scores = [relevance(stream.terms, item["text"]) for item in result["results"]]
+                score = sum(scores) / len(scores)
+                if score < min_relevance:
+                    # Results are ordered by relevance; later pages will not do better
+                    stream.stop(page, f"relevance {score:.2f} below {min_relevance}")
+                    metrics.STAGE_ITEMS.inc(stage="harvest_pages", status="below_threshold")
+                    continue
+
+                added = writer.write_page(result["books"])
+                stream.stored += added
+                metrics.STAGE_ITEMS.inc(stage="harvest_pages", status="stored")
+                metrics.STAGE_ITEMS.inc(added, stage="harvest_books", status=_stage(stream.source))
+                logger.info(f"{stream.source} '{stream.topic}' page {page}: {len(result['results'])} results, "
+                            f"relevance {score:.2f}, {added} new books")
+
+                total = result["total"]
+                if len(result["results"]) < result["page_size"]:
+                    stream.stop(page + 1, "last page")
+                elif total is not None and (page + 1) * result["page_size"] >= total:
+                    stream.stop(page + 1, "all results read")
+            for stream in streams:
+                fill(stream)
+    finally:
+        for pool in pools.values():
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    for stream in streams:
+        if not stream.reason:
+            stream.reason = f"max pages ({max_pages})"
+    logger.info(f"Harvest stored {writer.written} new books from {len(topics)} topics")
+    return {f"{stream.source}: {stream.topic}": {"pages": stream.pages, "stored": stream.stored,
+                                                   "stopped": stream.reason}
+            for stream in streams}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Harvest books on a list of topics into books.db")
+    parser.add_argument("--topics", nargs="+", help="Topics to search (default: the design principle topics)")
+    parser.add_argument("--topics-file", help="File with one topic per line")
+    parser.add_argument("--sources", nargs="+", choices=("google", "openlibrary"), default=["google", "openlibrary"],
+                        help="Which APIs to search")
+    parser.add_argument("--max-pages", type=int, default=Config.MAX_PAGES, help="Page cap per topic and source")
+    parser.add_argument("--min-relevance", type=float, default=Config.MIN_RELEVANCE,
+                        help="Stop paging a topic when a page's mean share of topic terms falls below this")
+    parser.add_argument("--pages-ahead", type=int, default=Config.PAGES_AHEAD,
+                        help="Pages requested ahead per topic and source")
+    parser.add_argument("--db", default=Config.DB_PATH, help="SQLite database to write to")
+    return parser.parse_args()
+
 
-# Close database connection
-conn.close()
+if __name__ == "__main__":
+    args = parse_args()
+    topics = list(args.topics or [])
+    if args.topics_file:
+        with open(args.topics_file, encoding="utf-8") as f:
+            topics += [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    topics = list(dict.fromkeys(topics or DEFAULT_TOPICS))
+    sources = tuple(GOOGLE_BOOKS if source == "google" else OPEN_LIBRARY for source in args.sources)
+    if GOOGLE_BOOKS in sources and not Config.GOOGLE_BOOKS_API_KEY:
+        logger.error("GOOGLE_BOOKS_API_KEY is not set; use --sources openlibrary or set the key")
+        exit(1)
 
-print("✅ Book fetching complete! Data stored in SQLite.")
+    started_at = time.time()
+    status = "interrupted"
+    streams: Dict[str, Dict] = {}
+    try:
+        conn = sqlite3.connect(args.db)
+        init_database(conn)
+        with extract_content.bulk_load_pragmas(conn):
+            streams = harvest(conn, topics, sources, max_pages=args.max_pages, min_relevance=args.min_relevance,
+                              pages_ahead=args.pages_ahead)
+        conn.close()
+        status = "ok"
+    except Exception as e:
+        status = "failed"
+        logger.error(f"Harvest failed: {e}", exc_info=True)
+        raise
+    finally:
+        metrics.write_run_summary(
+            metrics.run_summary_path(Config.RUN_SUMMARY_DIR, "fetch_books"), "fetch_books", started_at,
+            status=status, topics=topics, sources=list(sources), max_pages=args.max_pages,
+            min_relevance=args.min_relevance, streams=streams, rate_limits=rate_limiter.limiter_stats()
+        )
@@ -0,0 +1,399 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+from typing import Callable, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+import http_client
+import metrics
+import rate_limiter
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class HttpCacheConfig:
+    """HTTP cache settings for the harvest scripts, overridable through environment variables."""
+    ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+    PATH = os.getenv("HTTP_CACHE_PATH", "data/http_cache.db")
+    MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))  # compressed bodies
+    TTL = float(os.getenv("HTTP_CACHE_TTL", str(24 * 3600)))  # seconds, for hosts without their own
+    OFFLINE = os.getenv("HTTP_CACHE_OFFLINE", "false").lower() == "true"  # serve only from the cache
+
+
+# Query parameters that never change the response and must not be written to disk
+REDACTED_PARAMS = {"key", "api_key"}
+# Response headers kept with a cached body
+KEPT_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+STREAM_BLOCK_SIZE = 64 * 1024  # bytes copied at a time into a file-backed entry
+
+
+class OfflineCacheMiss(requests.RequestException):
+    """Raised in offline mode for a request that is not in the cache"""
+    pass
+
+
+_host_ttls: Dict[str, float] = {}
+
+
+def configure_host_ttl(host: str, seconds: float):
+    """Set how long responses from a host are used without revalidation."""
+    _host_ttls[host] = seconds
+
+
+def canonical_url(url: str, params: Optional[Dict] = None) -> str:
+    """Merge params into the URL, sort the query and drop credentials."""
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    query += [(k, str(v)) for k, v in (params or {}).items() if v is not None]
+    query = sorted((k, v) for k, v in query if k not in REDACTED_PARAMS)
+    return urlunsplit((parts.scheme, parts.netloc.lower(), parts.path, urlencode(query), ""))
+
+
+class HttpCache:
+    """
+    Persistent GET response cache in SQLite with conditional revalidation.
+
+    Bodies are stored zlib-compressed with their ETag and Last-Modified.
+    Streamed (stream=True) bodies, such as full texts, are copied block by
+    block into gzip files next to the database instead, and served back as
+    streams, so they are cached without ever being held in memory. A fresh
+    entry (younger than its host's TTL) is returned without any
+    request; a stale one is revalidated with If-None-Match /
+    If-Modified-Since, so an unchanged resource costs a 304 and no body.
+    Total compressed size (files included) is capped at max_bytes by
+    evicting the least recently used entries. In offline mode every entry
+    counts as fresh and misses raise OfflineCacheMiss instead of going to
+    the network.
+
+    Args:
+        db_path (str): SQLite file for the cache.
+        max_bytes (int): Cap on the total size of stored (compressed) bodies.
+        ttl (float): Freshness in seconds for hosts without a configured TTL.
+        offline (bool): Never touch the network.
+    """
+
+    def __init__(self, db_path: str, max_bytes: int = HttpCacheConfig.MAX_BYTES,
+                 ttl: float = HttpCacheConfig.TTL, offline: bool = HttpCacheConfig.OFFLINE):
+        self.db_path = db_path
+        self.bodies_dir = f"{os.path.splitext(db_path)[0]}_bodies"  # file-backed (streamed) entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.offline = offline
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._owner_pid: Optional[int] = None
+        self._total_bytes = 0
+        self._counters = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "evictions": 0,
+                          "offline_misses": 0}
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open (or reopen after a fork) the cache database. Call with the lock held."""
+        if self._conn is None or self._owner_pid != os.getpid():
+            if os.path.dirname(self.db_path):
+                os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS http_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    url TEXT NOT NULL,
+                    status INTEGER NOT NULL,
+                    headers TEXT NOT NULL,
+                    body BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    fetched_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS http_cache_last_used ON http_cache (last_used_at)")
+            if "body_file" not in [row[1] for row in conn.execute("PRAGMA table_info(http_cache)")]:
+                # Name of the gzip file in bodies_dir holding a streamed body; body is empty then
+                conn.execute("ALTER TABLE http_cache ADD COLUMN body_file TEXT")
+            conn.commit()
+            self._total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM http_cache").fetchone()[0]
+            self._conn = conn
+            self._owner_pid = os.getpid()
+        return self._conn
+
+    def ttl_for(self, url: str) -> float:
+        host = urlsplit(url).hostname or ""
+        return _host_ttls.get(host, self.ttl)
+
+    def _load(self, key: str) -> Optional[Dict]:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT url, status, headers, body, body_file, fetched_at FROM http_cache WHERE cache_key = ?",
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        url, status, headers, body, body_file, fetched_at = row
+        return {"url": url, "status": status, "headers": json.loads(headers), "body": body,
+                "body_file": body_file, "fetched_at": fetched_at}
+
+    def _touch(self, key: str, fetched_at: Optional[float] = None):
+        with self._lock:
+            conn = self._connection()
+            if fetched_at is None:
+                conn.execute("UPDATE http_cache SET last_used_at = ? WHERE cache_key = ?", (time.time(), key))
+            else:
+                conn.execute("UPDATE http_cache SET last_used_at = ?, fetched_at = ? WHERE cache_key = ?",
+                             (time.time(), fetched_at, key))
+            conn.commit()
+
+    def _store(self, key: str, url: str, response: requests.Response):
+        self._insert(key, url, response, zlib.compress(response.content, 6))
+
+    def _store_stream(self, key: str, url: str, response: requests.Response) -> requests.Response:
+        """
+        Copy a streamed body into a gzip file entry and return a response streaming it back.
+
+        The body is read STREAM_BLOCK_SIZE bytes at a time, so memory use does
+        not depend on its size; the file is renamed into place once complete.
+        """
+        os.makedirs(self.bodies_dir, exist_ok=True)
+        body_file = f"{key}.gz"
+        fd, tmp_path = tempfile.mkstemp(dir=self.bodies_dir, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+                for block in response.iter_content(chunk_size=STREAM_BLOCK_SIZE):
+                    f.write(block)
+            os.replace(tmp_path, os.path.join(self.bodies_dir, body_file))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        finally:
+            response.close()
+        # Opened before the entry is added, as eviction may remove the file but not an open reader
+        stored = self._response({"url": url, "status": response.status_code, "headers": _kept_headers(response),
+                                 "body": b"", "body_file": body_file})
+        self._insert(key, url, response, b"", body_file)
+        return stored
+
+    def _insert(self, key: str, url: str, response: requests.Response, body: bytes,
+                body_file: Optional[str] = None):
+        headers = _kept_headers(response)
+        size = os.path.getsize(os.path.join(self.bodies_dir, body_file)) if body_file else len(body)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            old = conn.execute("SELECT size, body_file FROM http_cache WHERE cache_key = ?", (key,)).fetchone()
+            conn.execute("""
+                INSERT OR REPLACE INTO http_cache
+                (cache_key, url, status, headers, body, body_file, size, fetched_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (key, url, response.status_code, json.dumps(headers), body, body_file, size, now, now))
+            if old and old[1] and old[1] != body_file:
+                self._remove_body_file(old[1])
+            self._total_bytes += size - (old[0] if old else 0)
+            self._counters["stored"] += 1
+            self._evict(conn)
+            conn.commit()
+
+    def _remove_body_file(self, body_file: str):
+        try:
+            os.remove(os.path.join(self.bodies_dir, body_file))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Drop least recently used entries until under 90% of max_bytes. Call with the lock held."""
+        if self._total_bytes <= self.max_bytes:
+            return
+        target = self.max_bytes * 0.9
+        for key, size, body_file in conn.execute(
+            "SELECT cache_key, size, body_file FROM http_cache ORDER BY last_used_at"
+        ).fetchall():
+            if self._total_bytes <= target:
+                break
+            conn.execute("DELETE FROM http_cache WHERE cache_key = ?", (key,))
+            if body_file:
+                # A reader that already opened the file keeps reading it
+                self._remove_body_file(body_file)
+            self._total_bytes -= size
+            self._counters["evictions"] += 1
+
+    def _response(self, entry: Dict) -> requests.Response:
+        """
+        Rebuild a requests.Response from a cache entry; it has from_cache = True.
+
+        A file-backed entry comes back unread, as a stream over its file:
+        iter_content() reads it in blocks, .content reads all of it.
+        """
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.url = entry["url"]
+        if entry["body_file"]:
+            response.raw = gzip.open(os.path.join(self.bodies_dir, entry["body_file"]), "rb")
+        else:
+            response._content = zlib.decompress(entry["body"])
+        headers = dict(entry["headers"])
+        response.encoding = headers.pop("encoding", None)
+        response.headers = CaseInsensitiveDict(headers)
+        response.from_cache = True
+        return response
+
+    def cached(self, url: str, params: Optional[Dict] = None) -> Optional[requests.Response]:
+        """Return a fresh cached response (any cached response when offline), or None."""
+        key_url = canonical_url(url, params)
+        entry = self._load(_key(key_url))
+        if entry is None:
+            return None
+        if not self.offline and time.time() - entry["fetched_at"] > self.ttl_for(url):
+            return None
+        if entry["body_file"] and not os.path.exists(os.path.join(self.bodies_dir, entry["body_file"])):
+            return None
+        self._touch(_key(key_url))
+        with self._lock:
+            self._counters["hits"] += 1
+        metrics.CACHE_LOOKUPS.inc(cache="http", result="hit")
+        return self._response(entry)
+
+    def fetch(self, url: str, params: Optional[Dict],
+              send: Callable[[Dict[str, str]], requests.Response], stream: bool = False) -> requests.Response:
+        """
+        Return a cached response if fresh, otherwise call send(conditional_headers).
+
+        A 304 answer refreshes the stored entry and returns it; a 200 answer
+        is stored, in a file-backed entry when stream is True (send must then
+        make a stream=True request), and returned. Other statuses are
+        returned and not cached.
+        """
+        hit = self.cached(url, params)
+        if hit is not None:
+            return hit
+        if self.offline:
+            with self._lock:
+                self._counters["offline_misses"] += 1
+            metrics.CACHE_LOOKUPS.inc(cache="http", result="offline_miss")
+            raise OfflineCacheMiss(f"Offline and not cached: {canonical_url(url, params)}")
+
+        key_url = canonical_url(url, params)
+        key = _key(key_url)
+        entry = self._load(key)
+        if entry and entry["body_file"] and not os.path.exists(os.path.join(self.bodies_dir, entry["body_file"])):
+            entry = None
+        headers = {}
+        if entry:
+            if "ETag" in entry["headers"]:
+                headers["If-None-Match"] = entry["headers"]["ETag"]
+            if "Last-Modified" in entry["headers"]:
+                headers["If-Modified-Since"] = entry["headers"]["Last-Modified"]
+
+        response = send(headers)
+        if response.status_code == 304 and entry:
+            self._touch(key, fetched_at=time.time())
+            with self._lock:
+                self._counters["revalidated"] += 1
+            metrics.CACHE_LOOKUPS.inc(cache="http", result="revalidated")
+            return self._response(entry)
+
+        with self._lock:
+            self._counters["misses"] += 1
+        metrics.CACHE_LOOKUPS.inc(cache="http", result="miss")
+        if response.status_code == 200:
+            if stream:
+                # Read back from the new entry; from_cache False so its bytes count as downloaded
+                response = self._store_stream(key, key_url, response)
+                response.from_cache = False
+            else:
+                self._store(key, key_url, response)
+        return response
+
+    def clear(self):
+        with self._lock:
+            conn = self._connection()
+            body_files = [row[0] for row in conn.execute(
+                "SELECT body_file FROM http_cache WHERE body_file IS NOT NULL"
+            )]
+            conn.execute("DELETE FROM http_cache")
+            conn.commit()
+            self._total_bytes = 0
+        for body_file in body_files:
+            self._remove_body_file(body_file)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {**self._counters, "bytes": self._total_bytes, "max_bytes": self.max_bytes,
+                    "offline": self.offline}
+
+
+def _kept_headers(response: requests.Response) -> Dict[str, str]:
+    headers = {name: response.headers[name] for name in KEPT_HEADERS if name in response.headers}
+    if response.encoding:
+        headers["encoding"] = response.encoding
+    return headers
+
+
+def _key(key_url: str) -> str:
+    return hashlib.sha256(key_url.encode("utf-8")).hexdigest()
+
+
+_cache: Optional[HttpCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_http_cache() -> Optional[HttpCache]:
+    """Return the process-wide HTTP cache, or None if HTTP_CACHE_ENABLED is false."""
+    global _cache
+    if not HttpCacheConfig.ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = HttpCache(HttpCacheConfig.PATH)
+        return _cache
+
+
+def cached_response(url: str, params: Optional[Dict] = None) -> Optional[requests.Response]:
+    """Return a fresh cached response without touching the network, or None."""
+    cache = get_http_cache()
+    return cache.cached(url, params) if cache else None
+
+
+def is_offline() -> bool:
+    cache = get_http_cache()
+    return bool(cache and cache.offline)
+
+
+def get(url: str, params: Optional[Dict] = None, session: Optional[requests.Session] = None,
+        rate_limit: bool = True, **kwargs) -> requests.Response:
+    """
+    GET through the cache with the shared session; a drop-in for session.get().
+
+    Requests that reach the network (misses and revalidations) go through
+    the host's adaptive limiter unless rate_limit is False; cache hits do not
+    use up any of the host's budget. stream=True bodies are cached in
+    files and come back as unread streams (see HttpCache), so they can be
+    read again offline without being held in memory.
+    """
+    session = session or http_client.get_session()
+
+    def send(headers: Optional[Dict] = None) -> requests.Response:
+        if rate_limit:
+            response = rate_limiter.limited_request(
+                url, lambda: session.get(url, params=params, headers=headers, **kwargs)
+            )
+        else:
+            response = session.get(url, params=params, headers=headers, **kwargs)
+        if not kwargs.get("stream"):
+            # Streamed bodies are counted as they are read (text_store.download_to_file)
+            metrics.DOWNLOADED_BYTES.inc(len(response.content), host=urlsplit(url).hostname or "")
+        return response
+
+    extra_headers = kwargs.pop("headers", None) or {}
+    cache = get_http_cache()
+    if cache is None:
+        return send(extra_headers or None)
+    return cache.fetch(url, params, lambda conditional: send({**extra_headers, **conditional}),
+                       stream=bool(kwargs.get("stream")))
@@ -0,0 +1,190 @@
+import importlib.util
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class PoolConfig:
+    """Connection pool settings, overridable through environment variables."""
+    POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "10"))  # hosts kept pooled
+    POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "10"))  # connections per host
+    CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))  # seconds
+    READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "30"))  # seconds
+    KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "60"))  # seconds
+    HTTP2 = os.getenv("HTTP_ENABLE_HTTP2", "true").lower() == "true"
+    # "host=http://127.0.0.1:8000,..." sends requests for host to another server
+    # (the fake upstreams in benchmarks/); empty in production
+    HOST_OVERRIDES = os.getenv("HTTP_HOST_OVERRIDES", "")
+
+
+def _parse_overrides(value: str) -> Dict[str, Tuple[str, str]]:
+    overrides = {}
+    for entry in filter(None, (part.strip() for part in value.split(","))):
+        host, _, target = entry.partition("=")
+        parts = urlsplit(target.strip())
+        if not host or not parts.scheme or not parts.netloc:
+            raise ValueError(f"Invalid HTTP_HOST_OVERRIDES entry: {entry!r}")
+        overrides[host.strip().lower()] = (parts.scheme, parts.netloc)
+    return overrides
+
+
+_overrides = _parse_overrides(PoolConfig.HOST_OVERRIDES)
+
+
+def override_url(url: str) -> str:
+    """Return url pointed at the server HTTP_HOST_OVERRIDES names for its host, or unchanged."""
+    if not _overrides:
+        return url
+    parts = urlsplit(url)
+    target = _overrides.get((parts.hostname or "").lower())
+    if target is None:
+        return url
+    return urlunsplit((target[0], target[1], parts.path, parts.query, parts.fragment))
+
+
+class _OverridingAdapter(HTTPAdapter):
+    """HTTPAdapter that applies HTTP_HOST_OVERRIDES to every request it sends."""
+
+    def send(self, request, **kwargs):
+        original_url = request.url
+        request.url = override_url(original_url)
+        response = super().send(request, **kwargs)
+        # Callers (and metrics) keep seeing the host they asked for
+        response.url = original_url
+        return response
+
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_httpx_client: Optional[httpx.Client] = None
+_owner_pid: Optional[int] = None
+_httpx_stats: Dict[str, Dict[str, int]] = defaultdict(lambda: {"requests": 0, "connections": 0})
+
+
+def timeout(read: Optional[float] = None, deadline=None) -> Tuple[float, float]:
+    """Return a (connect, read) timeout tuple, capped by a resilience.Deadline if given."""
+    connect = PoolConfig.CONNECT_TIMEOUT
+    read = read if read is not None else PoolConfig.READ_TIMEOUT
+    if deadline is not None:
+        connect, read = deadline.cap(connect), deadline.cap(read)
+    return connect, read
+
+
+def _reset_after_fork():
+    """Drop clients inherited from a parent process; sockets must not be shared."""
+    global _session, _httpx_client, _owner_pid
+    if _owner_pid != os.getpid():
+        _session = None
+        _httpx_client = None
+        _httpx_stats.clear()
+        _owner_pid = os.getpid()
+
+
+def get_session() -> requests.Session:
+    """Return the process-wide keep-alive requests session."""
+    global _session
+    with _lock:
+        _reset_after_fork()
+        if _session is None:
+            session = requests.Session()
+            adapter = (_OverridingAdapter if _overrides else HTTPAdapter)(
+                pool_connections=PoolConfig.POOL_CONNECTIONS,
+                pool_maxsize=PoolConfig.POOL_MAXSIZE,
+                max_retries=0  # retries are handled by tenacity at the call sites
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _session = session
+            logger.info(
+                f"Created shared HTTP session (pool_maxsize={PoolConfig.POOL_MAXSIZE})"
+            )
+        return _session
+
+
+def _count_httpx_request(request: httpx.Request):
+    """Event hook: count requests and trace new connections per host."""
+    host = request.url.host
+    if _overrides:
+        request.url = httpx.URL(override_url(str(request.url)))
+    _httpx_stats[host]["requests"] += 1
+
+    def trace(event_name, info):
+        if event_name == "connection.connect_tcp.complete":
+            _httpx_stats[host]["connections"] += 1
+
+    request.extensions["trace"] = trace
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (httpx[http2])."""
+    return PoolConfig.HTTP2 and importlib.util.find_spec("h2") is not None
+
+
+def get_httpx_client() -> httpx.Client:
+    """Return the process-wide keep-alive httpx client (HTTP/2 when available)."""
+    global _httpx_client
+    with _lock:
+        _reset_after_fork()
+        if _httpx_client is None:
+            _httpx_client = httpx.Client(
+                http2=http2_available(),
+                limits=httpx.Limits(
+                    max_connections=PoolConfig.POOL_CONNECTIONS * PoolConfig.POOL_MAXSIZE,
+                    max_keepalive_connections=PoolConfig.POOL_MAXSIZE,
+                    keepalive_expiry=PoolConfig.KEEPALIVE_EXPIRY
+                ),
+                timeout=httpx.Timeout(PoolConfig.READ_TIMEOUT, connect=PoolConfig.CONNECT_TIMEOUT),
+                event_hooks={"request": [_count_httpx_request]}
+            )
+            logger.info(f"Created shared httpx client (http2={http2_available()})")
+        return _httpx_client
+
+
+def _reuse_rate(requests_made: int, connections: int) -> float:
+    if not requests_made:
+        return 0.0
+    return round(max(requests_made - connections, 0) / requests_made, 4)
+
+
+def pool_stats() -> Dict:
+    """Return per-host request, connection and reuse counts for both clients."""
+    stats = {"requests": {}, "httpx": {}}
+
+    with _lock:
+        session = _session
+        httpx_hosts = {host: dict(counts) for host, counts in _httpx_stats.items()}
+
+    if session is not None:
+        seen = set()
+        for adapter in session.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is None:
+                    continue
+                stats["requests"][pool.host] = {
+                    "requests": pool.num_requests,
+                    "connections": pool.num_connections,
+                    "reuse_rate": _reuse_rate(pool.num_requests, pool.num_connections),
+                }
+
+    for host, counts in httpx_hosts.items():
+        stats["httpx"][host] = {
+            **counts,
+            "reuse_rate": _reuse_rate(counts["requests"], counts["connections"]),
+        }
+
+    return stats
@@ -0,0 +1,224 @@
+import logging
+import os
+import sqlite3
+import time
+from typing import Dict, List, Optional, Set, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Per-book pipeline stages, in the order they run
+IMPORTED = "imported"
+OLID_RESOLVED = "olid_resolved"
+TEXT_CHECKED = "text_checked"
+TEXT_DOWNLOADED = "text_downloaded"
+COVER_DOWNLOADED = "cover_downloaded"
+STAGES = (IMPORTED, OLID_RESOLVED, TEXT_CHECKED, TEXT_DOWNLOADED, COVER_DOWNLOADED)
+
+# Stage that must be done before another may run
+DEPENDS_ON = {
+    OLID_RESOLVED: IMPORTED,
+    TEXT_CHECKED: OLID_RESOLVED,
+    TEXT_DOWNLOADED: TEXT_CHECKED,
+    COVER_DOWNLOADED: OLID_RESOLVED,
+}
+
+DONE = "done"
+FAILED = "failed"
+SKIPPED = "skipped"  # nothing to do, e.g. no full text to download
+
+
+def init_stage_tables(conn: sqlite3.Connection):
+    """Create the stage-state, CSV import tracking and lookup miss tables."""
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS book_stages (
+            book_id INTEGER NOT NULL,
+            stage TEXT NOT NULL,
+            status TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            detail TEXT,
+            first_attempt_at REAL,
+            updated_at REAL,
+            completed_at REAL,
+            next_attempt_at REAL,
+            PRIMARY KEY (book_id, stage),
+            FOREIGN KEY (book_id) REFERENCES books (id)
+        );
+        CREATE INDEX IF NOT EXISTS book_stages_stage_status ON book_stages (stage, status);
+
+        CREATE TABLE IF NOT EXISTS imported_csvs (
+            path TEXT PRIMARY KEY,
+            size INTEGER,
+            mtime REAL,
+            rows INTEGER,
+            imported_at REAL
+        );
+
+        CREATE TABLE IF NOT EXISTS lookup_misses (
+            kind TEXT NOT NULL,
+            lookup_key TEXT NOT NULL,
+            misses INTEGER NOT NULL DEFAULT 1,
+            checked_at REAL NOT NULL,
+            PRIMARY KEY (kind, lookup_key)
+        );
+    """)
+    conn.commit()
+
+
+def _record(conn: sqlite3.Connection, book_id: int, stage: str, status: str,
+            error: Optional[str] = None, detail: Optional[str] = None,
+            next_attempt_at: Optional[float] = None):
+    now = time.time()
+    conn.execute("""
+        INSERT INTO book_stages (book_id, stage, status, attempts, last_error, detail,
+                                 first_attempt_at, updated_at, completed_at, next_attempt_at)
+        VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (book_id, stage) DO UPDATE SET
+            status = excluded.status,
+            attempts = book_stages.attempts + 1,
+            last_error = excluded.last_error,
+            detail = COALESCE(excluded.detail, book_stages.detail),
+            updated_at = excluded.updated_at,
+            completed_at = excluded.completed_at,
+            next_attempt_at = excluded.next_attempt_at
+    """, (book_id, stage, status, error, detail, now, now,
+          now if status != FAILED else None, next_attempt_at))
+
+
+def mark_done(conn: sqlite3.Connection, book_id: int, stage: str, detail: Optional[str] = None):
+    """Record a stage as completed. Does not commit."""
+    _record(conn, book_id, stage, DONE, detail=detail)
+
+
+def mark_skipped(conn: sqlite3.Connection, book_id: int, stage: str, reason: Optional[str] = None):
+    """Record a stage as having nothing to do. Does not commit."""
+    _record(conn, book_id, stage, SKIPPED, detail=reason)
+
+
+def mark_failed(conn: sqlite3.Connection, book_id: int, stage: str, error: str,
+                backoff: float, max_backoff: float):
+    """
+    Record a failed attempt and when the stage may be retried. Does not commit.
+
+    The retry delay doubles with every failed attempt, starting at backoff
+    seconds and capped at max_backoff.
+    """
+    row = conn.execute(
+        "SELECT attempts FROM book_stages WHERE book_id = ? AND stage = ?", (book_id, stage)
+    ).fetchone()
+    attempts = (row[0] if row else 0) + 1
+    delay = min(backoff * 2 ** (attempts - 1), max_backoff)
+    _record(conn, book_id, stage, FAILED, error=error[:500], next_attempt_at=time.time() + delay)
+
+
+def mark_imported(conn: sqlite3.Connection) -> int:
+    """Mark every book without stage state as imported. Returns the number marked."""
+    now = time.time()
+    with conn:
+        cursor = conn.execute("""
+            INSERT OR IGNORE INTO book_stages (book_id, stage, status, attempts,
+                                               first_attempt_at, updated_at, completed_at)
+            SELECT id, ?, ?, 1, ?, ?, ? FROM books
+        """, (IMPORTED, DONE, now, now, now))
+    return cursor.rowcount
+
+
+def pending(conn: sqlite3.Connection, stage: str, max_attempts: int) -> List[Tuple]:
+    """
+    Return the books a stage still has to run for.
+
+    A book is pending when the stage it depends on is done and the stage
+    itself either never ran or failed, is under max_attempts and its backoff
+    has passed.
+
+    Returns:
+        List[Tuple]: (book_id, olid, title, authors, detail of the dependency stage)
+    """
+    return conn.execute("""
+        SELECT b.id, b.olid, b.title, b.authors, dep.detail
+        FROM books b
+        JOIN book_stages dep
+          ON dep.book_id = b.id AND dep.stage = ? AND dep.status = ?
+        LEFT JOIN book_stages s
+          ON s.book_id = b.id AND s.stage = ?
+        WHERE s.book_id IS NULL
+           OR (s.status = ? AND s.attempts < ? AND s.next_attempt_at <= ?)
+        ORDER BY b.id
+    """, (DEPENDS_ON[stage], DONE, stage, FAILED, max_attempts, time.time())).fetchall()
+
+
+def new_csv_files(conn: sqlite3.Connection, csv_files: List[str]) -> List[str]:
+    """Return the CSV files that have not been imported yet."""
+    imported = {
+        path: (size, mtime)
+        for path, size, mtime in conn.execute("SELECT path, size, mtime FROM imported_csvs")
+    }
+    new_files = []
+    for csv_file in csv_files:
+        path = os.path.abspath(csv_file)
+        if path not in imported:
+            new_files.append(csv_file)
+            continue
+        stat = os.stat(csv_file)
+        if imported[path] != (stat.st_size, stat.st_mtime):
+            # Re-importing would duplicate rows without an OLID; add changes as a new file
+            logger.warning(f"{csv_file} changed since it was imported; skipping it")
+    return new_files
+
+
+def record_csv_import(conn: sqlite3.Connection, csv_file: str, rows: int):
+    """Remember that a CSV file has been imported."""
+    stat = os.stat(csv_file)
+    with conn:
+        conn.execute("""
+            INSERT OR REPLACE INTO imported_csvs (path, size, mtime, rows, imported_at)
+            VALUES (?, ?, ?, ?, ?)
+        """, (os.path.abspath(csv_file), stat.st_size, stat.st_mtime, rows, time.time()))
+
+
+def stage_summary(conn: sqlite3.Connection) -> Dict[str, Dict[str, int]]:
+    """Return book counts per stage and status."""
+    summary: Dict[str, Dict[str, int]] = {stage: {} for stage in STAGES}
+    for stage, status, count in conn.execute(
+        "SELECT stage, status, COUNT(*) FROM book_stages GROUP BY stage, status"
+    ):
+        summary.setdefault(stage, {})[status] = count
+    return summary
+
+
+def known_misses(conn: sqlite3.Connection, kind: str, keys: List[str], ttl: float) -> Set[str]:
+    """Return the keys that were looked up within the last ttl seconds and not found."""
+    misses: Set[str] = set()
+    cutoff = time.time() - ttl
+    keys = list(keys)
+    # Stay under SQLite's bound-parameter limit
+    for i in range(0, len(keys), 500):
+        chunk = keys[i:i + 500]
+        placeholders = ",".join("?" * len(chunk))
+        misses.update(key for (key,) in conn.execute(
+            f"SELECT lookup_key FROM lookup_misses WHERE kind = ? AND checked_at > ? "
+            f"AND lookup_key IN ({placeholders})",
+            (kind, cutoff, *chunk)
+        ))
+    return misses
+
+
+def record_misses(conn: sqlite3.Connection, kind: str, keys: List[str]):
+    """Remember lookups that found nothing so they are not repeated before the TTL passes."""
+    now = time.time()
+    with conn:
+        conn.executemany("""
+            INSERT INTO lookup_misses (kind, lookup_key, checked_at) VALUES (?, ?, ?)
+            ON CONFLICT (kind, lookup_key) DO UPDATE SET
+                misses = lookup_misses.misses + 1,
+                checked_at = excluded.checked_at
+        """, [(kind, key, now) for key in keys])
+
+
+def clear_misses(conn: sqlite3.Connection, kind: str, keys: List[str]):
+    """Forget misses for keys that have since been found."""
+    with conn:
+        conn.executemany(
+            "DELETE FROM lookup_misses WHERE kind = ? AND lookup_key = ?", [(kind, key) for key in keys]
+        )
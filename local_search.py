@@ -0,0 +1,172 @@
+import logging
+import sqlite3
+import threading
+from typing import Dict, List
+
+import text_store
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Column weights for bm25(), in books_fts column order
+BM25_WEIGHTS = (10.0, 5.0, 3.0, 1.0)  # title, authors, description, body
+
+_initialized_paths = set()
+_init_lock = threading.Lock()
+
+
+class LocalSearchUnavailable(Exception):
+    """Raised when the local books database has nothing to search"""
+    pass
+
+
+def init_search_index(conn: sqlite3.Connection):
+    """
+    Create the FTS5 index over books and full_texts and the triggers that keep it in sync.
+
+    Safe to call repeatedly. The index is backfilled from existing rows the
+    first time it is created, and rebuilt once if it was made before book
+    bodies were capped at text_store.SEARCH_INDEX_BYTES (see
+    text_store.search_text).
+    """
+    cursor = conn.cursor()
+
+    columns = [row[1] for row in cursor.execute("PRAGMA table_info(books)")]
+    if not columns:
+        raise LocalSearchUnavailable("books table does not exist")
+    if "description" not in columns:
+        cursor.execute("ALTER TABLE books ADD COLUMN description TEXT")
+
+    created = cursor.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone() is None
+    # Older indexes hold whole bodies; their full_texts trigger did not cut text_content down
+    trigger = cursor.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'books_fts_full_texts_ai'"
+    ).fetchone()
+    uncapped = trigger is not None and "substr" not in trigger[0]
+
+    cursor.executescript(f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+            title, authors, description, body,
+            tokenize = 'porter unicode61 remove_diacritics 2'
+        );
+
+        CREATE TRIGGER IF NOT EXISTS books_fts_books_ai AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, authors, description, body)
+            VALUES (new.id, new.title, new.authors, new.description, '');
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_fts_books_au
+        AFTER UPDATE OF title, authors, description ON books BEGIN
+            UPDATE books_fts
+            SET title = new.title, authors = new.authors, description = new.description
+            WHERE rowid = new.id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_fts_books_ad AFTER DELETE ON books BEGIN
+            DELETE FROM books_fts WHERE rowid = old.id;
+        END;
+
+        DROP TRIGGER IF EXISTS books_fts_full_texts_ai;
+        CREATE TRIGGER books_fts_full_texts_ai AFTER INSERT ON full_texts BEGIN
+            UPDATE books_fts SET body = substr(new.text_content, 1, {text_store.SEARCH_INDEX_BYTES})
+            WHERE rowid = new.book_id;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS books_fts_full_texts_ad AFTER DELETE ON full_texts BEGIN
+            UPDATE books_fts SET body = '' WHERE rowid = old.book_id;
+        END;
+    """)
+
+    if created or uncapped:
+        rebuild_search_index(conn)
+    conn.commit()
+
+
+def rebuild_search_index(conn: sqlite3.Connection):
+    """Repopulate books_fts from the books and full_texts tables, bodies capped as in text_store.search_text."""
+    cursor = conn.cursor()
+    cursor.execute("DELETE FROM books_fts")
+    cursor.execute("""
+        INSERT INTO books_fts (rowid, title, authors, description, body)
+        SELECT b.id, b.title, b.authors, b.description,
+               COALESCE(substr((SELECT group_concat(f.text_content, ' ')
+                                FROM full_texts f WHERE f.book_id = b.id), 1, ?), '')
+        FROM books b
+    """, (text_store.SEARCH_INDEX_BYTES,))
+    indexed = cursor.rowcount
+
+    # Compressed texts have no text_content; index them one book at a time
+    chunked = conn.execute(
+        "SELECT DISTINCT book_id FROM full_texts WHERE text_content IS NULL AND book_id IS NOT NULL"
+    ).fetchall()
+    for (book_id,) in chunked:
+        cursor.execute(
+            "UPDATE books_fts SET body = ? WHERE rowid = ?", (text_store.search_text(conn, book_id), book_id)
+        )
+    conn.commit()
+    logger.info(f"Indexed {indexed} books for local search")
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """Open the books database, creating the search index on first use in this process."""
+    conn = sqlite3.connect(db_path)
+    if db_path not in _initialized_paths:
+        with _init_lock:
+            if db_path not in _initialized_paths:
+                try:
+                    init_search_index(conn)
+                except Exception:
+                    conn.close()
+                    raise
+                _initialized_paths.add(db_path)
+    return conn
+
+
+def to_match_expression(query: str) -> str:
+    """Quote each term so user input cannot break FTS5 query syntax."""
+    terms = [term.replace('"', '""') for term in query.split()]
+    return " ".join(f'"{term}"' for term in terms if term)
+
+
+def search_local(conn: sqlite3.Connection, query: str, limit: int = 10, offset: int = 0) -> List[Dict]:
+    """
+    Run a ranked full-text search over harvested books.
+
+    Args:
+        conn (sqlite3.Connection): Connection from connect().
+        query (str): Free-text search terms; all terms must match.
+        limit (int): Maximum number of results.
+        offset (int): Number of results to skip.
+
+    Returns:
+        List[Dict]: Books ordered by bm25 relevance with a highlighted snippet.
+    """
+    expression = to_match_expression(query)
+    if not expression:
+        return []
+
+    rows = conn.execute(f"""
+        SELECT b.id, b.olid, b.title, b.authors, b.description,
+               bm25(books_fts, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS score,
+               snippet(books_fts, -1, '<mark>', '</mark>', '…', 16) AS snippet
+        FROM books_fts
+        JOIN books b ON b.id = books_fts.rowid
+        WHERE books_fts MATCH ?
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """, (expression, limit, offset)).fetchall()
+
+    return [
+        {
+            "id": row[0],
+            "olid": row[1],
+            "title": row[2],
+            "authors": [a.strip() for a in (row[3] or "").split(",") if a.strip()],
+            "description": row[4],
+            "score": round(-row[5], 4),  # bm25() is lower-is-better; flip for readability
+            "snippet": row[6],
+        }
+        for row in rows
+    ]
@@ -0,0 +1,345 @@
+import json
+import logging
+import math
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds in seconds; covers cache hits through slow downloads
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+LabelValues = Tuple[str, ...]
+
+
+class _Metric:
+    """Base for a named metric with a fixed set of label names, safe to update from any thread."""
+    type_name = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelValues:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _labels(self, key: LabelValues) -> Dict[str, str]:
+        return dict(zip(self.labelnames, key))
+
+
+class Counter(_Metric):
+    """A value that only goes up, per label combination."""
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help_text, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def samples(self) -> List[Tuple[Dict[str, str], float]]:
+        with self._lock:
+            return [(self._labels(key), value) for key, value in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    """A value that is set to the current reading, per label combination."""
+    type_name = "gauge"
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+
+class Histogram(_Metric):
+    """Observed values (usually seconds) counted into cumulative buckets, per label combination."""
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [per-bucket counts (+Inf last), sum]
+        self._values: Dict[LabelValues, List] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        """Observe how long the with block takes, including when it raises."""
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - started, **labels)
+
+    def samples(self) -> List[Tuple[Dict[str, str], List[int], float]]:
+        with self._lock:
+            return [(self._labels(key), list(counts), total)
+                    for key, (counts, total) in sorted(self._values.items())]
+
+    def quantile(self, counts: List[int], q: float) -> Optional[float]:
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        total = sum(counts)
+        if not total:
+            return None
+        rank = math.ceil(q * total)
+        seen = 0
+        for bound, count in zip(self.buckets + (math.inf,), counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return math.inf
+
+
+_registry: Dict[str, _Metric] = {}
+_registry_lock = threading.Lock()
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _registry.get(metric.name)
+        if existing is not None:
+            return existing
+        _registry[metric.name] = metric
+        return metric
+
+
+def counter(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Return the process-wide counter with this name, creating it on first use."""
+    return _register(Counter(name, help_text, labelnames))
+
+
+def gauge(name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+    """Return the process-wide gauge with this name, creating it on first use."""
+    return _register(Gauge(name, help_text, labelnames))
+
+
+def histogram(name: str, help_text: str, labelnames: Sequence[str] = (),
+              buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+    """Return the process-wide histogram with this name, creating it on first use."""
+    return _register(Histogram(name, help_text, labelnames, buckets))
+
+
+# Upstream APIs (labelled by host)
+UPSTREAM_REQUESTS = counter("upstream_requests_total", "HTTP requests sent to upstream APIs", ("host", "status"))
+UPSTREAM_SECONDS = histogram("upstream_request_seconds", "Upstream request latency", ("host",))
+DOWNLOADED_BYTES = counter("upstream_downloaded_bytes_total", "Response body bytes downloaded", ("host",))
+RATE_LIMIT_WAIT_SECONDS = counter("rate_limit_wait_seconds_total",
+                                  "Time spent blocked waiting for a host rate limiter", ("host",))
+RATE_LIMIT_CALLS_PER_MINUTE = gauge("rate_limit_calls_per_minute",
+                                    "Current adaptive request rate per host", ("host",))
+RETRIES = counter("retries_total", "Retried operations", ("operation",))
+RETRY_WAIT_SECONDS = counter("retry_wait_seconds_total", "Time spent sleeping before retries", ("operation",))
+# Caches (result: hit, miss, revalidated, ...)
+CACHE_LOOKUPS = counter("cache_lookups_total", "Cache lookups by outcome", ("cache", "result"))
+# Batch pipeline
+STAGE_SECONDS = histogram("pipeline_stage_seconds", "Time per item spent in a pipeline stage", ("stage",))
+STAGE_ITEMS = counter("pipeline_items_total", "Items processed by a pipeline stage", ("stage", "status"))
+DB_WRITE_SECONDS = histogram("db_write_seconds", "Database write transaction latency", ("operation",))
+# Web app
+HTTP_REQUESTS = counter("http_requests_total", "Requests served by the web app", ("endpoint", "method", "status"))
+HTTP_REQUEST_SECONDS = histogram("http_request_seconds", "Web app request latency", ("endpoint",))
+
+# Hit results per cache; everything else counts as a miss for the hit ratio
+_HIT_RESULTS = {"hit", "revalidated", "stale_hit", "negative_hit", "duplicate"}
+
+
+def observe_upstream(host: str, status_code: Optional[int], seconds: float, nbytes: int = 0):
+    """Record one upstream request; status_code None means it failed without a response."""
+    UPSTREAM_REQUESTS.inc(host=host, status=status_code if status_code is not None else "error")
+    UPSTREAM_SECONDS.observe(seconds, host=host)
+    if nbytes:
+        DOWNLOADED_BYTES.inc(nbytes, host=host)
+
+
+def retry_recorder(operation: str) -> Callable:
+    """Return a tenacity before_sleep callback counting retries and their sleep time."""
+    def before_sleep(retry_state):
+        RETRIES.inc(operation=operation)
+        if retry_state.next_action is not None:
+            RETRY_WAIT_SECONDS.inc(retry_state.next_action.sleep, operation=operation)
+    return before_sleep
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels.items()) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+def render() -> str:
+    """Return every metric in the Prometheus text exposition format (version 0.0.4)."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    lines = []
+    for metric in metrics:
+        lines.append(f"# HELP {metric.name} {metric.help}")
+        lines.append(f"# TYPE {metric.name} {metric.type_name}")
+        if isinstance(metric, Histogram):
+            for labels, counts, total in metric.samples():
+                cumulative = 0
+                for bound, count in zip(metric.buckets + (math.inf,), counts):
+                    cumulative += count
+                    le = _format_value(bound) if bound == math.inf else repr(bound)
+                    lines.append(f"{metric.name}_bucket{_format_labels(labels, ('le', le))} {cumulative}")
+                lines.append(f"{metric.name}_sum{_format_labels(labels)} {_format_value(total)}")
+                lines.append(f"{metric.name}_count{_format_labels(labels)} {cumulative}")
+        else:
+            for labels, value in metric.samples():
+                lines.append(f"{metric.name}{_format_labels(labels)} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _bound(value: Optional[float]):
+    # Keep the JSON strict: past the last bucket there is only "+Inf"
+    return "+Inf" if value == math.inf else value
+
+
+def snapshot() -> Dict[str, List[Dict]]:
+    """Return every metric as plain data; histograms as count, sum and estimated p50/p95."""
+    with _registry_lock:
+        metrics = sorted(_registry.values(), key=lambda m: m.name)
+    data: Dict[str, List[Dict]] = {}
+    for metric in metrics:
+        if isinstance(metric, Histogram):
+            data[metric.name] = [
+                {"labels": labels, "count": sum(counts), "sum": round(total, 3),
+                 "p50": _bound(metric.quantile(counts, 0.5)), "p95": _bound(metric.quantile(counts, 0.95))}
+                for labels, counts, total in metric.samples()
+            ]
+        else:
+            data[metric.name] = [{"labels": labels, "value": value} for labels, value in metric.samples()]
+    return data
+
+
+def _totals(samples: List[Dict], label: str, field: str = "value") -> Dict[str, float]:
+    totals: Dict[str, float] = {}
+    for sample in samples:
+        name = sample["labels"][label]
+        totals[name] = totals.get(name, 0) + sample[field]
+    return totals
+
+
+def summarize() -> Dict:
+    """
+    Condense the metrics into where the time went: per upstream host, stage, cache and DB operation.
+
+    Returns:
+        Dict: {"upstreams", "stages", "caches", "db_writes", "retries"} keyed by label value.
+    """
+    data = snapshot()
+    upstreams: Dict[str, Dict] = {}
+    for sample in data[UPSTREAM_REQUESTS.name]:
+        host = upstreams.setdefault(sample["labels"]["host"], {"requests": 0, "by_status": {}})
+        host["requests"] += int(sample["value"])
+        host["by_status"][sample["labels"]["status"]] = int(sample["value"])
+    for sample in data[UPSTREAM_SECONDS.name]:
+        upstreams.setdefault(sample["labels"]["host"], {}).update(
+            request_seconds=sample["sum"], p50=sample["p50"], p95=sample["p95"]
+        )
+    for name, field in ((DOWNLOADED_BYTES.name, "bytes"),
+                        (RATE_LIMIT_WAIT_SECONDS.name, "rate_limit_wait_seconds")):
+        for host, value in _totals(data[name], "host").items():
+            upstreams.setdefault(host, {})[field] = round(value, 3)
+
+    stages: Dict[str, Dict] = {}
+    for sample in data[STAGE_ITEMS.name]:
+        stages.setdefault(sample["labels"]["stage"], {}).setdefault("items", {})[
+            sample["labels"]["status"]] = int(sample["value"])
+    for sample in data[STAGE_SECONDS.name]:
+        stages.setdefault(sample["labels"]["stage"], {}).update(
+            seconds=sample["sum"], p50=sample["p50"], p95=sample["p95"]
+        )
+
+    caches: Dict[str, Dict] = {}
+    for sample in data[CACHE_LOOKUPS.name]:
+        cache = caches.setdefault(sample["labels"]["cache"], {})
+        cache[sample["labels"]["result"]] = int(sample["value"])
+    for cache in caches.values():
+        lookups = sum(cache.values())
+        hits = sum(count for result, count in cache.items() if result in _HIT_RESULTS)
+        cache["hit_ratio"] = round(hits / lookups, 3) if lookups else None
+
+    db_writes = {
+        sample["labels"]["operation"]: {"count": sample["count"], "seconds": sample["sum"], "p95": sample["p95"]}
+        for sample in data[DB_WRITE_SECONDS.name]
+    }
+    retries = {
+        operation: {"retries": int(count),
+                    "wait_seconds": round(_totals(data[RETRY_WAIT_SECONDS.name], "operation").get(operation, 0), 3)}
+        for operation, count in _totals(data[RETRIES.name], "operation").items()
+    }
+    return {"upstreams": upstreams, "stages": stages, "caches": caches, "db_writes": db_writes,
+            "retries": retries}
+
+
+def write_run_summary(path: str, script: str, started_at: float, status: str = "ok",
+                      **extra) -> Dict:
+    """
+    Write a JSON summary of a batch run: timing, the summarize() breakdown and all metrics.
+
+    Args:
+        path (str): Output file; its directory is created if needed.
+        script (str): Name of the batch script.
+        started_at (float): time.time() when the run started.
+        status (str): "ok", or how the run ended otherwise.
+        **extra: Further JSON-serializable fields, e.g. arguments or counts.
+
+    Returns:
+        Dict: The summary that was written.
+    """
+    finished_at = time.time()
+    summary = {
+        "script": script,
+        "status": status,
+        "started_at": datetime.fromtimestamp(started_at).isoformat(timespec="seconds"),
+        "finished_at": datetime.fromtimestamp(finished_at).isoformat(timespec="seconds"),
+        "duration_seconds": round(finished_at - started_at, 3),
+        **extra,
+        **summarize(),
+        "metrics": snapshot(),
+    }
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2, default=str)
+    logger.info(f"Wrote run summary to {path}")
+    return summary
+
+
+def run_summary_path(directory: str, script: str) -> str:
+    """Return a timestamped summary file path such as data/runs/extract_content-20240101-120000.json."""
+    return os.path.join(directory, f"{script}-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
@@ -1,8 +1,19 @@
 import httpx
 import logging
+import http_client
+import metrics
 import os
+import time
 from typing import List, Dict, Optional
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_not_exception_type
+from resilience import (
+    CircuitOpenError,
+    DeadlineExceeded,
+    get_breaker,
+    is_upstream_failure,
+    stop_at_deadline,
+    wait_within_deadline
+)
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -10,16 +21,41 @@ logger = logging.getLogger(__name__)
 # Check if we should use mock data
 USE_MOCK_DATA = os.environ.get("USE_MOCK_DATA", "false").lower() == "true"
 
-@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-def fetch_books_from_openlibrary(query: str) -> List[Dict]:
+
+class OpenLibraryAPIError(Exception):
+    """Open Library search failed: a connection error or an error status."""
+    pass
+
+
+class OpenLibraryRequestRejected(OpenLibraryAPIError):
+    """Open Library rejected the request (a 4xx other than 429); repeating it will not help."""
+    pass
+
+
+@retry(
+    stop=stop_after_attempt(3) | stop_at_deadline,
+    wait=wait_within_deadline(wait_exponential(multiplier=1, min=2, max=10)),
+    retry=retry_if_not_exception_type((CircuitOpenError, DeadlineExceeded, OpenLibraryRequestRejected)),
+    before_sleep=metrics.retry_recorder("openlibrary_search"),
+    reraise=True
+)
+def fetch_books_from_openlibrary(query: str, offset: int = 0, limit: int = 10,
+                                 deadline=None) -> List[Dict]:
     """
     Fetch books from Open Library API with improved retry logic and mock data fallback.
     
     Args:
         query (str): Search query string
+        offset (int): Number of results to skip
+        limit (int): Maximum number of results to return
+        deadline (Optional[Deadline]): Time budget for retries and timeouts
         
     Returns:
         List[Dict]: List of books with title, authors, and description
+
+    Raises:
+        OpenLibraryAPIError: The request failed, after any retries the deadline
+            allows, so callers can fall back to cached or mock results.
     """
     # Return mock data if requested
     if USE_MOCK_DATA:
@@ -39,42 +75,66 @@ def fetch_books_from_openlibrary(query: str) -> List[Dict]:
         
     from urllib.parse import quote
     encoded_query = quote(query)
-    url = f"https://openlibrary.org/search.json?q={encoded_query}&limit=10"
+    url = f"https://openlibrary.org/search.json?q={encoded_query}&limit={int(limit)}&offset={int(offset)}"
+
+    # Work out the time budget first, so a spent deadline never takes a half-open trial slot
+    connect_timeout, read_timeout = http_client.timeout(deadline=deadline)
+    breaker = get_breaker("openlibrary")
+    trial = breaker.check()
     
     try:
-        with httpx.Client(timeout=30) as client:
-            response = client.get(url)
-            response.raise_for_status()
-            data = response.json()
+        client = http_client.get_httpx_client()
+        started = time.monotonic()
+        try:
+            response = client.get(url, timeout=httpx.Timeout(read_timeout, connect=connect_timeout))
+        except httpx.RequestError:
+            metrics.observe_upstream("openlibrary.org", None, time.monotonic() - started)
+            raise
+        metrics.observe_upstream("openlibrary.org", response.status_code, time.monotonic() - started,
+                                 len(response.content))
+        response.raise_for_status()
+        data = response.json()
+        breaker.record_success()
         
-            books = []
-            for doc in data.get("docs", []):
-                book = {
-                    "title": doc.get("title", "Unknown Title"),
-                    "authors": doc.get("author_name", []),
-                    "description": None
-                }
-                
-                # Try different fields for description in the order of priority:
-                # "first_sentence" > "description" > "subtitle".
-                # The first available field will be used as the description.
-                for field in ["first_sentence", "description", "subtitle"]:
-                    if field in doc:
-                        value = doc[field]
-                        if isinstance(value, list):
-                            book["description"] = value[0]
-                        else:
-                            book["description"] = value
-                        break
-                books.append(book)
-            
-            logger.debug(f"Found {len(books)} books from OpenLibrary for query: {query}")
-            logger.info(f"Found {len(books)} books from OpenLibrary for query: {query}")
-            return books
+        books = []
+        for doc in data.get("docs", []):
+            isbns = doc.get("isbn", [])
+            book = {
+                "title": doc.get("title", "Unknown Title"),
+                "authors": doc.get("author_name", []),
+                "description": None,
+                "isbn_10": next((i for i in isbns if len(i) == 10), None),
+                "isbn_13": next((i for i in isbns if len(i) == 13), None)
+            }
             
+            # Try different fields for description in the order of priority:
+            # "first_sentence" > "description" > "subtitle".
+            # The first available field will be used as the description.
+            for field in ["first_sentence", "description", "subtitle"]:
+                if field in doc:
+                    value = doc[field]
+                    if isinstance(value, list):
+                        book["description"] = value[0]
+                    else:
+                        book["description"] = value
+                    break
+            books.append(book)
+        
+        logger.debug(f"Found {len(books)} books from OpenLibrary for query: {query}")
+        logger.info(f"Found {len(books)} books from OpenLibrary for query: {query}")
+        return books
+        
     except httpx.RequestError as e:
+        breaker.record_failure()
         logger.error(f"Request error while fetching books from Open Library: {e}")
-        return []
+        raise OpenLibraryAPIError(f"Failed to fetch books: {e}") from e
     except httpx.HTTPStatusError as e:
+        # A 4xx is still an answer from a healthy upstream
+        status = e.response.status_code
+        breaker.record_response(status)
         logger.error(f"HTTP status error while fetching books from Open Library: {e}")
-        return []
+        if not is_upstream_failure(status):
+            raise OpenLibraryRequestRejected(f"Failed to fetch books: {e}") from e
+        raise OpenLibraryAPIError(f"Failed to fetch books: {e}") from e
+    finally:
+        breaker.release(trial)
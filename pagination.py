@@ -0,0 +1,68 @@
+import base64
+import binascii
+import json
+from typing import Dict, Mapping, Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 40  # Google Books rejects maxResults above 40
+
+
+class PaginationError(ValueError):
+    """Raised for malformed page, page_size or cursor arguments"""
+    pass
+
+
+def encode_cursor(offset: int, limit: int) -> str:
+    """Return an opaque cursor for a page."""
+    raw = json.dumps({"o": offset, "l": limit}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int]:
+    """Return (offset, limit) from a cursor produced by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        offset, limit = int(data["o"]), int(data["l"])
+    except (binascii.Error, UnicodeError, ValueError, KeyError, TypeError):
+        raise PaginationError("Invalid cursor")
+    return _validate(offset, limit)
+
+
+def _validate(offset: int, limit: int) -> Tuple[int, int]:
+    if offset < 0:
+        raise PaginationError("page must be 1 or greater")
+    if not 1 <= limit <= MAX_PAGE_SIZE:
+        raise PaginationError(f"page_size must be between 1 and {MAX_PAGE_SIZE}")
+    return offset, limit
+
+
+def parse_page_args(args: Mapping[str, str]) -> Tuple[int, int]:
+    """
+    Read (offset, limit) from request arguments.
+
+    A cursor takes precedence; otherwise 1-based page and page_size are used.
+    """
+    cursor = args.get("cursor")
+    if cursor:
+        return decode_cursor(cursor)
+    try:
+        page = int(args.get("page", 1))
+        limit = int(args.get("page_size", DEFAULT_PAGE_SIZE))
+    except (TypeError, ValueError):
+        # TypeError: JSON payloads (Socket.IO) can carry null, lists or objects
+        raise PaginationError("page and page_size must be integers")
+    if page < 1:
+        raise PaginationError("page must be 1 or greater")
+    return _validate((page - 1) * limit, limit)
+
+
+def page_info(offset: int, limit: int, count: int) -> Dict[str, Optional[object]]:
+    """Describe the returned page; next_cursor is None once a short page comes back."""
+    return {
+        "page": offset // limit + 1,
+        "page_size": limit,
+        "offset": offset,
+        "next_cursor": encode_cursor(offset + limit, limit) if count >= limit else None,
+        "prev_cursor": encode_cursor(max(offset - limit, 0), limit) if offset > 0 else None,
+    }
@@ -1,35 +1,206 @@
+import argparse
 import os
 import glob
 import logging
-from extract_book_data import process_books
+import multiprocessing
+import queue
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, List, Optional
+import metrics
+import rate_limiter
+from chunk_writer import FORMATS
+from extract_book_data import RUN_SUMMARY_DIR, merge_lookup_stats, process_books, processed_output_path
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def process_all_csvs():
-    """Process all CSV files in the data/raw_csv directory."""
+SHARED_LIMITS_PATH = "data/rate_limits.db"  # host budgets shared by the --workers processes
+PROGRESS_INTERVAL = 10  # seconds between aggregated progress lines
+BATCH_SIZE = 5
+
+# Set in each worker process by _init_worker
+_progress_queue: Optional[multiprocessing.Queue] = None
+
+def _init_worker(shared_limits_path: str, progress_queue: multiprocessing.Queue):
+    """Pool initializer: take host budgets from the shared file and report progress to the parent."""
+    global _progress_queue
+    rate_limiter.use_shared_state(shared_limits_path)
+    _progress_queue = progress_queue
+
+def _report_progress(rows: int):
+    _progress_queue.put((os.getpid(), rows))
+
+def _process_file(input_file: str, output_format: str) -> Dict:
+    """Worker: enrich one file; returns its lookup counts and this worker's cumulative metrics."""
+    output_file = processed_output_path(input_file, output_format)
+    lookups = process_books(input_file, output_file, batch_size=BATCH_SIZE, output_format=output_format,
+                            progress=_report_progress)
+    return {"pid": os.getpid(), "lookups": lookups, "summary": metrics.summarize(),
+            "rate_limits": rate_limiter.limiter_stats()}
+
+def _merge_rate_limits(workers_info: Dict[int, Dict]) -> Dict[str, Dict]:
+    """
+    Combine the workers' limiter stats into one entry per host.
+
+    Counters and in-flight caps add up across workers. The workers share one
+    budget per host, so the rate reported is the lowest any of them last saw,
+    and latency is averaged over the requests each worker made.
+
+    Args:
+        workers_info (Dict[int, Dict]): Per-pid results from _process_in_pool.
+
+    Returns:
+        Dict[str, Dict]: Host -> merged HostLimiter.stats().
+    """
+    merged: Dict[str, Dict] = {}
+    latency_totals: Dict[str, List[float]] = {}
+    for info in workers_info.values():
+        for host, stats in info["rate_limits"].items():
+            if host not in merged:
+                merged[host] = dict(stats)
+                merged[host]["workers"] = 1
+            else:
+                total = merged[host]
+                total["workers"] += 1
+                for name in ("requests", "throttled", "errors", "increases", "decreases", "max_in_flight"):
+                    total[name] += stats[name]
+                total["wait_seconds"] = round(total["wait_seconds"] + stats["wait_seconds"], 3)
+                total["calls_per_minute"] = min(total["calls_per_minute"], stats["calls_per_minute"])
+                total["paused_for"] = max(total["paused_for"], stats["paused_for"])
+            if stats["latency_ms"] is not None and stats["requests"]:
+                weighted, requests = latency_totals.get(host, [0.0, 0])
+                latency_totals[host] = [weighted + stats["latency_ms"] * stats["requests"],
+                                        requests + stats["requests"]]
+    for host, (weighted, requests) in latency_totals.items():
+        merged[host]["latency_ms"] = round(weighted / requests, 1)
+    return merged
+
+def _process_in_pool(csv_files: List[str], workers: int, output_format: str,
+                     lookups: Dict[str, Dict[str, int]], failed_files: List[str]) -> Dict[int, Dict]:
+    """
+    Spread files over a pool of worker processes that share the host rate limits.
+
+    The shared limiter file is reset first, so the workers start from the
+    configured budgets and together stay within them. Workers report rows
+    as they are written; the totals are logged every PROGRESS_INTERVAL.
+
+    Returns:
+        Dict[int, Dict]: Latest metrics summary and limiter stats per worker pid.
+    """
+    rate_limiter.use_shared_state(SHARED_LIMITS_PATH, reset=True)
+    context = multiprocessing.get_context()
+    progress_queue = context.Queue()
+    rows_by_worker: Dict[int, int] = {}
+    workers_info: Dict[int, Dict] = {}
+    started = time.monotonic()
+    last_report = started
+    files_done = 0
+
+    def drain():
+        while True:
+            try:
+                pid, rows = progress_queue.get_nowait()
+            except queue.Empty:
+                return
+            rows_by_worker[pid] = rows_by_worker.get(pid, 0) + rows
+
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker,
+                             initargs=(SHARED_LIMITS_PATH, progress_queue)) as executor:
+        pending = {executor.submit(_process_file, input_file, output_format): input_file
+                   for input_file in csv_files}
+        while pending:
+            done, _ = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                input_file = pending.pop(future)
+                files_done += 1
+                try:
+                    result = future.result()
+                    merge_lookup_stats(lookups, result["lookups"])
+                    workers_info[result["pid"]] = {"summary": result["summary"],
+                                                   "rate_limits": result["rate_limits"]}
+                    logger.info(f"Finished {os.path.basename(input_file)} ({files_done}/{len(csv_files)})")
+                except Exception as e:
+                    logger.error(f"Error processing {os.path.basename(input_file)}: {e}")
+                    failed_files.append(input_file)
+
+            drain()
+            now = time.monotonic()
+            if now - last_report >= PROGRESS_INTERVAL or not pending:
+                last_report = now
+                rows = sum(rows_by_worker.values())
+                logger.info(f"Progress: {files_done}/{len(csv_files)} files, {rows} rows "
+                            f"({rows / (now - started):.1f} rows/s) across {len(rows_by_worker)} workers")
+    return workers_info
+
+def process_all_csvs(output_format: str = "csv", workers: int = 1):
+    """Process all CSV files in the data/raw_csv directory.
+
+    Args:
+        output_format (str): "csv" or "parquet" (needs pyarrow)
+        workers (int): Worker processes; above 1, files are processed in parallel
+            under host rate limits shared through SHARED_LIMITS_PATH
+    """
     # Create output directory if it doesn't exist
     os.makedirs("data/processed", exist_ok=True)
-    
+
     # Get all CSV files in the raw_csv directory
     csv_files = glob.glob("data/raw_csv/*.csv")
     total_files = len(csv_files)
-    
+
     logger.info(f"Found {total_files} CSV files to process")
-    
-    for i, input_file in enumerate(csv_files, 1):
-        try:
-            # Create output filename
+    started_at = time.time()
+    failed_files = []
+    lookups: Dict[str, Dict[str, int]] = {}
+    workers_info: Dict[int, Dict] = {}
+
+    if workers > 1 and total_files > 1:
+        workers_info = _process_in_pool(csv_files, min(workers, total_files), output_format, lookups,
+                                        failed_files)
+        # The requests were made in the workers; this process's limiters never ran
+        rate_limits = _merge_rate_limits(workers_info)
+    else:
+        for i, input_file in enumerate(csv_files, 1):
             filename = os.path.basename(input_file)
-            output_file = os.path.join("data/processed", f"processed_{filename}")
-            
-            logger.info(f"Processing file {i}/{total_files}: {filename}")
-            process_books(input_file, output_file, batch_size=5)
-            
-        except Exception as e:
-            logger.error(f"Error processing {filename}: {e}")
-            continue
+            try:
+                # Create output filename
+                output_file = processed_output_path(input_file, output_format)
+
+                logger.info(f"Processing file {i}/{total_files}: {filename}")
+                merge_lookup_stats(lookups, process_books(input_file, output_file, batch_size=BATCH_SIZE,
+                                                         output_format=output_format))
+
+            except Exception as e:
+                logger.error(f"Error processing {filename}: {e}")
+                failed_files.append(input_file)
+                continue
+        rate_limits = rate_limiter.limiter_stats()
+
+    for source, counts in lookups.items():
+        logger.info(f"{source}: {counts['calls']} requests for {counts['lookups']} rows, "
+                    f"{counts['calls_saved']} saved")
+    metrics.write_run_summary(
+        metrics.run_summary_path(RUN_SUMMARY_DIR, "process_csvs"), "process_csvs", started_at,
+        status="ok" if not failed_files else "partial", files=total_files, failed_files=failed_files,
+        output_format=output_format, workers=workers, rate_limits=rate_limits,
+        enrichment_lookups=lookups,
+        calls_saved={source: counts["calls_saved"] for source, counts in lookups.items()},
+        worker_summaries={str(pid): info for pid, info in workers_info.items()}
+    )
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Enrich every CSV in data/raw_csv")
+    parser.add_argument(
+        "--format", choices=FORMATS, default="csv",
+        help="Output format; parquet (needs pyarrow) writes a directory of part files with string columns"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Worker processes; files are spread over them and share the Google Books/Open Library limits"
+    )
+    return parser.parse_args()
 
 if __name__ == "__main__":
-    process_all_csvs()
\ No newline at end of file
+    args = parse_args()
+    process_all_csvs(args.format, workers=args.workers)
@@ -0,0 +1,455 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+from urllib.parse import urlsplit
+
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CALLS_PER_MINUTE = 60
+DEFAULT_MAX_IN_FLIGHT = 4
+
+# AIMD tuning: healthy responses add INCREASE_PER_SUCCESS calls/minute, throttling
+# multiplies the rate by DECREASE_FACTOR (at most once per DECREASE_COOLDOWN seconds)
+INCREASE_PER_SUCCESS = 1.0
+DECREASE_FACTOR = 0.5
+DECREASE_COOLDOWN = 2.0
+# A response slower than this multiple of the best smoothed latency does not ramp up
+SLOW_LATENCY_FACTOR = 3.0
+LATENCY_SMOOTHING = 0.2
+MAX_PAUSE = 300.0  # seconds; cap on Retry-After and rate-limit reset waits
+# SQLite file through which processes share host budgets (see use_shared_state); unset means per process
+SHARED_STATE_PATH = os.getenv("RATE_LIMIT_SHARED_PATH") or None
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the seconds to wait from a Retry-After value (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def _header(headers: Optional[Mapping[str, Any]], *names: str) -> Optional[str]:
+    if not headers:
+        return None
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            return str(value)
+    return None
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket.
+
+    Args:
+        rate (float): Tokens added per second.
+        capacity (float): Maximum burst size.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def set_rate(self, rate: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = rate
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for the next seconds (e.g. after a Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def paused_for(self) -> float:
+        with self._lock:
+            return max(self._paused_until - time.monotonic(), 0.0)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    delay = self._paused_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return waited
+                    delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class SharedTokenBucket:
+    """
+    Token bucket whose state lives in SQLite, shared by every process using the same file.
+
+    A drop-in for TokenBucket: processes take tokens from one bucket per
+    host, so together they stay within its rate, and a pause (Retry-After)
+    or rate change made by one process applies to all of them. Each token
+    costs one short write transaction, which is negligible at the
+    per-minute rates of the upstream APIs.
+
+    Args:
+        path (str): SQLite file holding the buckets.
+        name (str): Bucket name (the host).
+        rate (float): Tokens added per second, if the bucket does not exist yet.
+        capacity (float): Maximum burst size.
+    """
+
+    def __init__(self, path: str, name: str, rate: float, capacity: float = 1.0):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._owner_pid: Optional[int] = None
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO token_buckets (name, rate, tokens, updated_at, paused_until) "
+                "VALUES (?, ?, ?, ?, 0)", (name, rate, capacity, time.time())
+            )
+            # Another process may have created (and adapted) the bucket already
+            self.rate = conn.execute("SELECT rate FROM token_buckets WHERE name = ?", (name,)).fetchone()[0]
+
+    def _connection(self) -> sqlite3.Connection:
+        """Open (or reopen after a fork) the state database. Call with the lock held."""
+        if self._conn is None or self._owner_pid != os.getpid():
+            self._conn = _open_shared_state(self.path)
+            self._owner_pid = os.getpid()
+        return self._conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Hold the bucket locked against other processes (and threads) for a read-modify-write."""
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def _refill(self, conn: sqlite3.Connection, now: float) -> Tuple[float, float]:
+        """Read the bucket; returns (tokens available now, paused_until) and refreshes self.rate."""
+        rate, tokens, updated_at, paused_until = conn.execute(
+            "SELECT rate, tokens, updated_at, paused_until FROM token_buckets WHERE name = ?", (self.name,)
+        ).fetchone()
+        self.rate = rate
+        return min(self.capacity, tokens + max(now - updated_at, 0.0) * rate), paused_until
+
+    def set_rate(self, rate: float):
+        with self._transaction() as conn:
+            now = time.time()
+            tokens, _ = self._refill(conn, now)
+            conn.execute("UPDATE token_buckets SET rate = ?, tokens = ?, updated_at = ? WHERE name = ?",
+                         (rate, tokens, now, self.name))
+            self.rate = rate
+
+    def pause(self, seconds: float):
+        """Hand out no tokens, in any process, for the next seconds."""
+        with self._transaction() as conn:
+            now = time.time()
+            conn.execute(
+                "UPDATE token_buckets SET tokens = 0, updated_at = ?, paused_until = MAX(paused_until, ?) "
+                "WHERE name = ?", (now, now + seconds, self.name)
+            )
+
+    def paused_for(self) -> float:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT paused_until FROM token_buckets WHERE name = ?", (self.name,)
+            ).fetchone()
+        return max(row[0] - time.time(), 0.0) if row else 0.0
+
+    def acquire(self) -> float:
+        """Take one token, sleeping until one is available. Returns seconds waited."""
+        waited = 0.0
+        while True:
+            with self._transaction() as conn:
+                now = time.time()
+                tokens, paused_until = self._refill(conn, now)
+                if now < paused_until:
+                    delay = paused_until - now
+                else:
+                    taken = tokens >= 1
+                    if taken:
+                        tokens -= 1
+                    conn.execute("UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?",
+                                 (tokens, now, self.name))
+                    if taken:
+                        return waited
+                    delay = (1 - tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _open_shared_state(path: str) -> sqlite3.Connection:
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Autocommit mode; SharedTokenBucket opens its own BEGIN IMMEDIATE transactions
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS token_buckets (
+            name TEXT PRIMARY KEY,
+            rate REAL NOT NULL,
+            tokens REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            paused_until REAL NOT NULL
+        )
+    """)
+    return conn
+
+
+class HostLimiter:
+    """
+    Adaptive request budget for one host: a calls-per-minute bucket plus a cap on in-flight requests.
+
+    The rate follows AIMD between min_calls_per_minute and
+    max_calls_per_minute: every healthy, not-slow response adds
+    INCREASE_PER_SUCCESS, while a 429, 5xx or connection failure halves it.
+    Retry-After and exhausted rate-limit headers pause the host outright,
+    and a RateLimit-Remaining/Reset quota caps the rate at what the quota
+    allows.
+
+    With shared_path the bucket is a SharedTokenBucket: the rate, tokens
+    and pauses are shared with other processes' limiters for the host, and
+    every process adapts the one shared rate. The in-flight cap stays per
+    process.
+    """
+
+    def __init__(self, host: str, calls_per_minute: float = DEFAULT_CALLS_PER_MINUTE,
+                 max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 min_calls_per_minute: Optional[float] = None,
+                 max_calls_per_minute: Optional[float] = None, shared_path: Optional[str] = None):
+        self.host = host
+        self.calls_per_minute = calls_per_minute
+        self.min_calls_per_minute = min_calls_per_minute or max(calls_per_minute / 10.0, 1.0)
+        self.max_calls_per_minute = max_calls_per_minute or calls_per_minute * 4
+        self.max_in_flight = max_in_flight
+        if shared_path:
+            self._bucket = SharedTokenBucket(shared_path, host, calls_per_minute / 60.0)
+            self.calls_per_minute = self._bucket.rate * 60.0
+        else:
+            self._bucket = TokenBucket(calls_per_minute / 60.0)
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._latency: Optional[float] = None
+        self._best_latency: Optional[float] = None
+        self._last_decrease = 0.0
+        self._counters = {"requests": 0, "wait_seconds": 0.0, "throttled": 0, "errors": 0,
+                          "increases": 0, "decreases": 0}
+
+    @contextmanager
+    def slot(self) -> Iterator[None]:
+        """Hold an in-flight slot and spend one token for the duration of a request."""
+        started = time.monotonic()
+        with self._in_flight:
+            self._bucket.acquire()
+            waited = time.monotonic() - started
+            with self._lock:
+                self._counters["requests"] += 1
+                self._counters["wait_seconds"] += waited
+            metrics.RATE_LIMIT_WAIT_SECONDS.inc(waited, host=self.host)
+            yield
+
+    def observe(self, status_code: Optional[int], headers: Optional[Mapping[str, Any]] = None,
+                latency: Optional[float] = None):
+        """
+        Adapt the rate to one response.
+
+        Args:
+            status_code (Optional[int]): HTTP status, or None for a connection failure or timeout.
+            headers (Optional[Mapping]): Response headers (Retry-After, RateLimit-*).
+            latency (Optional[float]): Seconds the request took.
+        """
+        retry_after = parse_retry_after(_header(headers, "Retry-After"))
+        pause = None
+        with self._lock:
+            # Adapt from the bucket's current rate (other processes may have changed a shared one)
+            self.calls_per_minute = self._bucket.rate * 60.0
+            slow = False
+            if latency is not None:
+                self._latency = latency if self._latency is None else (
+                    LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self._latency
+                )
+                self._best_latency = min(self._best_latency or self._latency, self._latency)
+                slow = latency > self._best_latency * SLOW_LATENCY_FACTOR
+
+            if status_code is None or status_code == 429 or status_code >= 500:
+                self._counters["throttled" if status_code == 429 else "errors"] += 1
+                self._decrease()
+            elif status_code < 400 and not slow:
+                self._set_rate(self.calls_per_minute + INCREASE_PER_SUCCESS)
+                self._counters["increases"] += 1
+
+            pause = self._apply_quota(headers)
+
+        if retry_after is not None and status_code is not None and (status_code == 429 or status_code >= 500):
+            pause = max(pause or 0.0, retry_after)
+        if pause:
+            pause = min(pause, MAX_PAUSE)
+            logger.warning(f"Pausing requests to {self.host} for {pause:.1f}s")
+            self._bucket.pause(pause)
+
+    def _decrease(self):
+        now = time.monotonic()
+        # Responses already in flight report the same overload; back off once for them
+        if now - self._last_decrease < max(DECREASE_COOLDOWN, self._latency or 0.0):
+            return
+        self._last_decrease = now
+        self._counters["decreases"] += 1
+        self._set_rate(self.calls_per_minute * DECREASE_FACTOR)
+        logger.info(f"Slowing {self.host} to {self.calls_per_minute:.1f} calls/minute")
+
+    def _apply_quota(self, headers: Optional[Mapping[str, Any]]) -> Optional[float]:
+        """Follow RateLimit-Remaining/Reset headers. Returns seconds to pause, if any."""
+        remaining = _header(headers, "RateLimit-Remaining", "X-RateLimit-Remaining")
+        reset = _header(headers, "RateLimit-Reset", "X-RateLimit-Reset")
+        try:
+            remaining_calls = float(remaining) if remaining is not None else None
+            reset_seconds = float(reset) if reset is not None else None
+        except ValueError:
+            return None
+        if reset_seconds is not None and reset_seconds > time.time() - 86400:
+            # An epoch timestamp rather than a number of seconds
+            reset_seconds = reset_seconds - time.time()
+        if remaining_calls is None or reset_seconds is None or reset_seconds <= 0:
+            return None
+        if remaining_calls < 1:
+            return reset_seconds
+        quota_rate = remaining_calls / reset_seconds * 60.0
+        if quota_rate < self.calls_per_minute:
+            self._set_rate(quota_rate, floor=False)
+        return None
+
+    def _set_rate(self, calls_per_minute: float, floor: bool = True):
+        lowest = self.min_calls_per_minute if floor else min(self.min_calls_per_minute, calls_per_minute)
+        self.calls_per_minute = min(max(calls_per_minute, lowest, 0.1), self.max_calls_per_minute)
+        self._bucket.set_rate(self.calls_per_minute / 60.0)
+        metrics.RATE_LIMIT_CALLS_PER_MINUTE.set(self.calls_per_minute, host=self.host)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "calls_per_minute": round(self.calls_per_minute, 2),
+                "min_calls_per_minute": self.min_calls_per_minute,
+                "max_calls_per_minute": self.max_calls_per_minute,
+                "max_in_flight": self.max_in_flight,
+                "latency_ms": round(self._latency * 1000, 1) if self._latency is not None else None,
+                "paused_for": round(self._bucket.paused_for(), 1),
+                **{name: value for name, value in self._counters.items() if name != "wait_seconds"},
+                "wait_seconds": round(self._counters["wait_seconds"], 3),
+            }
+
+
+_limits: Dict[str, Dict] = {}
+_limiters: Dict[str, HostLimiter] = {}
+_registry_lock = threading.Lock()
+_shared_path: Optional[str] = SHARED_STATE_PATH
+
+
+def use_shared_state(path: Optional[str], reset: bool = False):
+    """
+    Share host budgets with other processes through a SQLite file (None to stop sharing).
+
+    Applies to limiters created afterwards. Every process that should share
+    the budgets calls this with the same path, e.g. in a pool initializer.
+
+    Args:
+        path (Optional[str]): SQLite file for the shared buckets.
+        reset (bool): Forget rates and pauses left by earlier runs; call once, before the workers start.
+    """
+    global _shared_path
+    if path and reset:
+        conn = _open_shared_state(path)
+        conn.execute("DELETE FROM token_buckets")
+        conn.close()
+    with _registry_lock:
+        _shared_path = path
+        _limiters.clear()
+
+
+def configure_host(host: str, calls_per_minute: float, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                   min_calls_per_minute: Optional[float] = None,
+                   max_calls_per_minute: Optional[float] = None):
+    """Set the starting budget (and adaptive range) for a host; applies to limiters created afterwards."""
+    with _registry_lock:
+        _limits[host] = {"calls_per_minute": calls_per_minute, "max_in_flight": max_in_flight,
+                         "min_calls_per_minute": min_calls_per_minute,
+                         "max_calls_per_minute": max_calls_per_minute}
+        _limiters.pop(host, None)
+
+
+def get_host_limiter(url_or_host: str) -> HostLimiter:
+    """Return the process-wide limiter for the host of a URL (or a bare host name)."""
+    host = urlsplit(url_or_host).hostname if "://" in url_or_host else url_or_host
+    host = host or ""
+    with _registry_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = HostLimiter(host, **_limits.get(host, {}), shared_path=_shared_path)
+            _limiters[host] = limiter
+        return limiter
+
+
+def limiter_stats() -> Dict[str, Dict]:
+    with _registry_lock:
+        limiters = list(_limiters.values())
+    return {limiter.host: limiter.stats() for limiter in limiters}
+
+
+def limited_request(url: str, send: Callable[[], Any]) -> Any:
+    """
+    Run send() under the host's limiter and feed the outcome back into it.
+
+    send() returns a response with status_code and headers; exceptions count
+    as connection failures and are re-raised.
+    """
+    limiter = get_host_limiter(url)
+    with limiter.slot():
+        started = time.monotonic()
+        try:
+            response = send()
+        except Exception:
+            latency = time.monotonic() - started
+            limiter.observe(None, latency=latency)
+            metrics.observe_upstream(limiter.host, None, latency)
+            raise
+    latency = time.monotonic() - started
+    limiter.observe(response.status_code, response.headers, latency)
+    metrics.observe_upstream(limiter.host, response.status_code, latency)
+    return response
@@ -0,0 +1,211 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class BreakerConfig:
+    """Circuit breaker settings, overridable through environment variables."""
+    FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))  # consecutive failures
+    RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "30"))  # seconds open before a trial call
+    HALF_OPEN_MAX_CALLS = int(os.getenv("BREAKER_HALF_OPEN_MAX_CALLS", "1"))
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+    pass
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a request has used up its time budget"""
+    pass
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open circuit breaker for one upstream.
+
+    After failure_threshold consecutive failures the circuit opens and calls
+    fail fast. Once reset_timeout has passed, up to half_open_max_calls trial
+    calls are let through; a success closes the circuit, a failure re-opens it.
+    check() returns a trial token that callers pass to release() in a finally
+    block, so a trial call that ends without recording an outcome (a
+    deadline, an unexpected error) hands its slot back instead of leaving
+    the circuit half-open with no slots forever.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = BreakerConfig.FAILURE_THRESHOLD,
+                 reset_timeout: float = BreakerConfig.RESET_TIMEOUT,
+                 half_open_max_calls: int = BreakerConfig.HALF_OPEN_MAX_CALLS):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self._trial_round = 0  # bumped on every switch to half-open, so stale releases are ignored
+        self._counters = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = self.HALF_OPEN
+            self._half_open_calls = 0
+            self._trial_round += 1
+            logger.info(f"Circuit {self.name} half-open, allowing a trial call")
+        return self._state
+
+    def _acquire(self) -> Optional[int]:
+        """Take permission for a call; returns the trial round for a half-open slot, 0 when closed."""
+        with self._lock:
+            state = self._current_state()
+            if state == self.CLOSED:
+                return 0
+            if state == self.HALF_OPEN and self._half_open_calls < self.half_open_max_calls:
+                self._half_open_calls += 1
+                return self._trial_round
+            self._counters["rejected"] += 1
+            return None
+
+    def allow(self) -> bool:
+        """Return True if a call may go upstream now."""
+        return self._acquire() is not None
+
+    def check(self) -> int:
+        """
+        Raise CircuitOpenError if a call may not go upstream now.
+
+        Returns:
+            int: Token for release(); non-zero when the call holds a half-open trial slot.
+        """
+        trial = self._acquire()
+        if trial is None:
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        return trial
+
+    def record_success(self):
+        with self._lock:
+            self._counters["successes"] += 1
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_response(self, status_code: Optional[int]):
+        """Record a call by its HTTP status (None: no response); bad requests count as successes."""
+        if is_upstream_failure(status_code):
+            self.record_failure()
+        else:
+            self.record_success()
+
+    def release(self, trial: int):
+        """Hand back the trial slot taken by check() if its call recorded no outcome; a no-op otherwise."""
+        with self._lock:
+            if trial and self._state == self.HALF_OPEN and self._trial_round == trial \
+                    and self._half_open_calls > 0:
+                self._half_open_calls -= 1
+
+    def record_failure(self):
+        with self._lock:
+            self._counters["failures"] += 1
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._counters["opened"] += 1
+                    logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            state = self._current_state()
+            retry_in = None
+            if state == self.OPEN:
+                retry_in = round(max(self.reset_timeout - (time.monotonic() - self._opened_at), 0), 1)
+            return {
+                "state": state,
+                "consecutive_failures": self._failures,
+                "retry_in": retry_in,
+                **self._counters,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Return the process-wide breaker for an upstream, creating it on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_stats() -> Dict[str, Dict]:
+    """Return the state of every breaker created so far."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {breaker.name: breaker.stats() for breaker in breakers}
+
+
+def is_upstream_failure(status_code: Optional[int]) -> bool:
+    """Errors that say the upstream is unhealthy, as opposed to a bad request."""
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+class Deadline:
+    """End-to-end time budget shared by every retry and timeout of one request."""
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def cap(self, seconds: float) -> float:
+        """Return seconds limited to the remaining budget, or raise if none is left."""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Request deadline of {self.seconds}s exceeded")
+        return min(seconds, remaining)
+
+
+def stop_at_deadline(retry_state) -> bool:
+    """tenacity stop condition: give up once the call's deadline= budget is spent."""
+    deadline = retry_state.kwargs.get("deadline")
+    return deadline is not None and deadline.expired()
+
+
+class wait_within_deadline:
+    """tenacity wait wrapper that never sleeps past the call's deadline= budget."""
+
+    def __init__(self, wait):
+        self.wait = wait
+
+    def __call__(self, retry_state) -> float:
+        delay = self.wait(retry_state)
+        deadline = retry_state.kwargs.get("deadline")
+        if deadline is not None:
+            delay = min(delay, deadline.remaining())
+        return delay
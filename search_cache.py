@@ -0,0 +1,210 @@
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Lower-case a query and collapse runs of whitespace."""
+    return " ".join(str(query).lower().split())
+
+
+class SearchCache:
+    """
+    Bounded TTL + LRU cache for search results with an optional SQLite tier.
+
+    Entries are stored as serialized JSON so their byte size can be tracked
+    and callers never share (and mutate) the cached objects.
+
+    Args:
+        ttl (int): Seconds an entry stays fresh.
+        max_entries (int): Maximum number of entries held in memory.
+        max_bytes (int): Maximum total payload size held in memory.
+        db_path (Optional[str]): SQLite file for the on-disk tier, or None.
+    """
+
+    def __init__(self, ttl: int = 3600, max_entries: int = 512,
+                 max_bytes: int = 16 * 1024 * 1024, db_path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.db_path = db_path
+
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "disk_hits": 0, "evictions": 0, "expired": 0,
+                          "stale_hits": 0}
+
+        self._db = None
+        if db_path:
+            self._init_disk_tier()
+
+    @staticmethod
+    def make_key(source: str, query: str, page: Optional[str] = None) -> str:
+        """Build the cache key for a (source, query, page) triple."""
+        if page:
+            return f"{source}:{page}:{normalize_query(query)}"
+        return f"{source}:{normalize_query(query)}"
+
+    def _init_disk_tier(self):
+        """Open the SQLite tier and drop entries too old to serve even as stale."""
+        try:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS search_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+            self._db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time() - self.ttl,))
+            self._db.commit()
+            logger.info(f"Search cache disk tier enabled at {self.db_path}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not open search cache database {self.db_path}: {e}")
+            self._db = None
+
+    def contains(self, source: str, query: str, page: Optional[str] = None) -> bool:
+        """Return True if a fresh entry exists, without touching LRU order or counters."""
+        key = self.make_key(source, query, page)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return True
+            return self._disk_get(key, now) is not None
+
+    def get(self, source: str, query: str, page: Optional[str] = None,
+            allow_stale: bool = False) -> Optional[List[Dict]]:
+        """Return cached books for a query, or None on a miss.
+
+        Expired entries are kept until evicted so that, with allow_stale=True,
+        they can still be served while the upstream is failing.
+        """
+        key = self.make_key(source, query, page)
+        now = time.time()
+
+        with self._lock:
+            if allow_stale:
+                entry = self._entries.get(key)
+                row = (entry[0], entry[1]) if entry is not None else self._disk_get(key, None)
+                if row is None:
+                    return None
+                self._counters["stale_hits"] += 1
+                metrics.CACHE_LOOKUPS.inc(cache="search", result="stale_hit")
+                return json.loads(row[1])
+
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, payload, _ = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    metrics.CACHE_LOOKUPS.inc(cache="search", result="hit")
+                    return json.loads(payload)
+                self._counters["expired"] += 1
+
+            row = self._disk_get(key, now)
+            if row is not None:
+                expires_at, payload = row
+                self._counters["hits"] += 1
+                self._counters["disk_hits"] += 1
+                metrics.CACHE_LOOKUPS.inc(cache="search", result="hit")
+                self._store(key, payload, expires_at)
+                return json.loads(payload)
+
+            self._counters["misses"] += 1
+            metrics.CACHE_LOOKUPS.inc(cache="search", result="miss")
+            return None
+
+    def set(self, source: str, query: str, books: List[Dict], page: Optional[str] = None):
+        """Cache books for a query."""
+        key = self.make_key(source, query, page)
+        payload = json.dumps(books)
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            self._store(key, payload, expires_at)
+            self._disk_set(key, payload, expires_at)
+
+    def clear(self):
+        """Drop every cached entry from both tiers."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            if self._db is not None:
+                try:
+                    self._db.execute("DELETE FROM search_cache")
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Failed to clear search cache database: {e}")
+
+    def stats(self) -> Dict:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                **self._counters,
+                "hit_ratio": round(self._counters["hits"] / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "disk_tier": self._db is not None,
+            }
+
+    def _store(self, key: str, payload: str, expires_at: float):
+        """Insert into the memory tier and evict least recently used entries."""
+        size = len(payload.encode("utf-8"))
+        if size > self.max_bytes:
+            logger.debug(f"Not caching {key} in memory: {size} bytes exceeds limit")
+            return
+
+        self._remove(key)
+        self._entries[key] = (expires_at, payload, size)
+        self._bytes += size
+
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._counters["evictions"] += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[2]
+
+    def _disk_get(self, key: str, now: Optional[float]) -> Optional[Tuple[float, str]]:
+        """Read a fresh entry from disk, or any entry at all when now is None."""
+        if self._db is None:
+            return None
+        try:
+            return self._db.execute(
+                "SELECT expires_at, payload FROM search_cache WHERE cache_key = ? AND expires_at > ?",
+                (key, now if now is not None else float("-inf"))
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Search cache disk read failed: {e}")
+            return None
+
+    def _disk_set(self, key: str, payload: str, expires_at: float):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (cache_key, payload, expires_at) VALUES (?, ?, ?)",
+                (key, payload, expires_at)
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Search cache disk write failed: {e}")
@@ -1,3 +1,4 @@
+import importlib
 import pytest
 import os
 
@@ -9,4 +10,11 @@ def env_setup():
     yield
     # Clean up
     os.environ.pop("GOOGLE_BOOKS_API_KEY", None)
-    os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
\ No newline at end of file
+    os.environ.pop("GOOGLE_APPLICATION_CREDENTIALS", None)
+
+@pytest.fixture
+def app_module(monkeypatch):
+    """The app module, imported with the settings it requires"""
+    for name in ("SECRET_KEY", "GOOGLE_DRIVE_FOLDER_ID", "API_KEY"):
+        monkeypatch.setenv(name, "test")
+    return importlib.import_module("app")
@@ -0,0 +1,99 @@
+import sqlite3
+
+import httpx
+import pytest
+from tenacity import wait_none
+
+import http_client
+import openlibrary_search
+import resilience
+import search_cache
+import text_store
+from search_cache import SearchCache
+
+
+@pytest.fixture
+def client(app_module):
+    app_module.app.config["TESTING"] = True
+    return app_module.app.test_client()
+
+
+@pytest.mark.parametrize("deadline", ["nan", "inf", "-inf", "0", "-1", "soon"])
+def test_search_rejects_invalid_deadline(client, deadline):
+    response = client.get(f"/api/v1/search?query=dune&deadline={deadline}")
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "deadline must be a positive number of seconds"}
+
+
+@pytest.mark.parametrize("payload", [
+    "dune",
+    {"query": None},
+    {"query": ["dune"]},
+    {"query": "dune", "page": None},
+    {"query": "dune", "page_size": "ten"},
+    {"query": "dune", "page_size": [10]},
+    {"query": "dune", "page": 0},
+    {"query": "dune", "cursor": 12},
+])
+def test_socketio_search_rejects_bad_payload(app_module, monkeypatch, payload):
+    events = []
+    monkeypatch.setattr(app_module, "emit", lambda name, data: events.append((name, data)))
+    monkeypatch.setattr(app_module, "search_events", lambda *args: pytest.fail("search started"))
+    app_module.handle_search(payload)
+    assert [name for name, _ in events] == ["error"]
+    assert events[0][1]["error"]
+
+
+def test_openlibrary_outage_serves_stale_results(app_module, monkeypatch):
+    monkeypatch.setattr(openlibrary_search, "USE_MOCK_DATA", False)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(app_module.fetch_books_from_openlibrary.retry, "wait", wait_none())
+    cache = SearchCache(ttl=60)
+    monkeypatch.setitem(app_module.app.extensions, "search_cache", cache)
+    stale = [{"title": "Dune", "authors": ["Frank Herbert"]}]
+    cache.set("openlibrary", "dune", stale, "0:10")
+    now = search_cache.time.time() + 120
+    monkeypatch.setattr(search_cache.time, "time", lambda: now)
+
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if len(requests) == 2:
+            raise httpx.ConnectError("connection refused")
+        return httpx.Response(503)
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_client, "get_httpx_client", lambda: client)
+    assert app_module.cached_search("openlibrary", "dune", 0, 10) == stale
+    assert len(requests) == 3
+    assert cache.stats()["stale_hits"] == 1
+    client.close()
+
+
+@pytest.mark.parametrize("error, status", [(sqlite3.OperationalError("disk I/O error"), 503),
+                                           (text_store.TextNotFound(1), 404)])
+def test_book_text_closes_connection_on_error(client, app_module, monkeypatch, error, status):
+    conn = sqlite3.connect(":memory:")
+    closed = []
+    monkeypatch.setattr(app_module.local_search, "connect", lambda path: ClosingConnection(conn, closed))
+
+    def iter_text(conn, book_id):
+        raise error
+        yield
+
+    monkeypatch.setattr(app_module.text_store, "iter_text", iter_text)
+    assert client.get("/api/v1/books/1/text").status_code == status
+    assert closed == [True]
+
+
+class ClosingConnection:
+    """Stands in for a books.db connection and records close()."""
+
+    def __init__(self, conn, closed):
+        self.conn = conn
+        self.closed = closed
+
+    def close(self):
+        self.closed.append(True)
+        self.conn.close()
@@ -0,0 +1,125 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pytest
+
+import chunk_writer
+from chunk_writer import CsvChunkWriter, ParquetChunkWriter, read_processed
+
+
+@pytest.fixture
+def input_csv(tmp_path):
+    path = tmp_path / "books.csv"
+    pd.DataFrame({"title": [f"Book {i}" for i in range(6)],
+                  "authors": [f"Author {i}" for i in range(6)]}).to_csv(path, index=False)
+    return str(path)
+
+
+def frame(start, stop):
+    return pd.DataFrame({"title": [f"Book {i}" for i in range(start, stop)],
+                         "authors": [f"Author {i}" for i in range(start, stop)]})
+
+
+def test_csv_writer_commits_each_chunk(input_csv, tmp_path):
+    output = str(tmp_path / "out.csv")
+    writer = CsvChunkWriter(input_csv, output)
+    writer.write(frame(0, 2))
+    writer.write(frame(2, 4))
+    with open(f"{output}.checkpoint.json") as f:
+        checkpoint = json.load(f)
+    assert checkpoint["rows_done"] == 4
+    assert checkpoint["output_bytes"] == os.path.getsize(output)
+    assert not checkpoint["complete"]
+
+
+def test_csv_writer_truncates_uncommitted_bytes(input_csv, tmp_path):
+    output = str(tmp_path / "out.csv")
+    writer = CsvChunkWriter(input_csv, output)
+    writer.write(frame(0, 2))
+    # A crash while appending the next chunk leaves a partial row behind
+    with open(output, "a") as f:
+        f.write("Book 2,Auth")
+
+    resumed = CsvChunkWriter(input_csv, output)
+    assert resumed.rows_done == 2
+    resumed.write(frame(2, 6))
+    resumed.close()
+    assert read_processed(output)["title"].tolist() == [f"Book {i}" for i in range(6)]
+    assert CsvChunkWriter(input_csv, output).complete
+
+
+def test_csv_writer_starts_over_when_output_is_short(input_csv, tmp_path):
+    output = str(tmp_path / "out.csv")
+    CsvChunkWriter(input_csv, output).write(frame(0, 4))
+    os.truncate(output, 10)
+    resumed = CsvChunkWriter(input_csv, output)
+    assert resumed.rows_done == 0
+    assert not os.path.exists(output)
+
+
+def test_checkpoint_for_changed_input_is_ignored(input_csv, tmp_path):
+    output = str(tmp_path / "out.csv")
+    CsvChunkWriter(input_csv, output).write(frame(0, 2))
+    with open(input_csv, "a") as f:
+        f.write("Book 6,Author 6\n")
+    assert CsvChunkWriter(input_csv, output).rows_done == 0
+
+
+def test_parquet_parts_are_renamed_into_place(input_csv, tmp_path, monkeypatch):
+    pytest.importorskip("pyarrow")
+    output = str(tmp_path / "out.parquet")
+    writer = ParquetChunkWriter(input_csv, output, part_rows=2)
+    writer.write(frame(0, 2))
+    assert [os.path.basename(p) for p in glob.glob(os.path.join(output, "*"))] == ["part-00000.parquet"]
+
+    def crash(table, path, **kwargs):
+        with open(path, "wb") as f:
+            f.write(b"PAR1 partial")
+        raise OSError("disk full")
+
+    monkeypatch.setattr(writer.pq, "write_table", crash)
+    with pytest.raises(OSError):
+        writer.write(frame(2, 4))
+    # Neither the temporary file nor a part for the failed write is left behind
+    assert os.listdir(output) == ["part-00000.parquet"]
+    assert writer.rows_done == 2
+
+
+def test_parquet_resume_discards_uncommitted_parts(input_csv, tmp_path):
+    pytest.importorskip("pyarrow")
+    output = str(tmp_path / "out.parquet")
+    writer = ParquetChunkWriter(input_csv, output, part_rows=2)
+    writer.write(frame(0, 2))
+    # A part renamed into place by a run that crashed before checkpointing it
+    with open(os.path.join(output, "part-00001.parquet"), "wb") as f:
+        f.write(b"stale")
+
+    resumed = ParquetChunkWriter(input_csv, output, part_rows=2)
+    assert resumed.rows_done == 2
+    assert os.listdir(output) == ["part-00000.parquet"]
+    resumed.write(frame(2, 5))
+    resumed.write(frame(5, 6))
+    resumed.close()
+    result = read_processed(output)
+    assert result["title"].tolist() == [f"Book {i}" for i in range(6)]
+    assert str(result["title"].dtype) in ("string", "str")
+
+
+def test_open_writer_rejects_unknown_format(input_csv, tmp_path):
+    with pytest.raises(ValueError):
+        chunk_writer.open_writer(input_csv, str(tmp_path / "out.json"), "json")
+
+
+def test_incomplete_writer_cannot_be_constructed(input_csv, tmp_path):
+    class NoRollback(chunk_writer.ChunkWriter):
+        def _reset(self):
+            pass
+
+        def write(self, chunk):
+            pass
+
+    with pytest.raises(TypeError):
+        NoRollback(input_csv, str(tmp_path / "out.csv"))
+    assert not os.path.exists(tmp_path / "out.csv.checkpoint.json")
@@ -0,0 +1,123 @@
+import io
+import logging
+import os
+import sqlite3
+
+import pytest
+import requests
+
+import cover_store
+import extract_content
+from cover_store import CoverStore, is_placeholder, migrate_image_blobs, save_cover
+
+
+def jpeg(width=400, height=600, color=(200, 30, 30)):
+    Image = pytest.importorskip("PIL.Image")
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def fake_jpeg(size=4096, fill=b"\x00"):
+    """Bytes that sniff as a JPEG and are large enough not to be a placeholder."""
+    return b"\xff\xd8\xff\xe0" + fill * (size - 4)
+
+
+def gif(width, height, size=2048):
+    header = b"GIF89a" + width.to_bytes(2, "little") + height.to_bytes(2, "little")
+    return header + b"\x00" * (size - len(header))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return CoverStore(str(tmp_path / "covers"))
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("""
+        CREATE TABLE images (id INTEGER PRIMARY KEY AUTOINCREMENT, book_id INTEGER,
+                             image_type TEXT, image_data BLOB)
+    """)
+    cover_store.init_cover_columns(conn)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize("data", [b"", b"\xff\xd8\xff" + b"\x00" * 100, b"<html>" + b" " * 4096, gif(1, 1)])
+def test_is_placeholder(data):
+    assert is_placeholder(data)
+
+
+@pytest.mark.parametrize("data", [fake_jpeg(), gif(120, 180)])
+def test_real_covers_are_not_placeholders(data):
+    assert not is_placeholder(data)
+
+
+def test_put_deduplicates_identical_images(store):
+    first = store.put(fake_jpeg())
+    assert store.put(fake_jpeg()) == first
+    other = store.put(fake_jpeg(fill=b"\x01"))
+    assert other != first
+    assert os.path.exists(store.path(first)) and os.path.exists(store.path(other))
+    assert store.stats()["stored"] == 2
+    assert store.stats()["deduplicated"] == 1
+
+
+def test_save_cover_skips_placeholders(store, conn):
+    assert save_cover(conn, store, 1, gif(1, 1)) is None
+    sha256 = save_cover(conn, store, 1, fake_jpeg())
+    assert conn.execute("SELECT sha256, content_type, image_data FROM images").fetchall() == [
+        (sha256, "image/jpeg", None)
+    ]
+
+
+def test_thumbnail_is_generated_once_and_cached(store):
+    Image = pytest.importorskip("PIL.Image")
+    sha256 = store.put(jpeg())
+    path = store.thumbnail(sha256, "small")
+    with Image.open(path) as image:
+        assert image.width == cover_store.THUMBNAIL_SIZES["small"]
+    assert store.thumbnail(sha256, "small") == path
+    assert store.stats()["thumbnails_generated"] == 1
+
+
+def test_thumbnails_are_evicted_past_budget(tmp_path):
+    pytest.importorskip("PIL.Image")
+    store = CoverStore(str(tmp_path / "covers"), thumbnail_max_bytes=1)
+    first = store.put(jpeg(color=(1, 2, 3)))
+    second = store.put(jpeg(color=(250, 250, 250)))
+    first_thumb = store.thumbnail(first, "small")
+    store.thumbnail(second, "small")
+    assert not os.path.exists(first_thumb)
+    assert store.stats()["thumbnails_evicted"] == 1
+
+
+def test_thumbnail_without_pillow_serves_original(store, monkeypatch):
+    monkeypatch.setattr(cover_store, "Image", None)
+    assert store.thumbnail(store.put(fake_jpeg()), "small") is None
+
+
+def test_migrate_image_blobs(store, conn):
+    conn.executemany("INSERT INTO images (book_id, image_type, image_data) VALUES (?, 'cover', ?)",
+                     [(1, fake_jpeg()), (2, fake_jpeg()), (3, gif(1, 1))])
+    assert migrate_image_blobs(conn, store) == 2
+    rows = conn.execute("SELECT book_id, sha256, image_data FROM images ORDER BY book_id").fetchall()
+    assert [(book_id, data) for book_id, _, data in rows] == [(1, None), (2, None)]
+    assert rows[0][1] == rows[1][1]
+    assert os.path.exists(store.path(rows[0][1]))
+    assert migrate_image_blobs(conn, store) == 0
+
+
+def test_cover_404_is_no_cover_without_error(monkeypatch, caplog):
+    response = requests.Response()
+    response.status_code = 404
+
+    def not_found(url, params=None, stream=False):
+        raise requests.HTTPError("404 Client Error", response=response)
+
+    monkeypatch.setattr(extract_content, "_api_get", not_found)
+    with caplog.at_level(logging.INFO):
+        assert extract_content.download_openlibrary_cover(None, "OL1M") is False
+    assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
@@ -0,0 +1,66 @@
+import pytest
+
+import enrichment_store
+from enrichment_store import GOOGLE_BOOKS, OPEN_LIBRARY, EnrichmentStore, enrichment_key
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(enrichment_store.time, "time", fake)
+    return fake
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EnrichmentStore(str(tmp_path / "enrichment.db"), ttl=100, negative_ttl=10)
+
+
+DUNE = enrichment_key("Dune", "Frank Herbert")
+EMMA = enrichment_key("Emma", "Jane Austen")
+
+
+def test_key_normalizes_and_ignores_missing_values():
+    assert enrichment_key("  DUNE ", "Frank  Herbert") == DUNE
+    assert enrichment_key(float("nan"), None) == "|"
+
+
+def test_found_result_is_reused_for_ttl(clock, store):
+    store.put_many(GOOGLE_BOOKS, [(DUNE, "Dune", "Frank Herbert", ("A desert planet",))])
+    clock.now += 100
+    assert store.get_many(GOOGLE_BOOKS, [DUNE, DUNE]) == {DUNE: ("A desert planet",)}
+    clock.now += 1
+    assert store.get_many(GOOGLE_BOOKS, [DUNE]) == {}
+
+
+def test_miss_is_reused_for_negative_ttl(clock, store):
+    store.put_many(GOOGLE_BOOKS, [(EMMA, "Emma", "Jane Austen", (None,))])
+    clock.now += 10
+    assert store.get_many(GOOGLE_BOOKS, [EMMA]) == {EMMA: (None,)}
+    clock.now += 1
+    assert store.get_many(GOOGLE_BOOKS, [EMMA]) == {}
+
+
+def test_sources_are_checked_separately(clock, store):
+    store.put_many(OPEN_LIBRARY, [(DUNE, "Dune", "Frank Herbert", ("In the week before", "https://ol/dune"))])
+    assert store.get_many(GOOGLE_BOOKS, [DUNE]) == {}
+    store.put_many(GOOGLE_BOOKS, [(DUNE, "Dune", "Frank Herbert", ("A desert planet",))])
+    assert store.get_many(OPEN_LIBRARY, [DUNE]) == {DUNE: ("In the week before", "https://ol/dune")}
+    assert store.stats() == {"entries": 1, GOOGLE_BOOKS: {"checked": 1, "found": 1},
+                             OPEN_LIBRARY: {"checked": 1, "found": 1}}
+
+
+def test_recheck_refreshes_entry(clock, store):
+    store.put_many(GOOGLE_BOOKS, [(DUNE, "Dune", "Frank Herbert", (None,))])
+    clock.now += 50
+    store.put_many(GOOGLE_BOOKS, [(DUNE, "Dune", "Frank Herbert", ("A desert planet",))])
+    clock.now += 60
+    assert store.get_many(GOOGLE_BOOKS, [DUNE]) == {DUNE: ("A desert planet",)}
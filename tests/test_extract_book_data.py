@@ -0,0 +1,86 @@
+import importlib
+
+import pandas as pd
+import pytest
+import requests
+from tenacity import wait_none
+
+from chunk_writer import read_processed
+from enrichment_store import EnrichmentStore
+
+
+@pytest.fixture
+def extract_book_data(env_setup, monkeypatch):
+    module = importlib.import_module("extract_book_data")
+    monkeypatch.setattr(module, "wait_exponential", lambda **kwargs: wait_none())
+    return module
+
+
+@pytest.fixture
+def input_csv(tmp_path):
+    path = tmp_path / "books.csv"
+    pd.DataFrame({"title": [f"Book {i}" for i in range(6)],
+                  "authors": [f"Author {i}" for i in range(6)]}).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return EnrichmentStore(str(tmp_path / "enrichment.db"))
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def fake_apis(monkeypatch, module, google_errors=None):
+    """Answer every lookup; google_errors maps titles to errors raised (once each, in order)."""
+    google_errors = {title: list(errors) for title, errors in (google_errors or {}).items()}
+    calls = []
+
+    def google(title, author):
+        calls.append(title)
+        if google_errors.get(title):
+            raise google_errors[title].pop(0)
+        return f"Summary of {title}"
+
+    monkeypatch.setattr(module, "_google_books_summary", google)
+    monkeypatch.setattr(module, "_open_library_details",
+                        lambda title: (f"First line of {title}", f"https://openlibrary.org/{title}"))
+    return calls
+
+
+def test_transient_failures_are_retried(extract_book_data, monkeypatch, input_csv, tmp_path, store):
+    calls = fake_apis(monkeypatch, extract_book_data,
+                      {"Book 3": [requests.ConnectionError("reset"), http_error(503)]})
+    output = str(tmp_path / "out.csv")
+    extract_book_data.process_books(input_csv, output, batch_size=2, store=store)
+    assert read_processed(output)["Summary"].tolist() == [f"Summary of Book {i}" for i in range(6)]
+    assert calls.count("Book 3") == 3
+
+
+def test_persistent_failure_is_not_committed(extract_book_data, monkeypatch, input_csv, tmp_path, store):
+    failures = [http_error(503)] * extract_book_data.LOOKUP_ATTEMPTS
+    fake_apis(monkeypatch, extract_book_data, {"Book 3": failures})
+    output = str(tmp_path / "out.csv")
+    with pytest.raises(extract_book_data.LookupFailed):
+        extract_book_data.process_books(input_csv, output, batch_size=2, store=store)
+    assert read_processed(output)["title"].tolist() == ["Book 0", "Book 1"]
+
+    # The rerun resumes at the failed chunk and fills it in
+    fake_apis(monkeypatch, extract_book_data)
+    extract_book_data.process_books(input_csv, output, batch_size=2, store=store)
+    assert read_processed(output)["Summary"].tolist() == [f"Summary of Book {i}" for i in range(6)]
+
+
+def test_rejected_lookup_is_left_empty_and_not_stored(extract_book_data, monkeypatch, input_csv, tmp_path,
+                                                      store):
+    calls = fake_apis(monkeypatch, extract_book_data, {"Book 3": [http_error(400)]})
+    output = str(tmp_path / "out.csv")
+    extract_book_data.process_books(input_csv, output, batch_size=2, store=store)
+    summaries = read_processed(output)["Summary"]
+    assert pd.isna(summaries[3])
+    assert calls.count("Book 3") == 1
+    assert store.stats()["google_books"]["checked"] == 5
@@ -0,0 +1,48 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+from tenacity import wait_none
+
+import http_client
+import openlibrary_search
+import resilience
+from federated_search import federated_search, stream_search
+
+GOOGLE_BOOKS = [{"title": "Dune", "authors": ["Frank Herbert"], "isbn_13": "9780441172719"}]
+
+
+@pytest.fixture
+def fetchers(monkeypatch):
+    """Google answers; Open Library is down (every request gets a 503)."""
+    monkeypatch.setattr(openlibrary_search, "USE_MOCK_DATA", False)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    monkeypatch.setattr(openlibrary_search.fetch_books_from_openlibrary.retry, "wait", wait_none())
+    client = httpx.Client(transport=httpx.MockTransport(lambda request: httpx.Response(503)))
+    monkeypatch.setattr(http_client, "get_httpx_client", lambda: client)
+    yield {"google": lambda query: GOOGLE_BOOKS,
+           "openlibrary": lambda query: openlibrary_search.fetch_books_from_openlibrary(query)}
+    client.close()
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        yield pool
+
+
+def test_failed_source_is_reported_as_error(fetchers, executor):
+    result = federated_search("dune", fetchers, executor, deadline=5)
+    assert result["sources"]["openlibrary"]["status"] == "error"
+    assert result["sources"]["google"]["status"] == "ok"
+    assert [book["title"] for book in result["books"]] == ["Dune"]
+    assert result["books"][0]["sources"] == ["google"]
+
+
+def test_stream_reports_failed_source_as_error(fetchers, executor):
+    events = list(stream_search("dune", fetchers, executor, deadline=5))
+    assert [event["book"]["title"] for event in events if event["event"] == "book"] == ["Dune"]
+    summary = events[-1]
+    assert summary["event"] == "summary" and summary["count"] == 1
+    assert summary["sources"]["openlibrary"]["status"] == "error"
+    assert summary["sources"]["google"]["status"] == "ok"
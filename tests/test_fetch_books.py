@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+
+import fetch_books
+from extract_content import init_database
+
+TOPIC = "Color theory"
+RELEVANT = {"text": "Color theory for designers"}
+UNRELATED = {"text": "A cookbook"}
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    init_database(conn)
+    yield conn
+    conn.close()
+
+
+def book(topic, page, i):
+    return {"olid": None, "title": f"{topic} {page}.{i}", "authors": "Author", "description": None,
+            "source": fetch_books.GOOGLE_BOOKS}
+
+
+def fake_pages(monkeypatch, pages, page_size=2, total=None):
+    """Answer fetch_page from pages[topic]: a list per page of results, or None for a failed request."""
+    requested = []
+
+    def fetch_page(source, topic, page):
+        requested.append((topic, page))
+        answers = pages[topic]
+        if page >= len(answers):
+            results = []
+        elif answers[page] is None:
+            return None
+        else:
+            results = answers[page]
+        return {"books": [book(topic, page, i) for i in range(len(results))], "results": results,
+                "total": total, "page_size": page_size}
+
+    monkeypatch.setattr(fetch_books, "fetch_page", fetch_page)
+    return requested
+
+
+def harvest(conn, topic, **kwargs):
+    result = fetch_books.harvest(conn, [topic], sources=(fetch_books.GOOGLE_BOOKS,), **kwargs)
+    return result[f"{fetch_books.GOOGLE_BOOKS}: {topic}"]
+
+
+def test_stops_at_empty_page(monkeypatch, conn):
+    fake_pages(monkeypatch, {TOPIC: [[RELEVANT] * 2]})
+    assert harvest(conn, TOPIC, max_pages=5, pages_ahead=1) == {"pages": 2, "stored": 2,
+                                                                "stopped": "no more results"}
+
+
+def test_stops_at_short_page(monkeypatch, conn):
+    fake_pages(monkeypatch, {TOPIC: [[RELEVANT] * 2, [RELEVANT]]})
+    assert harvest(conn, TOPIC, max_pages=5, pages_ahead=1) == {"pages": 2, "stored": 3, "stopped": "last page"}
+
+
+def test_stops_at_reported_total(monkeypatch, conn):
+    requested = fake_pages(monkeypatch, {TOPIC: [[RELEVANT] * 2] * 5}, total=4)
+    assert harvest(conn, TOPIC, max_pages=5, pages_ahead=1) == {"pages": 2, "stored": 4,
+                                                                "stopped": "all results read"}
+    assert requested == [(TOPIC, 0), (TOPIC, 1)]
+
+
+def test_stops_below_relevance(monkeypatch, conn):
+    fake_pages(monkeypatch, {TOPIC: [[RELEVANT] * 2, [UNRELATED] * 2, [RELEVANT] * 2]})
+    result = harvest(conn, TOPIC, max_pages=5, min_relevance=0.5, pages_ahead=1)
+    assert result == {"pages": 2, "stored": 2, "stopped": "relevance 0.00 below 0.5"}
+    (stored,) = conn.execute("SELECT COUNT(*) FROM books").fetchone()
+    assert stored == 2
+
+
+def test_stops_on_failed_request(monkeypatch, conn):
+    fake_pages(monkeypatch, {TOPIC: [[RELEVANT] * 2, None, [RELEVANT] * 2]})
+    assert harvest(conn, TOPIC, max_pages=5, pages_ahead=1) == {"pages": 1, "stored": 2,
+                                                                "stopped": "request failed"}
+
+
+def test_stops_at_max_pages(monkeypatch, conn):
+    requested = fake_pages(monkeypatch, {TOPIC: [[RELEVANT] * 2] * 5})
+    assert harvest(conn, TOPIC, max_pages=3, pages_ahead=2) == {"pages": 3, "stored": 6,
+                                                                "stopped": "max pages (3)"}
+    assert sorted(page for _, page in requested) == [0, 1, 2]
+
+
+def test_known_books_are_not_stored_again(monkeypatch, conn):
+    fake_pages(monkeypatch, {TOPIC: [[RELEVANT]]})
+    assert harvest(conn, TOPIC, max_pages=5)["stored"] == 1
+    assert harvest(conn, TOPIC, max_pages=5)["stored"] == 0
@@ -0,0 +1,128 @@
+import io
+import os
+
+import pytest
+import requests
+
+import text_store
+from http_cache import HttpCache, OfflineCacheMiss
+
+URL = "https://archive.org/stream/dune/text.txt"
+
+
+def make_response(status=200, body=b"", headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.url = URL
+    response.raw = io.BytesIO(body)
+    response.headers.update(headers or {})
+    return response
+
+
+class Upstream:
+    """send() for HttpCache.fetch that answers from a list and records request headers."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def __call__(self, headers):
+        self.requests.append(headers)
+        return self.responses.pop(0)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return HttpCache(str(tmp_path / "http_cache.db"), ttl=60)
+
+
+def expire(cache):
+    with cache._lock:
+        conn = cache._connection()
+        conn.execute("UPDATE http_cache SET fetched_at = 0")
+        conn.commit()
+
+
+def test_fresh_entry_is_served_without_request(cache):
+    upstream = Upstream(make_response(body=b"hello", headers={"ETag": '"v1"'}))
+    assert cache.fetch(URL, None, upstream).content == b"hello"
+    response = cache.fetch(URL, None, upstream)
+    assert response.content == b"hello" and response.from_cache
+    assert len(upstream.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_304(cache):
+    upstream = Upstream(
+        make_response(body=b"hello", headers={"ETag": '"v1"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}),
+        make_response(status=304),
+    )
+    cache.fetch(URL, None, upstream)
+    expire(cache)
+    response = cache.fetch(URL, None, upstream)
+    assert response.content == b"hello"
+    assert upstream.requests[1] == {"If-None-Match": '"v1"', "If-Modified-Since": "Mon, 01 Jan 2024 00:00:00 GMT"}
+    assert cache.stats()["revalidated"] == 1
+    # The 304 made the entry fresh again
+    assert cache.fetch(URL, None, upstream).content == b"hello"
+    assert len(upstream.requests) == 2
+
+
+def test_changed_resource_replaces_entry(cache):
+    upstream = Upstream(make_response(body=b"old", headers={"ETag": '"v1"'}),
+                        make_response(body=b"new", headers={"ETag": '"v2"'}))
+    cache.fetch(URL, None, upstream)
+    expire(cache)
+    assert cache.fetch(URL, None, upstream).content == b"new"
+    assert cache.cached(URL).content == b"new"
+
+
+def test_errors_are_not_cached(cache):
+    upstream = Upstream(make_response(status=503), make_response(body=b"hello"))
+    assert cache.fetch(URL, None, upstream).status_code == 503
+    assert cache.fetch(URL, None, upstream).content == b"hello"
+
+
+def test_offline_miss_raises(cache):
+    cache.offline = True
+    with pytest.raises(OfflineCacheMiss):
+        cache.fetch(URL, None, Upstream())
+
+
+def test_streamed_body_is_cached_in_a_file(cache):
+    body = b"It was a dark and stormy night. " * 10000
+    upstream = Upstream(make_response(body=body, headers={"ETag": '"v1"'}))
+    path = text_store.download_to_file(cache.fetch(URL, None, upstream, stream=True))
+    with open(path, "rb") as f:
+        assert f.read() == body
+    os.remove(path)
+    with cache._lock:
+        (stored,) = cache._connection().execute("SELECT length(body) FROM http_cache").fetchone()
+    assert stored == 0
+    assert len(os.listdir(cache.bodies_dir)) == 1
+
+    # Served again, offline, as a stream over the file
+    cache.offline = True
+    response = cache.fetch(URL, None, upstream, stream=True)
+    assert response.from_cache
+    assert b"".join(response.iter_content(chunk_size=4096)) == body
+    response.close()
+    assert len(upstream.requests) == 1
+
+
+def test_streamed_entry_is_revalidated(cache):
+    upstream = Upstream(make_response(body=b"chapter one", headers={"ETag": '"v1"'}), make_response(status=304))
+    cache.fetch(URL, None, upstream, stream=True).close()
+    expire(cache)
+    response = cache.fetch(URL, None, upstream, stream=True)
+    assert response.content == b"chapter one"
+    assert upstream.requests[1] == {"If-None-Match": '"v1"'}
+
+
+def test_evicting_streamed_entry_removes_its_file(tmp_path):
+    cache = HttpCache(str(tmp_path / "http_cache.db"), max_bytes=1, ttl=60)
+    upstream = Upstream(make_response(body=b"a" * 5000), make_response(body=b"b" * 5000))
+    cache.fetch(URL, None, upstream, stream=True).close()
+    cache.fetch(URL + "?page=2", None, upstream, stream=True).close()
+    assert cache.stats()["evictions"] == 2
+    assert os.listdir(cache.bodies_dir) == []
+    cache.clear()
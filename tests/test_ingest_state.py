@@ -0,0 +1,87 @@
+import sqlite3
+
+import pytest
+import requests
+
+import extract_content
+import ingest_state
+from extract_content import StageFailed, StageSkipped, run_stage
+
+
+@pytest.fixture
+def conn(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, olid TEXT, title TEXT, authors TEXT)")
+    ingest_state.init_stage_tables(conn)
+    conn.executemany("INSERT INTO books (id, olid, title, authors) VALUES (?, ?, ?, ?)",
+                     [(1, "OL1M", "Dune", "Frank Herbert"), (2, "OL2M", "Emma", "Jane Austen")])
+    ingest_state.mark_imported(conn)
+    yield conn
+    conn.close()
+
+
+def statuses(conn, stage):
+    return dict(conn.execute("SELECT book_id, status FROM book_stages WHERE stage = ?", (stage,)))
+
+
+def test_imported_books_are_pending_for_first_stage(conn):
+    assert [row[0] for row in ingest_state.pending(conn, ingest_state.OLID_RESOLVED, 5)] == [1, 2]
+    assert ingest_state.pending(conn, ingest_state.TEXT_CHECKED, 5) == []
+
+
+def test_done_stage_unlocks_dependent_stage(conn):
+    run_stage(conn, ingest_state.OLID_RESOLVED, lambda row: row[1], lambda conn, row, olid: olid)
+    assert statuses(conn, ingest_state.OLID_RESOLVED) == {1: "done", 2: "done"}
+    rows = ingest_state.pending(conn, ingest_state.TEXT_CHECKED, 5)
+    assert [(row[0], row[4]) for row in rows] == [(1, "OL1M"), (2, "OL2M")]
+    assert ingest_state.pending(conn, ingest_state.OLID_RESOLVED, 5) == []
+
+
+def test_failed_stage_is_retried_after_backoff(conn, monkeypatch):
+    monkeypatch.setattr(extract_content.Config, "STAGE_RETRY_BACKOFF", 60)
+
+    def fail(row):
+        raise StageFailed("connection reset")
+
+    counts = run_stage(conn, ingest_state.OLID_RESOLVED, fail, lambda conn, row, result: None)
+    assert counts == {"done": 0, "skipped": 0, "failed": 2}
+    assert ingest_state.pending(conn, ingest_state.OLID_RESOLVED, 5) == []
+    conn.execute("UPDATE book_stages SET next_attempt_at = 0")
+    assert len(ingest_state.pending(conn, ingest_state.OLID_RESOLVED, 5)) == 2
+    assert ingest_state.pending(conn, ingest_state.OLID_RESOLVED, 1) == []
+
+
+def test_skipped_stage_is_not_retried(conn):
+    def skip(row):
+        raise StageSkipped("no matching Open Library edition")
+
+    counts = run_stage(conn, ingest_state.OLID_RESOLVED, skip, lambda conn, row, result: None)
+    assert counts == {"done": 0, "skipped": 2, "failed": 0}
+    assert statuses(conn, ingest_state.OLID_RESOLVED) == {1: "skipped", 2: "skipped"}
+    conn.execute("UPDATE book_stages SET next_attempt_at = 0")
+    assert ingest_state.pending(conn, ingest_state.OLID_RESOLVED, 5) == []
+    assert ingest_state.pending(conn, ingest_state.TEXT_CHECKED, 5) == []
+
+
+def _http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status} error", response=response)
+
+
+def test_fetch_cover_404_is_no_cover(monkeypatch):
+    def not_found(url, params=None, stream=False):
+        raise _http_error(404)
+
+    monkeypatch.setattr(extract_content, "_api_get", not_found)
+    assert extract_content.fetch_cover("OL1M") is None
+
+
+def test_fetch_cover_server_error_fails_stage(monkeypatch):
+    def unavailable(url, params=None, stream=False):
+        raise extract_content.RetryableResponse("503")
+
+    monkeypatch.setattr(extract_content, "_api_get", unavailable)
+    with pytest.raises(StageFailed):
+        extract_content.fetch_cover("OL1M")
@@ -0,0 +1,63 @@
+import io
+import sqlite3
+
+import pytest
+
+import local_search
+import text_store
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(":memory:")
+    conn.executescript("""
+        CREATE TABLE books (id INTEGER PRIMARY KEY, olid TEXT, title TEXT, authors TEXT, description TEXT);
+        CREATE TABLE full_texts (id INTEGER PRIMARY KEY AUTOINCREMENT, book_id INTEGER, text_content TEXT);
+    """)
+    text_store.init_text_store(conn)
+    local_search.init_search_index(conn)
+    conn.execute("INSERT INTO books (id, olid, title, authors) VALUES (1, 'OL1M', 'Dune', 'Frank Herbert')")
+    yield conn
+    conn.close()
+
+
+def long_text():
+    filler = "spice " * (text_store.SEARCH_INDEX_BYTES // 6 + 1000)
+    return f"arrakis {filler} sandworm".encode("utf-8")
+
+
+def titles(conn, query):
+    return [book["title"] for book in local_search.search_local(conn, query)]
+
+
+def test_body_is_indexed_up_to_cap(conn):
+    text_store.store_text_stream(conn, 1, io.BytesIO(long_text()), chunk_size=16 * 1024)
+    (indexed,) = conn.execute("SELECT length(body) FROM books_fts WHERE rowid = 1").fetchone()
+    assert indexed <= text_store.SEARCH_INDEX_BYTES
+    assert titles(conn, "arrakis") == ["Dune"]
+    assert titles(conn, "sandworm") == []
+    # The stored text itself is complete
+    assert text_store.read_text(conn, 1).endswith("sandworm")
+
+
+def test_legacy_text_content_is_capped(conn):
+    conn.execute("INSERT INTO full_texts (book_id, text_content) VALUES (1, ?)", (long_text().decode(),))
+    (indexed,) = conn.execute("SELECT length(body) FROM books_fts WHERE rowid = 1").fetchone()
+    assert indexed == text_store.SEARCH_INDEX_BYTES
+    assert titles(conn, "arrakis") == ["Dune"]
+
+
+def test_uncapped_index_is_rebuilt(conn):
+    # An index from before the cap: its trigger copied whole texts
+    conn.executescript("""
+        DROP TRIGGER books_fts_full_texts_ai;
+        CREATE TRIGGER books_fts_full_texts_ai AFTER INSERT ON full_texts BEGIN
+            UPDATE books_fts SET body = new.text_content WHERE rowid = new.book_id;
+        END;
+    """)
+    conn.execute("INSERT INTO full_texts (book_id, text_content) VALUES (1, ?)", (long_text().decode(),))
+    assert titles(conn, "sandworm") == ["Dune"]
+
+    local_search.init_search_index(conn)
+    assert titles(conn, "sandworm") == []
+    assert titles(conn, "arrakis") == ["Dune"]
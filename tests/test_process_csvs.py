@@ -0,0 +1,49 @@
+import importlib
+
+import pytest
+
+
+@pytest.fixture
+def process_csvs(env_setup):
+    return importlib.import_module("process_csvs")
+
+
+def host_stats(**overrides):
+    stats = {"calls_per_minute": 60.0, "min_calls_per_minute": 6.0, "max_calls_per_minute": 240.0,
+             "max_in_flight": 4, "latency_ms": None, "paused_for": 0.0, "requests": 0, "throttled": 0,
+             "errors": 0, "increases": 0, "decreases": 0, "wait_seconds": 0.0}
+    stats.update(overrides)
+    return stats
+
+
+def test_worker_rate_limits_are_merged(process_csvs):
+    workers_info = {
+        101: {"summary": {}, "rate_limits": {
+            "www.googleapis.com": host_stats(calls_per_minute=80.0, latency_ms=100.0, requests=30, throttled=1,
+                                             increases=29, wait_seconds=1.5),
+        }},
+        102: {"summary": {}, "rate_limits": {
+            "www.googleapis.com": host_stats(calls_per_minute=50.0, latency_ms=200.0, requests=10, errors=2,
+                                             decreases=1, paused_for=3.0, wait_seconds=0.25),
+            "openlibrary.org": host_stats(requests=5, latency_ms=50.0),
+        }},
+    }
+    merged = process_csvs._merge_rate_limits(workers_info)
+
+    google = merged["www.googleapis.com"]
+    assert google["workers"] == 2
+    assert (google["requests"], google["throttled"], google["errors"]) == (40, 1, 2)
+    assert (google["increases"], google["decreases"]) == (29, 1)
+    assert google["max_in_flight"] == 8
+    assert google["wait_seconds"] == 1.75
+    assert google["calls_per_minute"] == 50.0
+    assert google["paused_for"] == 3.0
+    assert google["latency_ms"] == 125.0
+    assert merged["openlibrary.org"]["requests"] == 5
+    assert merged["openlibrary.org"]["workers"] == 1
+    # The workers' own entries are left as they were
+    assert workers_info[101]["rate_limits"]["www.googleapis.com"]["requests"] == 30
+
+
+def test_no_workers_no_rate_limits(process_csvs):
+    assert process_csvs._merge_rate_limits({}) == {}
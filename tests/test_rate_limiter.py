@@ -0,0 +1,117 @@
+import pytest
+
+import rate_limiter
+from rate_limiter import HostLimiter, TokenBucket, parse_retry_after
+
+
+class FakeClock:
+    """monotonic() and sleep() for rate_limiter: sleeping advances the clock."""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", fake.sleep)
+    return fake
+
+
+def test_bucket_paces_to_its_rate(clock):
+    bucket = TokenBucket(rate=2.0)
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    # Capacity caps the burst after an idle period
+    assert bucket.acquire() == 0.0
+    assert bucket.acquire() == pytest.approx(0.5)
+
+
+def test_paused_bucket_waits_out_the_pause(clock):
+    bucket = TokenBucket(rate=10.0)
+    bucket.pause(5)
+    assert bucket.paused_for() == 5
+    assert bucket.acquire() == pytest.approx(5)
+
+
+def test_success_increases_rate(clock):
+    limiter = HostLimiter("example.org", calls_per_minute=60)
+    limiter.observe(200, latency=0.1)
+    limiter.observe(200, latency=0.1)
+    assert limiter.calls_per_minute == 60 + 2 * rate_limiter.INCREASE_PER_SUCCESS
+    assert limiter.stats()["increases"] == 2
+
+
+def test_slow_response_does_not_increase_rate(clock):
+    limiter = HostLimiter("example.org", calls_per_minute=60)
+    limiter.observe(200, latency=0.1)
+    limiter.observe(200, latency=0.1 * rate_limiter.SLOW_LATENCY_FACTOR * 2)
+    assert limiter.calls_per_minute == 60 + rate_limiter.INCREASE_PER_SUCCESS
+
+
+def test_throttling_halves_rate_once_per_cooldown(clock):
+    limiter = HostLimiter("example.org", calls_per_minute=60)
+    limiter.observe(429)
+    limiter.observe(503)
+    assert limiter.calls_per_minute == 60 * rate_limiter.DECREASE_FACTOR
+    clock.now += rate_limiter.DECREASE_COOLDOWN
+    limiter.observe(None)
+    assert limiter.calls_per_minute == 60 * rate_limiter.DECREASE_FACTOR ** 2
+    stats = limiter.stats()
+    assert (stats["throttled"], stats["errors"], stats["decreases"]) == (1, 2, 2)
+
+
+def test_rate_stays_within_bounds(clock):
+    limiter = HostLimiter("example.org", calls_per_minute=60, min_calls_per_minute=40, max_calls_per_minute=61)
+    limiter.observe(200)
+    limiter.observe(200)
+    assert limiter.calls_per_minute == 61
+    limiter.observe(429)
+    assert limiter.calls_per_minute == 40
+
+
+def test_retry_after_pauses_host(clock):
+    limiter = HostLimiter("example.org")
+    limiter.observe(429, {"Retry-After": "7"})
+    assert limiter.stats()["paused_for"] == 7
+    # Retry-After on a success is not a pause
+    limiter = HostLimiter("example.org")
+    limiter.observe(200, {"Retry-After": "7"})
+    assert limiter.stats()["paused_for"] == 0
+
+
+def test_retry_after_is_capped(clock):
+    limiter = HostLimiter("example.org")
+    limiter.observe(503, {"Retry-After": "86400"})
+    assert limiter.stats()["paused_for"] == rate_limiter.MAX_PAUSE
+
+
+def test_exhausted_quota_pauses_until_reset(clock):
+    limiter = HostLimiter("example.org")
+    limiter.observe(200, {"RateLimit-Remaining": "0", "RateLimit-Reset": "12"})
+    assert limiter.stats()["paused_for"] == 12
+
+
+def test_quota_caps_rate(clock):
+    limiter = HostLimiter("example.org", calls_per_minute=60)
+    limiter.observe(200, {"RateLimit-Remaining": "10", "RateLimit-Reset": "60"})
+    assert limiter.calls_per_minute == 10
+
+
+@pytest.mark.parametrize("value, seconds", [("5", 5.0), ("-3", 0.0), ("", None), ("soon", None)])
+def test_parse_retry_after(value, seconds):
+    assert parse_retry_after(value) == seconds
+
+
+def test_parse_retry_after_http_date():
+    assert parse_retry_after("Mon, 01 Jan 2024 00:00:00 GMT") == 0.0
@@ -0,0 +1,179 @@
+import httpx
+import pytest
+from tenacity import stop_after_attempt, wait_none
+
+import http_client
+import openlibrary_search
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, Deadline, DeadlineExceeded
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", fake)
+    return fake
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout=30, half_open_max_calls=1)
+
+
+def open_breaker(breaker, clock):
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    clock.now += breaker.reset_timeout
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.check()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_failure_count(breaker):
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_success_closes(breaker, clock):
+    open_breaker(breaker, clock)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    trial = breaker.check()
+    assert not breaker.allow()
+    breaker.record_success()
+    breaker.release(trial)
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_half_open_failure_reopens(breaker, clock):
+    open_breaker(breaker, clock)
+    trial = breaker.check()
+    breaker.record_failure()
+    breaker.release(trial)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_unrecorded_trial_is_released(breaker, clock):
+    open_breaker(breaker, clock)
+    trial = breaker.check()
+    breaker.release(trial)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_stale_release_keeps_new_trial_slot(breaker, clock):
+    open_breaker(breaker, clock)
+    first = breaker.check()
+    breaker.record_failure()
+    clock.now += breaker.reset_timeout
+    second = breaker.check()
+    breaker.release(first)
+    assert not breaker.allow()
+    breaker.release(second)
+    assert breaker.allow()
+
+
+def test_release_of_closed_call_is_a_no_op(breaker, clock):
+    closed = breaker.check()
+    open_breaker(breaker, clock)
+    breaker.check()
+    breaker.release(closed)
+    assert not breaker.allow()
+
+
+def test_record_response_counts_bad_requests_as_success(breaker):
+    breaker.record_failure()
+    breaker.record_response(404)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.record_response(503)
+    assert breaker.state == CircuitBreaker.OPEN
+
+
+@pytest.fixture
+def openlibrary(monkeypatch, clock):
+    """The openlibrary breaker, half-open, with requests answered from the returned responses list."""
+    monkeypatch.setattr(openlibrary_search, "USE_MOCK_DATA", False)
+    monkeypatch.setattr(resilience, "_breakers", {})
+    breaker = resilience.get_breaker("openlibrary")
+    open_breaker(breaker, clock)
+    responses = []
+
+    def handler(request):
+        response = responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client = httpx.Client(transport=httpx.MockTransport(handler))
+    monkeypatch.setattr(http_client, "get_httpx_client", lambda: client)
+    yield breaker, responses
+    client.close()
+
+
+def test_expired_deadline_leaves_trial_slot(openlibrary, clock):
+    breaker, _ = openlibrary
+    deadline = Deadline(1)
+    clock.now += 2
+    with pytest.raises(DeadlineExceeded):
+        openlibrary_search.fetch_books_from_openlibrary("dune", deadline=deadline)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+
+
+def test_trial_bad_request_closes(openlibrary):
+    breaker, responses = openlibrary
+    responses.extend([httpx.Response(400), httpx.Response(200, json={"docs": []})])
+    with pytest.raises(openlibrary_search.OpenLibraryRequestRejected):
+        openlibrary_search.fetch_books_from_openlibrary("dune")
+    assert breaker.state == CircuitBreaker.CLOSED
+    # A rejected request is not retried
+    assert len(responses) == 1
+
+
+def test_upstream_failures_are_retried(openlibrary, monkeypatch):
+    breaker, responses = openlibrary
+    breaker.record_success()
+    monkeypatch.setattr(openlibrary_search.fetch_books_from_openlibrary.retry, "wait", wait_none())
+    responses.extend([httpx.Response(503), httpx.ConnectError("connection refused"),
+                      httpx.Response(200, json={"docs": [{"title": "Dune", "author_name": ["Frank Herbert"]}]})])
+    books = openlibrary_search.fetch_books_from_openlibrary("dune")
+    assert [book["title"] for book in books] == ["Dune"]
+    assert responses == []
+
+
+def test_persistent_failure_raises(openlibrary, monkeypatch):
+    breaker, responses = openlibrary
+    breaker.record_success()
+    monkeypatch.setattr(openlibrary_search.fetch_books_from_openlibrary.retry, "wait", wait_none())
+    responses.extend([httpx.Response(503), httpx.ConnectError("connection refused"), httpx.Response(503)])
+    with pytest.raises(openlibrary_search.OpenLibraryAPIError):
+        openlibrary_search.fetch_books_from_openlibrary("dune")
+    assert responses == []
+
+
+def test_trial_unexpected_error_releases_slot(openlibrary):
+    breaker, responses = openlibrary
+    responses.append(httpx.Response(200, content=b"not json"))
+    with pytest.raises(ValueError):
+        openlibrary_search.fetch_books_from_openlibrary.retry_with(stop=stop_after_attempt(1))("dune")
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
@@ -0,0 +1,79 @@
+import pytest
+
+import search_cache
+from search_cache import SearchCache
+
+BOOKS = [{"title": "Dune", "authors": "Frank Herbert"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(search_cache.time, "time", fake)
+    return fake
+
+
+def test_hit_is_a_copy(clock):
+    cache = SearchCache(ttl=60)
+    cache.set("Google Books", "Dune", BOOKS)
+    books = cache.get("Google Books", "  dune ")
+    assert books == BOOKS
+    books[0]["title"] = "changed"
+    assert cache.get("Google Books", "dune") == BOOKS
+    assert cache.stats()["hits"] == 2
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = SearchCache(ttl=60)
+    cache.set("Google Books", "dune", BOOKS)
+    clock.now += 61
+    assert cache.get("Google Books", "dune") is None
+    assert not cache.contains("Google Books", "dune")
+    assert cache.stats()["expired"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entry_is_served_stale(clock):
+    cache = SearchCache(ttl=60)
+    cache.set("Google Books", "dune", BOOKS)
+    clock.now += 3600
+    assert cache.get("Google Books", "dune", allow_stale=True) == BOOKS
+    assert cache.get("Google Books", "emma", allow_stale=True) is None
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_least_recently_used_is_evicted(clock):
+    cache = SearchCache(ttl=60, max_entries=2)
+    cache.set("Google Books", "dune", BOOKS)
+    cache.set("Google Books", "emma", BOOKS)
+    cache.get("Google Books", "dune")
+    cache.set("Google Books", "ulysses", BOOKS)
+    assert cache.get("Google Books", "emma") is None
+    assert cache.get("Google Books", "dune") == BOOKS
+    assert cache.stats()["evictions"] == 1
+
+
+def test_byte_limit_evicts(clock):
+    size = len(search_cache.json.dumps(BOOKS).encode("utf-8"))
+    cache = SearchCache(ttl=60, max_bytes=size * 2)
+    for query in ("dune", "emma", "ulysses"):
+        cache.set("Google Books", query, BOOKS)
+    assert cache.stats()["entries"] == 2
+    assert cache.stats()["bytes"] <= size * 2
+
+
+def test_disk_tier_survives_restart(clock, tmp_path):
+    db_path = str(tmp_path / "search_cache.db")
+    SearchCache(ttl=60, db_path=db_path).set("Open Library", "dune", BOOKS, page="2")
+    cache = SearchCache(ttl=60, db_path=db_path)
+    assert cache.get("Open Library", "dune", page="2") == BOOKS
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.get("Open Library", "dune") is None
@@ -0,0 +1,77 @@
+import threading
+import time
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_concurrently(flight, key, fn, callers):
+    """Start callers threads on flight.do(key, fn); returns (threads, results, errors)."""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_for_waiters(flight, key, waiters):
+    while True:
+        with flight._lock:
+            call = flight._calls.get(key)
+            if call is not None and call.waiters == waiters:
+                return
+        time.sleep(0.001)
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+
+    def fetch():
+        executions.append(1)
+        release.wait(5)
+        return ["Dune"]
+
+    threads, results, errors = run_concurrently(flight, "dune", fetch, 4)
+    wait_for_waiters(flight, "dune", 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(executions) == 1
+    assert results == [["Dune"]] * 4 and errors == []
+    assert flight.stats() == {"executions": 1, "coalesced": 3, "in_flight": 0}
+
+
+def test_waiters_receive_the_error():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fetch():
+        release.wait(5)
+        raise ValueError("upstream failed")
+
+    threads, results, errors = run_concurrently(flight, "dune", fetch, 3)
+    wait_for_waiters(flight, "dune", 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == []
+    assert [str(e) for e in errors] == ["upstream failed"] * 3
+
+
+def test_later_calls_run_again():
+    flight = SingleFlight()
+    assert flight.do("dune", lambda: 1) == 1
+    assert flight.do("dune", lambda: 2) == 2
+    with pytest.raises(KeyError):
+        flight.do("emma", lambda: {}["missing"])
+    assert flight.stats()["executions"] == 3
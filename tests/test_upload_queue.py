@@ -0,0 +1,64 @@
+import httplib2
+from googleapiclient.errors import HttpError
+
+from resilience import CircuitOpenError
+from upload_queue import UploadQueue
+
+
+def http_error(status, content=b"{}"):
+    return HttpError(httplib2.Response({"status": status}), content)
+
+
+def queue_for(errors, retryable=None, max_attempts=3):
+    """A queue whose handler raises the given errors in turn, then returns a link."""
+    errors = list(errors)
+
+    def handler(books, query):
+        if errors:
+            raise errors.pop(0)
+        return "https://drive.example/file"
+
+    return UploadQueue(handler, retryable=retryable, num_workers=1, max_attempts=max_attempts,
+                       retry_backoff=0)
+
+
+def run(upload_queue):
+    job = upload_queue.submit([{"title": "Dune"}], "dune")
+    return upload_queue.wait(job.job_id, timeout=5)
+
+
+def test_retries_until_success():
+    job = run(queue_for([CircuitOpenError("google_drive circuit is open")]))
+    assert job["status"] == "done"
+    assert job["attempts"] == 2
+    assert job["error"] is None
+
+
+def test_error_holds_the_real_cause():
+    upload_queue = queue_for([CircuitOpenError("google_drive circuit is open")] * 3)
+    job = run(upload_queue)
+    assert job["status"] == "dead"
+    assert job["error"] == "CircuitOpenError: google_drive circuit is open"
+    assert upload_queue.dead_letters()[0]["job_id"] == job["job_id"]
+
+
+def test_non_retryable_error_is_not_retried():
+    job = run(queue_for([ValueError("bad request")], retryable=lambda error: not isinstance(error, ValueError)))
+    assert job["status"] == "dead"
+    assert job["attempts"] == 1
+    assert job["error"] == "ValueError: bad request"
+
+
+def test_drive_errors_worth_retrying(app_module):
+    from google.auth.exceptions import RefreshError
+
+    retryable = app_module.is_retryable_drive_error
+    assert retryable(http_error(503))
+    assert retryable(http_error(429))
+    assert retryable(http_error(403, b'{"error": {"errors": [{"reason": "userRateLimitExceeded"}]}}'))
+    assert retryable(CircuitOpenError("google_drive circuit is open"))
+    assert retryable(OSError("connection reset"))
+    assert not retryable(http_error(400))
+    assert not retryable(http_error(401))
+    assert not retryable(http_error(403, b'{"error": {"errors": [{"reason": "insufficientPermissions"}]}}'))
+    assert not retryable(RefreshError("invalid_grant"))
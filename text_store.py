@@ -0,0 +1,233 @@
+import codecs
+import logging
+import os
+import sqlite3
+import tempfile
+import zlib
+from typing import BinaryIO, Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import metrics
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024  # uncompressed bytes per chunk row
+PAGE_SIZE = 4096  # bytes per page for read_pages
+COMPRESSION_LEVEL = 6
+DOWNLOAD_BLOCK_SIZE = 64 * 1024
+# Leading bytes of each text put into the local search index, which keeps its own copy of them
+SEARCH_INDEX_BYTES = 64 * 1024
+
+
+class TextNotFound(Exception):
+    """Raised when a book has no stored full text"""
+    pass
+
+
+def init_text_store(conn: sqlite3.Connection):
+    """
+    Create the chunk table and add chunk metadata columns to full_texts.
+
+    Texts stored through this module keep text_content NULL and live in
+    full_text_chunks as zlib-compressed, fixed-size pieces, so a byte range
+    can be read by decompressing only the chunks it touches. Older rows with
+    text_content set are still readable.
+    """
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(full_texts)")]
+    for column, definition in (("compression", "TEXT"), ("chunk_size", "INTEGER"), ("byte_length", "INTEGER")):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE full_texts ADD COLUMN {column} {definition}")
+
+    conn.executescript("""
+        CREATE TABLE IF NOT EXISTS full_text_chunks (
+            full_text_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            PRIMARY KEY (full_text_id, seq),
+            FOREIGN KEY (full_text_id) REFERENCES full_texts (id)
+        );
+
+        CREATE TRIGGER IF NOT EXISTS full_text_chunks_ad AFTER DELETE ON full_texts BEGIN
+            DELETE FROM full_text_chunks WHERE full_text_id = old.id;
+        END;
+    """)
+    conn.commit()
+
+
+def download_to_file(response, directory: Optional[str] = None) -> str:
+    """
+    Write a streamed (stream=True) response body to a temporary file and return its path.
+
+    The body is copied in DOWNLOAD_BLOCK_SIZE pieces, so memory use does not
+    depend on the size of the text. The caller owns (and removes) the file.
+    """
+    fd, path = tempfile.mkstemp(suffix=".txt", dir=directory)
+    downloaded = 0
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for block in response.iter_content(chunk_size=DOWNLOAD_BLOCK_SIZE):
+                if block:
+                    f.write(block)
+                    downloaded += len(block)
+    except BaseException:
+        os.remove(path)
+        raise
+    finally:
+        response.close()
+        if not getattr(response, "from_cache", False):
+            metrics.DOWNLOADED_BYTES.inc(downloaded, host=urlsplit(response.url or "").hostname or "")
+    return path
+
+
+def store_text_stream(conn: sqlite3.Connection, book_id: int, stream: BinaryIO,
+                      chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Store UTF-8 text read from a binary stream as compressed chunks. Does not commit.
+
+    Args:
+        conn (sqlite3.Connection): Database connection.
+        book_id (int): Book the text belongs to.
+        stream (BinaryIO): Source of the text; read chunk_size bytes at a time.
+        chunk_size (int): Uncompressed bytes per chunk row.
+
+    Returns:
+        int: The id of the new full_texts row.
+    """
+    full_text_id = conn.execute("""
+        INSERT INTO full_texts (book_id, text_content, compression, chunk_size, byte_length)
+        VALUES (?, NULL, 'zlib', ?, 0)
+    """, (book_id, chunk_size)).lastrowid
+
+    byte_length = 0
+    stored = 0
+    seq = 0
+    while True:
+        data = stream.read(chunk_size)
+        if not data:
+            break
+        compressed = zlib.compress(data, COMPRESSION_LEVEL)
+        conn.execute(
+            "INSERT INTO full_text_chunks (full_text_id, seq, data) VALUES (?, ?, ?)",
+            (full_text_id, seq, compressed)
+        )
+        byte_length += len(data)
+        stored += len(compressed)
+        seq += 1
+
+    conn.execute("UPDATE full_texts SET byte_length = ? WHERE id = ?", (byte_length, full_text_id))
+    _index_body(conn, book_id)
+    logger.debug(f"Stored {byte_length} bytes of text for book {book_id} in {seq} chunks ({stored} compressed)")
+    return full_text_id
+
+
+def store_text_file(conn: sqlite3.Connection, book_id: int, path: str,
+                    chunk_size: int = CHUNK_SIZE) -> int:
+    """Store a downloaded text file as compressed chunks. Does not commit or remove the file."""
+    with open(path, "rb") as f:
+        return store_text_stream(conn, book_id, f, chunk_size=chunk_size)
+
+
+def _index_body(conn: sqlite3.Connection, book_id: int):
+    """Put the start of the text into the local search index (see search_text)."""
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'books_fts'").fetchone():
+        conn.execute("UPDATE books_fts SET body = ? WHERE rowid = ?", (search_text(conn, book_id), book_id))
+
+
+def search_text(conn: sqlite3.Connection, book_id: int) -> str:
+    """
+    Return the part of a book's text that goes into the local search index.
+
+    FTS5 stores its own plain copy of every indexed value (for snippets), so
+    indexing whole texts would keep each book uncompressed a second time.
+    Only the first SEARCH_INDEX_BYTES are indexed, read by decompressing just
+    the chunks they span; words found only further into a book do not match.
+    """
+    try:
+        return read_range(conn, book_id, 0, SEARCH_INDEX_BYTES)
+    except TextNotFound:
+        return ""
+
+
+def _latest(conn: sqlite3.Connection, book_id: int) -> Tuple:
+    row = conn.execute("""
+        SELECT id, text_content, chunk_size, byte_length FROM full_texts
+        WHERE book_id = ? ORDER BY id DESC LIMIT 1
+    """, (book_id,)).fetchone()
+    if row is None:
+        raise TextNotFound(f"No full text stored for book {book_id}")
+    return row
+
+
+def text_info(conn: sqlite3.Connection, book_id: int) -> Dict:
+    """Return the size of a book's stored text and how it is stored."""
+    full_text_id, text_content, chunk_size, byte_length = _latest(conn, book_id)
+    if text_content is not None:
+        size = len(text_content.encode("utf-8"))
+        return {"book_id": book_id, "bytes": size, "stored_bytes": size, "chunks": 0,
+                "pages": -(-size // PAGE_SIZE)}
+    chunks, stored = conn.execute(
+        "SELECT COUNT(*), COALESCE(SUM(length(data)), 0) FROM full_text_chunks WHERE full_text_id = ?",
+        (full_text_id,)
+    ).fetchone()
+    return {"book_id": book_id, "bytes": byte_length, "stored_bytes": stored, "chunks": chunks,
+            "pages": -(-byte_length // PAGE_SIZE)}
+
+
+def iter_text(conn: sqlite3.Connection, book_id: int) -> Iterator[str]:
+    """Yield a book's text one decompressed chunk at a time."""
+    full_text_id, text_content, _, _ = _latest(conn, book_id)
+    if text_content is not None:
+        yield text_content
+        return
+
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    for (data,) in conn.execute(
+        "SELECT data FROM full_text_chunks WHERE full_text_id = ? ORDER BY seq", (full_text_id,)
+    ):
+        text = decoder.decode(zlib.decompress(data))
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+def read_text(conn: sqlite3.Connection, book_id: int) -> Optional[str]:
+    """Return a book's whole text, or None if it has none."""
+    try:
+        return "".join(iter_text(conn, book_id))
+    except TextNotFound:
+        return None
+
+
+def read_range(conn: sqlite3.Connection, book_id: int, start: int, length: int) -> str:
+    """
+    Return length bytes of a book's text starting at byte offset start.
+
+    Only the chunks overlapping the range are read and decompressed.
+    Characters cut by the range boundaries are dropped.
+    """
+    if start < 0 or length <= 0:
+        return ""
+    full_text_id, text_content, chunk_size, _ = _latest(conn, book_id)
+    if text_content is not None:
+        data = text_content.encode("utf-8")[start:start + length]
+        return data.decode("utf-8", errors="ignore")
+
+    first, last = start // chunk_size, (start + length - 1) // chunk_size
+    data = b"".join(
+        zlib.decompress(chunk) for (chunk,) in conn.execute("""
+            SELECT data FROM full_text_chunks
+            WHERE full_text_id = ? AND seq BETWEEN ? AND ?
+            ORDER BY seq
+        """, (full_text_id, first, last))
+    )
+    offset = start - first * chunk_size
+    return data[offset:offset + length].decode("utf-8", errors="ignore")
+
+
+def read_pages(conn: sqlite3.Connection, book_id: int, first_page: int, page_count: int = 1,
+               page_size: int = PAGE_SIZE) -> str:
+    """Return page_count fixed-size pages of a book's text, starting at first_page (0-based)."""
+    return read_range(conn, book_id, first_page * page_size, page_count * page_size)
@@ -0,0 +1,190 @@
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional
+
+# Set up logging
+logger = logging.getLogger(__name__)
+
+
+class UploadQueueFull(Exception):
+    """Raised when the upload queue cannot accept another job"""
+    pass
+
+
+class UploadJob:
+    """State of a single queued Drive upload."""
+
+    def __init__(self, books: List[Dict], query: str):
+        self.job_id = uuid.uuid4().hex
+        self.books = books
+        self.query = query
+        self.status = "queued"
+        self.attempts = 0
+        self.drive_link: Optional[str] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.finished = threading.Event()
+
+    def to_dict(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "query": self.query,
+            "status": self.status,
+            "attempts": self.attempts,
+            "drive_link": self.drive_link,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class UploadQueue:
+    """
+    Bounded background worker pool for Drive uploads.
+
+    Workers are plain threads, which the eventlet worker monkey-patches into
+    greenlets, so the same code runs under gunicorn and the dev server. They
+    are started lazily on the first submit so no thread exists before the
+    worker process has forked.
+
+    Args:
+        handler (Callable): Called as handler(books, query); returns the share link
+            or raises, and the error is kept on the job.
+        retryable (Callable): Called with a handler error; False moves the job
+            to the dead-letter list without further attempts. Default: retry all.
+        num_workers (int): Number of concurrent uploads.
+        max_queue (int): Maximum number of jobs waiting for a worker.
+        max_attempts (int): Attempts before a job is moved to the dead-letter list.
+        retry_backoff (float): Base delay in seconds, doubled on every retry.
+        max_jobs (int): Number of finished jobs kept for status lookups.
+    """
+
+    def __init__(self, handler: Callable[[List[Dict], str], Optional[str]],
+                 retryable: Optional[Callable[[Exception], bool]] = None, num_workers: int = 2,
+                 max_queue: int = 100, max_attempts: int = 3, retry_backoff: float = 2.0,
+                 max_jobs: int = 1000):
+        self.handler = handler
+        self.retryable = retryable or (lambda error: True)
+        self.num_workers = num_workers
+        self.max_attempts = max_attempts
+        self.retry_backoff = retry_backoff
+        self.max_jobs = max_jobs
+
+        self._queue: "queue.Queue[UploadJob]" = queue.Queue(maxsize=max_queue)
+        self._jobs: "OrderedDict[str, UploadJob]" = OrderedDict()
+        self._dead_letters: deque = deque(maxlen=100)
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+
+    def submit(self, books: List[Dict], query: str) -> UploadJob:
+        """Queue an upload and return its job without waiting for it."""
+        self._start_workers()
+        job = UploadJob(books, query)
+        try:
+            self._queue.put_nowait(job)
+        except queue.Full:
+            raise UploadQueueFull(f"Upload queue is full ({self._queue.maxsize} jobs)")
+
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._trim_jobs()
+        logger.info(f"Queued Drive upload {job.job_id} for query: {query}")
+        return job
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        """Return the status of a job, or None if it is unknown."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.to_dict() if job else None
+
+    def wait(self, job_id: str, timeout: float) -> Optional[Dict]:
+        """Block until a job is done or dead (or timeout passes) and return its status."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        job.finished.wait(timeout)
+        return self.get(job_id)
+
+    def dead_letters(self) -> List[Dict]:
+        """Return jobs that exhausted their retries."""
+        with self._lock:
+            return [job.to_dict() for job in self._dead_letters]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            statuses: Dict[str, int] = {}
+            for job in self._jobs.values():
+                statuses[job.status] = statuses.get(job.status, 0) + 1
+            return {
+                "workers": len(self._workers),
+                "queued": self._queue.qsize(),
+                "jobs": statuses,
+                "dead_letters": len(self._dead_letters),
+            }
+
+    def _start_workers(self):
+        with self._lock:
+            if self._workers:
+                return
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._work, name=f"drive-upload-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _trim_jobs(self):
+        """Forget the oldest finished jobs once more than max_jobs are tracked."""
+        while len(self._jobs) > self.max_jobs:
+            for job_id, job in self._jobs.items():
+                if job.status in ("done", "dead"):
+                    del self._jobs[job_id]
+                    break
+            else:
+                break
+
+    def _set(self, job: UploadJob, **fields):
+        with self._lock:
+            for name, value in fields.items():
+                setattr(job, name, value)
+            job.updated_at = time.time()
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job: UploadJob):
+        while job.attempts < self.max_attempts:
+            self._set(job, status="running", attempts=job.attempts + 1)
+            try:
+                link = self.handler(job.books, job.query)
+                if not link:
+                    raise RuntimeError("Upload returned no share link")
+                self._set(job, status="done", drive_link=link, error=None)
+                # The rows are no longer needed once the CSV is on Drive
+                job.books = []
+                job.finished.set()
+                logger.info(f"Drive upload {job.job_id} finished: {link}")
+                return
+            except Exception as e:
+                logger.warning(f"Drive upload {job.job_id} attempt {job.attempts} failed: {e}")
+                self._set(job, status="retrying", error=f"{type(e).__name__}: {e}")
+                if not self.retryable(e):
+                    logger.warning(f"Drive upload {job.job_id} failed with an error retrying cannot fix")
+                    break
+                if job.attempts < self.max_attempts:
+                    time.sleep(self.retry_backoff * 2 ** (job.attempts - 1))
+
+        self._set(job, status="dead")
+        with self._lock:
+            self._dead_letters.append(job)
+        job.finished.set()
+        logger.error(f"Drive upload {job.job_id} moved to dead letters after {job.attempts} attempts")